@@ -0,0 +1,115 @@
+"""
+Admission control for the async FastAPI handlers.
+
+At most `max_in_flight` requests are admitted at once; admitted requests are
+the ones queued in or being scored by the micro-batcher. Up to `max_waiting`
+more wait in line, first come first served, for a slot to free up. Anything
+beyond that is rejected straight away with 429, and a request whose deadline
+passes while it waits is rejected with 503. Both carry a `Retry-After` hint
+derived from the recent service time. Under a traffic spike, the requests
+that are accepted keep their normal latency, and the excess fails fast
+instead of everything slowing down together.
+
+The controller is used from the event loop only, so it needs no locks.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+class AdmissionRejected(Exception):
+    """The request was not admitted; maps to an HTTP error with ``Retry-After``."""
+
+    def __init__(self, status_code: int, reason: str, detail: str, retry_after: int) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.reason = reason
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounded in-flight requests plus a bounded FIFO of waiters."""
+
+    def __init__(self, max_in_flight: int, max_waiting: int) -> None:
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be a positive integer.")
+        if max_waiting < 0:
+            raise ValueError("max_waiting must be non-negative.")
+        self.max_in_flight = max_in_flight
+        self.max_waiting = max_waiting
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Exponentially weighted average seconds an admitted request holds its slot
+        self._service_seconds: Optional[float] = None
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_deadline = 0
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Seconds until the current line has probably drained (at least 1)."""
+        service = self._service_seconds or 0.0
+        drain = service * (self.waiting / self.max_in_flight + 1)
+        return max(1, math.ceil(drain))
+
+    async def acquire(self, timeout: float) -> None:
+        """Take an in-flight slot, waiting at most ``timeout`` seconds in line."""
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.max_waiting:
+            self.rejected_full += 1
+            raise AdmissionRejected(429, "queue_full", "Too many requests in line, retry later.", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout=max(timeout, 0.0))
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self.release()
+            if isinstance(exc, asyncio.CancelledError):
+                raise
+            self.rejected_deadline += 1
+            raise AdmissionRejected(
+                503, "deadline_waiting", "Request deadline passed while waiting for capacity.", self.retry_after()
+            ) from None
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        self.admitted += 1
+
+    def release(self, service_seconds: Optional[float] = None) -> None:
+        """Free a slot, handing it straight to the next live waiter if any."""
+        if service_seconds is not None:
+            previous = self._service_seconds
+            self._service_seconds = service_seconds if previous is None else 0.8 * previous + 0.2 * service_seconds
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot moves to the waiter, so in_flight is unchanged
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def stats(self) -> Dict:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_waiting": self.max_waiting,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_full,
+            "rejected_deadline": self.rejected_deadline,
+            "avg_service_ms": 1000.0 * (self._service_seconds or 0.0),
+        }
@@ -0,0 +1,209 @@
+"""
+Dynamic micro-batching for the FastAPI backend.
+
+Concurrent `/analyze` requests are queued and grouped into small batches that
+are scored with a single `TweetAnalyzer.analyze_batch` call. A batch is closed
+as soon as it holds `max_batch_size` tweets or `max_wait_ms` has passed since
+its first tweet arrived, whichever comes first. With `num_consumers` above one,
+several batches are in flight at once, which lets a multi-process worker pool
+keep all of its workers busy.
+
+Each item may carry a deadline. When a batch is collected, items whose
+deadline has already passed, or whose future was cancelled by the caller, are
+dropped instead of scored, so a backlog of abandoned requests does not delay
+the live ones behind it.
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from app.inference.metrics import STAGE_SECONDS
+
+
+class BatcherClosed(RuntimeError):
+    """Raised by `MicroBatcher.submit` once `stop` has been called."""
+
+
+@dataclass
+class _PendingItem:
+    text: str
+    future: Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+    # time.perf_counter() value after which the result is no longer wanted
+    deadline: Optional[float] = None
+
+
+class MicroBatcher:
+    """Collect requests from many threads and score them in shared batches."""
+
+    def __init__(
+        self,
+        analyzer,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        max_queue_size: int = 1024,
+        num_consumers: int = 1,
+    ) -> None:
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be a positive integer.")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms must be non-negative.")
+        if num_consumers < 1:
+            raise ValueError("num_consumers must be a positive integer.")
+        self.analyzer = analyzer
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_queue_size = max_queue_size
+        self.num_consumers = num_consumers
+        self._queue: "queue.Queue[Optional[_PendingItem]]" = queue.Queue(maxsize=max_queue_size)
+        self._threads: List[threading.Thread] = []
+        # Orders submissions against the shutdown sentinel, see stop()
+        self._submit_lock = threading.Lock()
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._largest_batch = 0
+        self._total_queue_wait = 0.0
+        self._total_inference_time = 0.0
+        self._expired = 0
+        self._cancelled = 0
+
+    def start(self) -> None:
+        if any(thread.is_alive() for thread in self._threads):
+            return
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._run, name=f"micro-batcher-{index}", daemon=True)
+            for index in range(self.num_consumers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Score everything already queued, then stop; later submits raise `BatcherClosed`."""
+        if not self._threads:
+            return
+        with self._submit_lock:
+            self._closed = True
+        # A single sentinel is passed along from consumer to consumer; every
+        # accepted item was queued before it
+        self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, text: str, deadline: Optional[float] = None) -> Future:
+        """Queue ``text`` for scoring and return a future for its result.
+
+        ``deadline`` is a ``time.perf_counter()`` value; if the item is still
+        queued then, it is not scored and the future raises ``TimeoutError``.
+        Cancelling the future before its batch starts also skips it.
+
+        Raises ``ValueError`` for empty input (so one bad request cannot fail a
+        whole batch) and ``queue.Full`` when the queue is at capacity.
+        """
+        if not text.strip():
+            raise ValueError("Input text must be non-empty.")
+        if not self._threads:
+            raise RuntimeError("MicroBatcher has not been started.")
+        item = _PendingItem(text=text, future=Future(), deadline=deadline)
+        with self._submit_lock:
+            if self._closed:
+                raise BatcherClosed("MicroBatcher is shutting down.")
+            self._queue.put_nowait(item)
+        return item.future
+
+    def analyze(self, text: str, timeout: Optional[float] = None):
+        """Blocking helper: submit ``text`` and wait for its `AnalysisResult`."""
+        return self.submit(text).result(timeout=timeout)
+
+    def _collect_batch(self, first: _PendingItem) -> List[_PendingItem]:
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Re-queue the shutdown sentinel so the loop exits after this batch
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _drop_abandoned(self, batch: List[_PendingItem], now: float) -> List[_PendingItem]:
+        """Items still worth scoring; expired ones fail and cancelled ones are skipped."""
+        live = []
+        expired = cancelled = 0
+        for item in batch:
+            if not item.future.set_running_or_notify_cancel():
+                cancelled += 1
+            elif item.deadline is not None and now >= item.deadline:
+                item.future.set_exception(TimeoutError("Request deadline passed while queued."))
+                expired += 1
+            else:
+                live.append(item)
+        if expired or cancelled:
+            with self._stats_lock:
+                self._expired += expired
+                self._cancelled += cancelled
+        return live
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                self._queue.put(None)
+                break
+            collected = self._collect_batch(first)
+            started = time.perf_counter()
+            for item in collected:
+                STAGE_SECONDS.observe(started - item.enqueued_at, stage="queue_wait")
+            batch = self._drop_abandoned(collected, started)
+            if not batch:
+                continue
+            try:
+                results = self.analyzer.analyze_batch([item.text for item in batch])
+            except Exception as exc:
+                for item in batch:
+                    item.future.set_exception(exc)
+            else:
+                for item, result in zip(batch, results):
+                    item.future.set_result(result)
+            finished = time.perf_counter()
+
+            with self._stats_lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._largest_batch = max(self._largest_batch, len(batch))
+                self._total_queue_wait += sum(started - item.enqueued_at for item in batch)
+                self._total_inference_time += finished - started
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            batches = self._batches
+            items = self._items
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "max_queue_size": self.max_queue_size,
+                "num_consumers": self.num_consumers,
+                "queue_depth": self._queue.qsize(),
+                "batches": batches,
+                "items": items,
+                "largest_batch": self._largest_batch,
+                "avg_batch_size": items / batches if batches else 0.0,
+                "avg_queue_wait_ms": 1000.0 * self._total_queue_wait / items if items else 0.0,
+                "avg_batch_latency_ms": 1000.0 * self._total_inference_time / batches if batches else 0.0,
+                "expired": self._expired,
+                "cancelled": self._cancelled,
+            }
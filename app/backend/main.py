@@ -2,12 +2,24 @@
 FastAPI backend for Twitter toxicity detection (per proposal: API demonstration).
 
 Provides REST API endpoint for toxic tweet detection.
+
+The served model can be switched to another registered version at runtime
+(`POST /admin/models/activate`): the new version is loaded and warmed up in
+the background, then swapped in while in-flight requests finish on the old one.
 """
 
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
-from typing import Dict
+from typing import Dict, Optional
+import asyncio
+import hmac
+import queue
 import sys
+import threading
+import time
 from pathlib import Path
 
 # Add project root to path
@@ -22,26 +34,208 @@ project_root_str = str(PROJECT_ROOT)
 if project_root_str not in sys.path:
     sys.path.insert(0, project_root_str)
 
-# Now try the import
-try:
-    from app.inference.predictor import TweetAnalyzer
-except ImportError as e:
-    # Fallback: direct import
-    import importlib.util
-    predictor_path = PROJECT_ROOT / "app" / "inference" / "predictor.py"
-    spec = importlib.util.spec_from_file_location("predictor", predictor_path)
-    predictor_module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(predictor_module)
-    TweetAnalyzer = predictor_module.TweetAnalyzer
+# (torch and transformers are imported lazily by the model loader below)
+from app.inference.predictor import TweetAnalyzer, import_heavy_dependencies
+from app.backend.admission import AdmissionController, AdmissionRejected
+from app.backend.batching import BatcherClosed, MicroBatcher
+from app.backend.startup import ModelLoader
+from app.backend.worker_pool import SharedModelPool
+from app.inference import metrics, registry
+
+# Micro-batching settings (override via environment variables); a batch size of
+# 0 uses the analyzer's, which comes from the host's execution profile or is 32
+BATCH_MAX_SIZE = int(os.environ.get("TWEET_BATCH_MAX_SIZE", "0"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("TWEET_BATCH_MAX_WAIT_MS", "5"))
+BATCH_MAX_QUEUE = int(os.environ.get("TWEET_BATCH_MAX_QUEUE", "1024"))
+
+# "threads" scores batches in this process; "pool" starts TWEET_POOL_WORKERS
+# worker processes that memory-map the same model weight files
+SERVING_MODE = os.environ.get("TWEET_SERVING_MODE", "threads").lower()
+POOL_WORKERS = int(os.environ.get("TWEET_POOL_WORKERS", str(os.cpu_count() or 1)))
+POOL_THREADS_PER_WORKER = int(os.environ.get("TWEET_POOL_THREADS_PER_WORKER", "1"))
+
+# Admission control: requests beyond TWEET_MAX_IN_FLIGHT wait in line, at most
+# TWEET_MAX_WAITING of them; the rest get 429. A request still unanswered after
+# TWEET_REQUEST_TIMEOUT_MS (or a shorter X-Request-Timeout-Ms header) gets 503.
+# 0 for TWEET_MAX_IN_FLIGHT sizes it from the batch size and consumer count.
+MAX_IN_FLIGHT = int(os.environ.get("TWEET_MAX_IN_FLIGHT", "0"))
+MAX_WAITING = int(os.environ.get("TWEET_MAX_WAITING", "256"))
+REQUEST_TIMEOUT_MS = float(os.environ.get("TWEET_REQUEST_TIMEOUT_MS", "2000"))
+
+# Run a few synthetic batches after loading so the first request is not slow
+WARMUP_ENABLED = os.environ.get("TWEET_WARMUP", "1") != "0"
+
+# Bearer token for /admin endpoints; they are disabled while it is unset
+ADMIN_TOKEN = os.environ.get("TWEET_ADMIN_TOKEN", "")
+
+# Set by the model loader once the analyzer is loaded and warmed up, and
+# replaced together when another registry version is activated
+analyzer: Optional[TweetAnalyzer] = None
+batcher: Optional[MicroBatcher] = None
+pool: Optional[SharedModelPool] = None
+admission: Optional[AdmissionController] = None
+# Registry version being served (None: the default checkpoint and models/)
+model_version: Optional[str] = None
+# Background load of the version being switched to
+swap_loader: Optional[ModelLoader] = None
+swap_version: Optional[str] = None
+_swap_lock = threading.Lock()
+
+
+def _analyzer_kwargs(version: Optional[str]) -> dict:
+    """`TweetAnalyzer` arguments for a registry version (defaults when unversioned)."""
+    return {} if version is None else registry.analyzer_kwargs(version)
+
+
+def _analyzer_factory(version: Optional[str]):
+    """Loader factory for a registry version, verified against its content hashes."""
+    def load() -> TweetAnalyzer:
+        if version is not None:
+            registry.verify(version)
+        return TweetAnalyzer(**_analyzer_kwargs(version))
+    return load
+
+
+def _retire(old_batcher: MicroBatcher, old_pool: Optional[SharedModelPool]) -> None:
+    # stop() scores everything already queued before the consumers exit
+    old_batcher.stop(timeout=REQUEST_TIMEOUT_MS / 1000.0 + 5.0)
+    if old_pool is not None:
+        old_pool.stop()
+
+
+def _serve(loaded: TweetAnalyzer, version: Optional[str]) -> None:
+    """Start scoring with ``loaded`` and retire the previously served model, if any."""
+    global analyzer, batcher, pool, admission, model_version
+    scorer, consumers, new_pool = loaded, 1, None
+    if SERVING_MODE == "pool":
+        # Workers load the same (already verified) files themselves; no fork of this process
+        new_pool = SharedModelPool(_analyzer_kwargs(version), POOL_WORKERS, POOL_THREADS_PER_WORKER)
+        new_pool.start()
+        # One batch in flight per worker process
+        scorer, consumers = new_pool, new_pool.num_workers
+    batch_size = BATCH_MAX_SIZE or loaded.batch_size
+    if admission is None:
+        # Two full batches per consumer: one being scored, the next one filling up
+        admission = AdmissionController(MAX_IN_FLIGHT or 2 * batch_size * consumers, MAX_WAITING)
+    # Concurrent requests are grouped into shared forward passes; the consumer
+    # threads are the inference executor, so the event loop never blocks on it
+    new_batcher = MicroBatcher(
+        scorer,
+        max_batch_size=batch_size,
+        max_wait_ms=BATCH_MAX_WAIT_MS,
+        max_queue_size=BATCH_MAX_QUEUE,
+        num_consumers=consumers,
+    )
+    new_batcher.start()
+    old_batcher, old_pool = batcher, pool
+    # New requests go to the new batcher from here on; requests already queued
+    # on the old one are still answered by the old model
+    analyzer, batcher, pool, model_version = loaded, new_batcher, new_pool, version
+    if old_batcher is not None:
+        threading.Thread(target=_retire, args=(old_batcher, old_pool), name="model-retire", daemon=True).start()
+        print(f"Now serving model version {version or 'default'}")
+
+
+def _on_model_ready(loaded: TweetAnalyzer) -> None:
+    _serve(loaded, loader_version)
+
+
+def _on_swap_ready(loaded: TweetAnalyzer) -> None:
+    _serve(loaded, swap_version)
+    # Restarts come back on the version that was last activated
+    registry.set_active(swap_version)
+
+
+def _stats_source():
+    """Whatever scores requests: the pool (counters summed over its workers) or the analyzer."""
+    return pool if pool is not None else analyzer
+
+
+def _service_gauges() -> Dict:
+    """Point-in-time values for /metrics, read from the loader, batcher and cache."""
+    gauges = {
+        "tweet_model_ready": ("1 once the model is loaded and warmed up.", float(loader.ready)),
+        "tweet_model_transformer_loaded": (
+            "1 when BERT is the primary model, 0 when only the TF-IDF baseline loaded.",
+            float(analyzer is not None and analyzer.transformer_backend is not None),
+        ),
+    }
+    if batcher is not None:
+        batching = batcher.stats()
+        gauges["tweet_batch_queue_depth"] = ("Tweets waiting for a micro-batch.", batching["queue_depth"])
+        gauges["tweet_batch_avg_size"] = ("Average tweets per micro-batch.", batching["avg_batch_size"])
+    if admission is not None:
+        gauges["tweet_requests_in_flight"] = ("Admitted /analyze requests not yet answered.", admission.in_flight)
+        gauges["tweet_requests_waiting"] = ("/analyze requests waiting for admission.", admission.waiting)
+    source = _stats_source()
+    cache = source.cache_stats() if source is not None else None
+    if cache is not None:
+        gauges["tweet_cache_entries"] = ("Entries in the result cache.", cache["entries"])
+        gauges["tweet_cache_hit_rate"] = ("Result cache hit rate since startup.", cache["hit_rate"])
+    near_duplicates = source.near_duplicate_stats() if source is not None else None
+    if near_duplicates is not None:
+        gauges["tweet_near_duplicate_entries"] = ("Tweets in the near-duplicate index.", near_duplicates["entries"])
+        gauges["tweet_near_duplicate_hit_rate"] = (
+            "Near-duplicate index hit rate since startup.", near_duplicates["hit_rate"]
+        )
+    return gauges
+
+
+metrics.REGISTRY.add_gauge_callback(_service_gauges)
+HTTP_SECONDS = metrics.REGISTRY.histogram(
+    "tweet_http_request_seconds",
+    "End-to-end HTTP request latency.",
+    labelnames=("method", "path", "status"),
+)
+REJECTED = metrics.REGISTRY.counter(
+    "tweet_requests_rejected_total",
+    "/analyze requests turned away, by reason.",
+    labelnames=("reason",),
+)
+for _reason in ("not_ready", "queue_full", "deadline_waiting", "batch_queue_full", "deadline_queued"):
+    REJECTED.inc(0, reason=_reason)
+
+
+loader_version = registry.active_version()
+loader = ModelLoader(
+    _analyzer_factory(loader_version),
+    import_dependencies=import_heavy_dependencies,
+    warmup=WARMUP_ENABLED,
+    on_ready=_on_model_ready,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the model in the background so the server can bind immediately
+    loader.start()
+    yield
+    if batcher is not None:
+        batcher.stop()
+    if pool is not None:
+        pool.stop()
+
 
 app = FastAPI(
     title="Twitter Toxicity Detection API",
     description="API for detecting toxic comments on Twitter using BERT",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
-# Initialize analyzer
-analyzer = TweetAnalyzer()
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    # Label by route template so unknown paths do not create new series
+    path = route.path if route is not None else "unmatched"
+    HTTP_SECONDS.observe(
+        time.perf_counter() - started,
+        method=request.method, path=path, status=str(response.status_code),
+    )
+    return response
 
 
 class AnalyzeRequest(BaseModel):
@@ -56,40 +250,180 @@ class AnalyzeResponse(BaseModel):
 
 
 @app.get("/")
-def root():
+async def root():
     return {
         "message": "Twitter Toxicity Detection API",
         "version": "1.0.0",
         "endpoints": {
             "/health": "Health check",
-            "/analyze": "POST - Analyze tweet toxicity"
+            "/ready": "Readiness probe (model load phase and startup timings)",
+            "/stats": "Micro-batching, result cache, near-duplicate index and worker pool statistics",
+            "/metrics": "Prometheus metrics (per-stage latency histograms, served-by counters)",
+            "/analyze": "POST - Analyze tweet toxicity",
+            "/admin/models": "Registered model versions and the one being served (admin token)",
+            "/admin/models/activate": "POST - Switch to another model version without downtime (admin token)",
         }
     }
 
 
 @app.get("/health")
-def healthcheck() -> Dict:
-    return {"status": "ok", "model_loaded": analyzer.transformer_model is not None}
+async def healthcheck() -> Dict:
+    source = _stats_source()
+    return {
+        "status": "ok",
+        "phase": loader.phase,
+        "model_version": model_version,
+        "model_loaded": analyzer is not None and analyzer.transformer_backend is not None,
+        "batching": batcher.stats() if batcher is not None else None,
+        "cache": source.cache_stats() if source is not None else None,
+    }
+
+
+@app.get("/ready")
+async def readiness() -> JSONResponse:
+    """Readiness probe: 200 once the model is loaded and warm, 503 before."""
+    return JSONResponse(status_code=200 if loader.ready else 503, content=loader.status())
+
+
+@app.get("/stats")
+async def stats() -> Dict:
+    source = _stats_source()
+    return {
+        "admission": admission.stats() if admission is not None else None,
+        "batching": batcher.stats() if batcher is not None else None,
+        "cache": source.cache_stats() if source is not None else None,
+        "near_duplicates": source.near_duplicate_stats() if source is not None else None,
+        "pool": {**pool.stats(), "memory": pool.memory_report()} if pool is not None else None,
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics() -> PlainTextResponse:
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+def _reject(status_code: int, reason: str, detail: str, retry_after: int) -> HTTPException:
+    REJECTED.inc(reason=reason)
+    return HTTPException(status_code=status_code, detail=detail, headers={"Retry-After": str(retry_after)})
+
+
+def _submit(text: str, deadline: float):
+    try:
+        return batcher.submit(text, deadline=deadline)
+    except BatcherClosed:
+        # A model swap retired the batcher we picked up; the global now holds its successor
+        return batcher.submit(text, deadline=deadline)
+
+
+def _request_timeout(request: Request) -> float:
+    """Seconds this request may take; clients can only shorten the server default."""
+    timeout_ms = REQUEST_TIMEOUT_MS
+    header = request.headers.get("x-request-timeout-ms")
+    if header:
+        try:
+            timeout_ms = min(timeout_ms, max(float(header), 0.0))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="X-Request-Timeout-Ms must be a number.")
+    return timeout_ms / 1000.0
 
 
 @app.post("/analyze", response_model=AnalyzeResponse)
-def analyze(request: AnalyzeRequest) -> AnalyzeResponse:
+async def analyze(body: AnalyzeRequest, request: Request) -> AnalyzeResponse:
     """
     Analyze a tweet for toxicity.
     
     Returns sentiment classification (negative/toxic, neutral, positive)
     with confidence scores.
     """
+    if batcher is None or admission is None:
+        raise _reject(503, "not_ready", f"Model is not ready yet (phase: {loader.phase}).", 1)
+    started = time.perf_counter()
+    deadline = started + _request_timeout(request)
     try:
-        result = analyzer.analyze(request.tweet)
-        return AnalyzeResponse(
+        await admission.acquire(deadline - time.perf_counter())
+    except AdmissionRejected as rejected:
+        raise _reject(rejected.status_code, rejected.reason, rejected.detail, rejected.retry_after)
+
+    admitted = time.perf_counter()
+    try:
+        future = _submit(body.tweet, deadline)
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), deadline - time.perf_counter())
+        except asyncio.TimeoutError:
+            # Cancelling the wrapper cancels the queued item, so it is never scored
+            raise TimeoutError("Request deadline passed while queued.")
+    except queue.Full:
+        raise _reject(503, "batch_queue_full", "Server is busy, please retry shortly.", admission.retry_after())
+    except TimeoutError:
+        raise _reject(503, "deadline_queued", "Request deadline passed before it was scored.", admission.retry_after())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+    finally:
+        admission.release(time.perf_counter() - admitted)
+
+    loader.record_first_inference((time.perf_counter() - started) * 1000)
+    with metrics.stage("serialize"):
+        response = AnalyzeResponse(
             sentiment=result.sentiment_label,
             confidence=result.confidence,
             scores=result.sentiment_scores,
             message=result.to_dict()["sentiment"]["message"]
         )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+        # Rendered here (rather than by FastAPI afterwards) so it is timed
+        return JSONResponse(content=jsonable_encoder(response))
+
+
+class ActivateRequest(BaseModel):
+    version: str
+
+
+def _require_admin(request: Request) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set TWEET_ADMIN_TOKEN.")
+    supplied = request.headers.get("authorization", "")
+    if not hmac.compare_digest(supplied.encode("utf-8"), f"Bearer {ADMIN_TOKEN}".encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid admin token.", headers={"WWW-Authenticate": "Bearer"})
+
+
+def _swap_status() -> Optional[Dict]:
+    if swap_loader is None:
+        return None
+    return {"version": swap_version, **swap_loader.status()}
+
+
+@app.get("/admin/models")
+async def list_models(request: Request) -> Dict:
+    _require_admin(request)
+    return {
+        "serving": model_version,
+        "registry_active": registry.active_version(),
+        "versions": registry.list_versions(),
+        "swap": _swap_status(),
+    }
+
+
+@app.post("/admin/models/activate", status_code=202)
+async def activate_model(body: ActivateRequest, request: Request) -> Dict:
+    """Load, warm up and then switch to a registered version in the background.
+
+    Poll `GET /admin/models` until `serving` is the new version, or until
+    `swap.phase` is `failed`; the previous version keeps serving meanwhile.
+    """
+    global swap_loader, swap_version
+    _require_admin(request)
+    try:
+        registry.get_version(body.version)
+    except registry.RegistryError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    with _swap_lock:
+        if not loader.ready:
+            raise HTTPException(status_code=409, detail=f"Initial model load is not finished (phase: {loader.phase}).")
+        if swap_loader is not None and swap_loader.phase not in ("ready", "failed"):
+            raise HTTPException(status_code=409, detail=f"Already switching to {swap_version}.")
+        swap_version = body.version
+        swap_loader = ModelLoader(_analyzer_factory(body.version), warmup=WARMUP_ENABLED, on_ready=_on_swap_ready)
+        swap_loader.start()
+    return {"status": "loading", "version": body.version, "serving": model_version}
 
 
 if __name__ == "__main__":
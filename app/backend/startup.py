@@ -0,0 +1,100 @@
+"""
+Staged model startup for the FastAPI backend.
+
+The server binds right away while a background thread imports the heavy
+libraries, loads the analyzer and warms it up on a few synthetic batch shapes.
+`/ready` reports the current phase together with the measured durations so
+orchestrators can hold traffic until the model is warm.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, Optional
+
+PHASES = ("pending", "importing", "loading", "warming_up", "ready", "failed")
+
+
+class ModelLoader:
+    """Load an analyzer in the background and track the startup phase."""
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        import_dependencies: Optional[Callable[[], None]] = None,
+        warmup: bool = True,
+        on_ready: Optional[Callable[[Any], None]] = None,
+    ) -> None:
+        self.factory = factory
+        self.import_dependencies = import_dependencies
+        self.warmup = warmup
+        self.on_ready = on_ready
+        self.phase = "pending"
+        self.error: Optional[str] = None
+        self.analyzer: Optional[Any] = None
+        self.timings: Dict[str, Optional[float]] = {
+            "import_seconds": None,
+            "load_seconds": None,
+            "warmup_seconds": None,
+            "ready_after_seconds": None,
+            "first_inference_ms": None,
+        }
+        self._created_at = time.perf_counter()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.phase == "ready"
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="model-loader", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until loading finishes; returns True when the model is ready."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ready
+
+    def record_first_inference(self, elapsed_ms: float) -> None:
+        with self._lock:
+            if self.timings["first_inference_ms"] is None:
+                self.timings["first_inference_ms"] = elapsed_ms
+
+    def _timed(self, phase: str, key: str, step: Callable[[], Any]) -> Any:
+        self.phase = phase
+        started = time.perf_counter()
+        result = step()
+        self.timings[key] = time.perf_counter() - started
+        return result
+
+    def _run(self) -> None:
+        try:
+            if self.import_dependencies is not None:
+                self._timed("importing", "import_seconds", self.import_dependencies)
+            analyzer = self._timed("loading", "load_seconds", self.factory)
+            if self.warmup:
+                self._timed("warming_up", "warmup_seconds", analyzer.warmup)
+            self.analyzer = analyzer
+            if self.on_ready is not None:
+                self.on_ready(analyzer)
+            self.timings["ready_after_seconds"] = time.perf_counter() - self._created_at
+            self.phase = "ready"
+            print(f"Model ready: {self.status()['timings']}")
+        except Exception as exc:
+            self.error = f"{type(exc).__name__}: {exc}"
+            self.phase = "failed"
+            traceback.print_exc()
+
+    def status(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "phase": self.phase,
+            "error": self.error,
+            "timings": dict(self.timings),
+        }
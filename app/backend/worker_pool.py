@@ -0,0 +1,348 @@
+"""
+Multi-process inference pool whose workers share the memory-mapped model weights.
+
+Each worker is a fresh (`spawn`ed) process that builds its own
+`TweetAnalyzer` from the keyword arguments the pool was given. Workers are
+never forked from the server: the server runs torch thread pools and, during
+a hot-swap, live inference threads, and forking such a process can deadlock
+the child. Weight sharing comes from the files instead. `model.safetensors`
+and the compiled baseline arrays are memory-mapped (see
+`app.inference.weights`), so every worker maps the same page-cache pages and
+does not hold a private copy. A checkpoint with only `pytorch_model.bin` is
+loaded privately by each worker; convert it with
+`python -m app.inference.weights convert`.
+
+Each batch goes to the least busy worker's own queue, so the pool always
+knows which worker holds a batch. When a worker dies, every batch sent to it
+fails instead of waiting forever. Every reply carries the worker's result
+cache and near-duplicate counters, so the pool can report them summed over
+the workers (the server process itself scores nothing in pool mode).
+
+Usage (memory report against one standalone analyzer per worker):
+    python -m app.backend.worker_pool --workers 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.inference.memory import process_memory_mb
+
+
+def _worker_stats(analyzer) -> Dict:
+    return {"cache": analyzer.cache_stats(), "near_duplicates": analyzer.near_duplicate_stats()}
+
+
+def _merge_stats(per_worker: Sequence[Optional[Dict]]) -> Optional[Dict]:
+    """Sum per-worker counter dicts; settings are taken from the first worker."""
+    present = [stats for stats in per_worker if stats is not None]
+    if not present:
+        return None
+    merged = dict(present[0])
+    for key, value in merged.items():
+        if key != "hit_rate" and not key.startswith(("max_", "ttl_", "threshold")) and isinstance(value, int):
+            merged[key] = sum(stats.get(key, 0) for stats in present)
+    lookups = merged.get("hits", 0) + merged.get("misses", 0)
+    merged["hit_rate"] = merged.get("hits", 0) / lookups if lookups else 0.0
+    merged["workers"] = len(present)
+    return merged
+
+
+def _worker_main(analyzer_kwargs: Dict, index: int, task_queue, result_queue, threads_per_worker: int) -> None:
+    # Set before torch is imported: one intra-op thread per worker avoids
+    # oversubscribing the cores, and it takes precedence over the host profile
+    os.environ["OMP_NUM_THREADS"] = os.environ["MKL_NUM_THREADS"] = str(threads_per_worker)
+    try:
+        from app.inference.predictor import TweetAnalyzer
+
+        analyzer = TweetAnalyzer(**analyzer_kwargs)
+        analyzer.warmup()
+    except Exception as exc:
+        result_queue.put(("failed", index, False, f"{type(exc).__name__}: {exc}", None))
+        return
+    result_queue.put(("ready", index, True, None, _worker_stats(analyzer)))
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        task_id, texts, batch_size = task
+        try:
+            results = analyzer.analyze_batch(texts, batch_size=batch_size)
+            result_queue.put(("done", task_id, True, results, _worker_stats(analyzer)))
+        except Exception as exc:
+            result_queue.put(("done", task_id, False, exc, _worker_stats(analyzer)))
+
+
+class SharedModelPool:
+    """Dispatch `analyze_batch` calls to worker processes, each loading ``analyzer_kwargs``."""
+
+    def __init__(
+        self,
+        analyzer_kwargs: Optional[Dict] = None,
+        num_workers: Optional[int] = None,
+        threads_per_worker: int = 1,
+        ready_timeout: float = 600.0,
+    ) -> None:
+        self.analyzer_kwargs = dict(analyzer_kwargs or {})
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.threads_per_worker = threads_per_worker
+        self.ready_timeout = ready_timeout
+        self._ctx = multiprocessing.get_context("spawn")
+        self._processes: List[multiprocessing.Process] = []
+        self._task_queues: List = []
+        self._pending: Dict[int, Future] = {}
+        # task id -> index of the worker it was sent to, recorded at dispatch
+        self._assigned: Dict[int, int] = {}
+        self._outstanding: List[int] = []
+        self._ready: List[bool] = []
+        self._startup_errors: List[str] = []
+        # Latest cache / near-duplicate counters reported by each worker
+        self._worker_stats: List[Optional[Dict]] = []
+        self._lock = threading.Lock()
+        self._ready_changed = threading.Condition(self._lock)
+        self._ids = itertools.count()
+        self._collector: Optional[threading.Thread] = None
+        self._stopping = False
+        self.tasks_completed = 0
+        self.worker_restarts = 0
+
+    def _spawn_worker(self, index: int):
+        # A fresh queue per worker: a killed worker may leave its queue's lock held
+        task_queue = self._ctx.Queue()
+        if index < len(self._task_queues):
+            self._task_queues[index] = task_queue
+        else:
+            self._task_queues.append(task_queue)
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(self.analyzer_kwargs, index, task_queue, self._results, self.threads_per_worker),
+            name=f"inference-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    def start(self) -> None:
+        """Start the workers and wait until every one has loaded and warmed up its model."""
+        if self._processes:
+            return
+        self._results = self._ctx.Queue()
+        self._outstanding = [0] * self.num_workers
+        self._ready = [False] * self.num_workers
+        self._worker_stats = [None] * self.num_workers
+        self._processes = [self._spawn_worker(index) for index in range(self.num_workers)]
+        self._collector = threading.Thread(target=self._collect, name="pool-collector", daemon=True)
+        self._collector.start()
+        with self._ready_changed:
+            self._ready_changed.wait_for(lambda: all(self._ready) or self._startup_errors, self.ready_timeout)
+            error = self._startup_errors[0] if self._startup_errors else None
+            if error is None and not all(self._ready):
+                error = f"workers not ready after {self.ready_timeout:.0f}s"
+        if error is not None:
+            self.stop()
+            raise RuntimeError(f"Inference worker failed to start: {error}")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stopping = True
+        for task_queue in self._task_queues:
+            task_queue.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes, self._task_queues = [], []
+        with self._lock:
+            for future in self._pending.values():
+                future.set_exception(RuntimeError("Worker pool stopped."))
+            self._pending.clear()
+            self._assigned.clear()
+
+    def submit(self, texts: Sequence[str], batch_size: Optional[int] = None) -> Future:
+        if not self._processes:
+            raise RuntimeError("SharedModelPool has not been started.")
+        task_id = next(self._ids)
+        future: Future = Future()
+        with self._lock:
+            index = min(range(len(self._processes)), key=self._outstanding.__getitem__)
+            self._pending[task_id] = future
+            self._assigned[task_id] = index
+            self._outstanding[index] += 1
+            self._task_queues[index].put((task_id, list(texts), batch_size))
+        return future
+
+    def analyze_batch(self, texts: Sequence[str], batch_size: Optional[int] = None):
+        """Blocking call with the same contract as `TweetAnalyzer.analyze_batch`."""
+        return self.submit(texts, batch_size).result()
+
+    def _collect(self) -> None:
+        last_check = time.monotonic()
+        while not self._stopping:
+            if time.monotonic() - last_check >= 0.5:
+                self._check_workers()
+                last_check = time.monotonic()
+            try:
+                message = self._results.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            kind, task_id, ok, payload, worker_stats = message
+            if kind in ("ready", "failed"):
+                # task_id carries the worker index for these
+                with self._ready_changed:
+                    if kind == "ready":
+                        self._ready[task_id] = True
+                        self._worker_stats[task_id] = worker_stats
+                    else:
+                        self._startup_errors.append(payload)
+                    self._ready_changed.notify_all()
+                continue
+            with self._lock:
+                index = self._assigned.pop(task_id, None)
+                if index is not None:
+                    self._outstanding[index] -= 1
+                    self._worker_stats[index] = worker_stats
+                future = self._pending.pop(task_id, None)
+                self.tasks_completed += 1
+            if future is None:
+                continue
+            if ok:
+                future.set_result(payload)
+            else:
+                future.set_exception(payload)
+
+    def _check_workers(self) -> None:
+        """Replace dead workers and fail every batch that was sent to them."""
+        for index, process in enumerate(self._processes):
+            if process.is_alive() or self._stopping:
+                continue
+            if not self._ready[index]:
+                # Died while loading; start() reports it, a restart would fail the same way
+                with self._ready_changed:
+                    self._startup_errors.append(f"worker {index} exited with {process.exitcode} while loading")
+                    self._ready_changed.notify_all()
+                continue
+            print(f"Inference worker {index} (pid {process.pid}) exited with {process.exitcode}; restarting.")
+            with self._lock:
+                lost = [task_id for task_id, worker in self._assigned.items() if worker == index]
+                for task_id in lost:
+                    del self._assigned[task_id]
+                    future = self._pending.pop(task_id, None)
+                    if future is not None:
+                        future.set_exception(RuntimeError("Inference worker died before finishing the batch."))
+                self._outstanding[index] = 0
+                # The replacement takes batches as soon as it has loaded its model
+                self._processes[index] = self._spawn_worker(index)
+            self.worker_restarts += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "workers": self.num_workers,
+                "threads_per_worker": self.threads_per_worker,
+                "alive_workers": sum(process.is_alive() for process in self._processes),
+                "ready_workers": sum(self._ready),
+                "pending_batches": len(self._pending),
+                "tasks_completed": self.tasks_completed,
+                "worker_restarts": self.worker_restarts,
+            }
+
+    def cache_stats(self) -> Optional[Dict]:
+        """Result cache counters summed over the workers, or None when caching is off."""
+        with self._lock:
+            return _merge_stats([stats and stats["cache"] for stats in self._worker_stats])
+
+    def near_duplicate_stats(self) -> Optional[Dict]:
+        """Near-duplicate index counters summed over the workers, or None when it is off."""
+        with self._lock:
+            return _merge_stats([stats and stats["near_duplicates"] for stats in self._worker_stats])
+
+    def memory_report(self) -> Dict:
+        """Per-process memory of the parent and every worker (Linux only)."""
+        workers = [
+            {"pid": process.pid, **process_memory_mb(process.pid)} for process in self._processes
+        ]
+        return {
+            "parent": {"pid": os.getpid(), **process_memory_mb()},
+            "workers": workers,
+            "workers_total_pss_mb": sum(worker.get("pss_mb", 0.0) for worker in workers),
+        }
+
+
+_STANDALONE_SCRIPT = """
+import json, sys
+sys.path.insert(0, {root!r})
+from app.inference.memory import process_memory_mb
+from app.inference.predictor import TweetAnalyzer
+analyzer = TweetAnalyzer()
+analyzer.analyze_batch({texts!r})
+print(json.dumps(process_memory_mb()))
+"""
+
+
+def standalone_memory_mb(texts: Sequence[str]) -> Dict[str, float]:
+    """Memory of one independent process that loads its own analyzer.
+
+    This is what every extra uvicorn worker costs in the current setup.
+    """
+    script = _STANDALONE_SCRIPT.format(root=str(PROJECT_ROOT), texts=list(texts))
+    output = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument("--tweets", type=Path, default=PROJECT_ROOT / "test_tweets.csv")
+    args = parser.parse_args(argv)
+
+    texts = pd.read_csv(args.tweets)["tweet"].dropna().astype(str).tolist()
+    pool = SharedModelPool({}, args.workers, args.threads_per_worker)
+    pool.start()
+    started = time.perf_counter()
+    futures = [pool.submit(texts) for _ in range(args.workers * 4)]
+    for future in futures:
+        future.result()
+    elapsed = time.perf_counter() - started
+    report = pool.memory_report()
+    pool.stop()
+
+    standalone = standalone_memory_mb(texts[:8])
+    print(f"Scored {len(futures) * len(texts)} tweets in {elapsed:.2f}s across {args.workers} workers\n")
+    print(f"{'process':<12}{'pid':>8}{'RSS MB':>10}{'PSS MB':>10}{'shared MB':>11}{'private MB':>12}")
+    rows = [("parent", report["parent"])] + [(f"worker {i}", w) for i, w in enumerate(report["workers"])]
+    for name, usage in rows:
+        print(
+            f"{name:<12}{usage['pid']:>8}{usage.get('rss_mb', 0):>10.1f}{usage.get('pss_mb', 0):>10.1f}"
+            f"{usage.get('shared_mb', 0):>11.1f}{usage.get('private_mb', 0):>12.1f}"
+        )
+    pool_total = report["parent"].get("pss_mb", 0.0) + report["workers_total_pss_mb"]
+    separate_total = standalone.get("rss_mb", 0.0) * args.workers
+    print(f"\nPool total (parent + workers, PSS): {pool_total:.1f} MB")
+    print(f"Current setup ({args.workers} independent workers x {standalone.get('rss_mb', 0):.1f} MB RSS): "
+          f"{separate_total:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+Per-host CPU execution profiles: torch threads and batch size.
+
+By default torch sizes its intra-op and inter-op thread pools from the core
+count, and the analyzer scores 32 tweets per forward pass. Neither is the
+fastest setting on every CPU, and the default threads oversubscribe the cores
+when several processes share a box. `autotune` scores the installed BERT model
+over a grid of intra-op threads, inter-op threads and batch sizes. It writes
+the fastest setting to `models/execution_profiles/<host>.json`, and
+`TweetAnalyzer` applies the profile for its host at startup.
+
+`<host>` names the node type (CPU model and usable core count) rather than the
+machine, so a profile tuned on one node applies to every node of that type.
+Profiles hold one entry per engine (`bert-torch`, `bert-torch-int8`).
+
+torch fixes the inter-op pool the first time it runs anything in parallel, so
+each inter-op setting is measured in a fresh process. Intra-op threads and
+batch sizes are varied inside that process.
+
+Usage:
+    python -m app.inference.autotune
+    python -m app.inference.autotune --intra-threads 1,2,4 --inter-threads 1,2 --batch-sizes 8,16,32,64
+    TWEET_QUANTIZATION=dynamic python -m app.inference.autotune --max-p95-ms 50
+
+    # Print the profile the analyzer would apply on this host
+    python -m app.inference.autotune --show
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+_PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(_PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(_PROJECT_ROOT))
+
+PROFILE_DIR = _PROJECT_ROOT / "models" / "execution_profiles"
+# A profile file path, or "none" to start with torch's defaults
+PROFILE_SETTING = os.environ.get("TWEET_EXECUTION_PROFILE", "")
+DEFAULT_OUTPUT_DIR = _PROJECT_ROOT / "exports"
+RESULT_MARKER = "AUTOTUNE_RESULT "
+
+
+def usable_cpus() -> int:
+    """Cores this process may run on (respects affinity masks and cpusets)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as handle:
+            for line in handle:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine() or "unknown-cpu"
+
+
+def host_key() -> str:
+    """Node type, e.g. ``intel-r-xeon-r-platinum-8375c-cpu-2-90ghz-8cpu``."""
+    slug = re.sub(r"[^a-z0-9]+", "-", _cpu_model().lower()).strip("-")
+    return f"{slug}-{usable_cpus()}cpu"
+
+
+def engine_name(analyzer, loaded: bool = True) -> str:
+    """Engine ``analyzer`` serves, named like the benchmark's backends (``baseline`` without BERT).
+
+    With ``loaded=False`` it names the configured backend instead, for use while
+    the analyzer is still being built and has not loaded a model yet.
+    """
+    if not loaded:
+        backend = analyzer.backend_name
+    elif analyzer.transformer_backend is None:
+        return "baseline"
+    else:
+        backend = analyzer.transformer_backend.name
+    return f"bert-{backend}-int8" if analyzer.quantization == "dynamic" else f"bert-{backend}"
+
+
+def profile_path() -> Path:
+    if PROFILE_SETTING and PROFILE_SETTING.lower() != "none":
+        return Path(PROFILE_SETTING)
+    return PROFILE_DIR / f"{host_key()}.json"
+
+
+def load_profile(path: Optional[Path] = None) -> Optional[Dict]:
+    path = path or profile_path()
+    if not path.exists():
+        return None
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def apply_profile(engine: str) -> Optional[Dict]:
+    """Set torch's thread pools from this host's profile; returns the applied entry.
+
+    Returns None when profiles are disabled or no entry exists for ``engine``.
+    ``OMP_NUM_THREADS`` in the environment takes precedence over the profile's
+    intra-op thread count.
+    """
+    if PROFILE_SETTING.lower() == "none":
+        return None
+    path = profile_path()
+    try:
+        profile = load_profile(path)
+    except (OSError, ValueError) as exc:
+        print(f"Ignoring unreadable execution profile {path}: {exc}")
+        return None
+    entry = (profile or {}).get("engines", {}).get(engine)
+    if entry is None:
+        return None
+
+    import torch
+
+    if not os.environ.get("OMP_NUM_THREADS"):
+        torch.set_num_threads(entry["intra_op_threads"])
+    try:
+        torch.set_num_interop_threads(entry["inter_op_threads"])
+    except RuntimeError:
+        # Already fixed because something ran in parallel earlier in this process
+        pass
+    print(
+        f"Applied execution profile {path.name} ({engine}): {torch.get_num_threads()} intra-op / "
+        f"{torch.get_num_interop_threads()} inter-op threads, batch size {entry['batch_size']}"
+    )
+    return entry
+
+
+def default_thread_grid(limit: int) -> List[int]:
+    """Powers of two up to ``limit``, plus ``limit`` itself."""
+    grid = {limit}
+    threads = 1
+    while threads < limit:
+        grid.add(threads)
+        threads *= 2
+    return sorted(grid)
+
+
+def measure(
+    inter_threads: int,
+    intra_grid: Sequence[int],
+    batch_sizes: Sequence[int],
+    dataset: str,
+    passes: int,
+    limit: Optional[int],
+) -> List[Dict]:
+    """Score ``dataset`` at every (intra-op threads, batch size) in this process."""
+    import numpy as np
+    import torch
+
+    # Must happen before torch runs anything in parallel
+    torch.set_num_interop_threads(inter_threads)
+    from app.inference.benchmark import load_texts
+    from app.inference.predictor import TweetAnalyzer
+
+    analyzer = TweetAnalyzer(cache_max_entries=0, near_dup_max_entries=0)
+    engine = engine_name(analyzer)
+    if analyzer.transformer_backend is None or analyzer.transformer_backend.name != "torch":
+        raise RuntimeError(f"Autotuning needs the torch BERT model; the analyzer loaded {engine}.")
+    texts = load_texts(dataset, limit)
+
+    rows = []
+    for intra_threads in intra_grid:
+        torch.set_num_threads(intra_threads)
+        for batch_size in batch_sizes:
+            batches = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+            # One untimed batch warms up kernels and allocator pools
+            analyzer.analyze_batch(batches[0], batch_size=batch_size)
+            latencies = []
+            tick = time.perf_counter()
+            for _ in range(passes):
+                for batch in batches:
+                    call_started = time.perf_counter()
+                    analyzer.analyze_batch(batch, batch_size=batch_size)
+                    latencies.append((time.perf_counter() - call_started) * 1000)
+            elapsed = time.perf_counter() - tick
+            rows.append({
+                "engine": engine,
+                "intra_op_threads": intra_threads,
+                "inter_op_threads": inter_threads,
+                "batch_size": batch_size,
+                "tweets_per_sec": len(texts) * passes / elapsed,
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p95_ms": float(np.percentile(latencies, 95)),
+            })
+            print(
+                f"  intra {intra_threads:>2} inter {inter_threads:>2} batch {batch_size:>3}: "
+                f"{rows[-1]['tweets_per_sec']:8.1f} tweets/s, p95 {rows[-1]['p95_ms']:.1f} ms",
+                file=sys.stderr,
+            )
+    return rows
+
+
+def measure_in_subprocess(inter_threads: int, args: argparse.Namespace) -> List[Dict]:
+    command = [
+        sys.executable, "-m", "app.inference.autotune",
+        "--worker", str(inter_threads),
+        "--intra-threads", ",".join(str(value) for value in args.intra_threads),
+        "--batch-sizes", ",".join(str(value) for value in args.batch_sizes),
+        "--dataset", args.dataset,
+        "--passes", str(args.passes),
+    ]
+    if args.limit is not None:
+        command += ["--limit", str(args.limit)]
+    # Measure torch's own behaviour, not an existing profile or thread variables
+    env = {key: value for key, value in os.environ.items() if key not in ("OMP_NUM_THREADS", "MKL_NUM_THREADS")}
+    env["TWEET_EXECUTION_PROFILE"] = "none"
+    completed = subprocess.run(command, cwd=_PROJECT_ROOT, env=env, stdout=subprocess.PIPE, text=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    print(f"Measuring {inter_threads} inter-op thread(s) failed (exit status {completed.returncode}).")
+    return []
+
+
+def choose(rows: Sequence[Dict], max_p95_ms: Optional[float] = None, tolerance: float = 0.05) -> Optional[Dict]:
+    """Fastest setting within the latency budget, preferring fewer threads and smaller batches.
+
+    Settings within ``tolerance`` of the best throughput count as equally fast,
+    so a tie does not claim cores or batch latency it does not need.
+    """
+    eligible = [row for row in rows if max_p95_ms is None or row["p95_ms"] <= max_p95_ms]
+    if not eligible:
+        return None
+    best = max(row["tweets_per_sec"] for row in eligible)
+    close = [row for row in eligible if row["tweets_per_sec"] >= (1 - tolerance) * best]
+    return min(close, key=lambda row: (row["intra_op_threads"], row["inter_op_threads"], row["batch_size"]))
+
+
+def save_profile(chosen: Dict, path: Path) -> Dict:
+    """Record ``chosen`` as the profile entry for its engine, keeping other engines."""
+    import torch
+
+    try:
+        profile = load_profile(path) or {}
+    except (OSError, ValueError):
+        profile = {}
+    profile.update({
+        "host": host_key(),
+        "cpu_model": _cpu_model(),
+        "usable_cpus": usable_cpus(),
+        "torch": torch.__version__,
+    })
+    profile.setdefault("engines", {})[chosen["engine"]] = {
+        **{key: value for key, value in chosen.items() if key != "engine"},
+        "tuned_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        json.dump(profile, handle, indent=2)
+    os.replace(tmp_path, path)
+    return profile
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    cpus = usable_cpus()
+    parser.add_argument("--intra-threads", type=_int_list, default=default_thread_grid(cpus),
+                        help="Comma-separated intra-op thread counts (default: powers of two up to the core count)")
+    parser.add_argument("--inter-threads", type=_int_list, default=default_thread_grid(min(2, cpus)),
+                        help="Comma-separated inter-op thread counts")
+    parser.add_argument("--batch-sizes", type=_int_list, default=[8, 16, 32, 64])
+    parser.add_argument("--dataset", default="ground_truth", help="Dataset from app.inference.benchmark")
+    parser.add_argument("--limit", type=int, default=512, help="Tweets scored per setting")
+    parser.add_argument("--passes", type=int, default=2, help="Timed passes over the tweets per setting")
+    parser.add_argument("--max-p95-ms", type=float, default=None,
+                        help="Only consider settings whose p95 batch latency is below this")
+    parser.add_argument("--tolerance", type=float, default=0.05,
+                        help="Throughput within this fraction of the best counts as a tie")
+    parser.add_argument("--profile", type=Path, default=None, help="Profile file (default: this host's)")
+    parser.add_argument("--show", action="store_true", help="Print this host's profile and exit")
+    parser.add_argument("--worker", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker is not None:
+        rows = measure(args.worker, args.intra_threads, args.batch_sizes, args.dataset, args.passes, args.limit)
+        print(RESULT_MARKER + json.dumps(rows))
+        return
+
+    path = args.profile or profile_path()
+    if args.show:
+        profile = load_profile(path)
+        print(json.dumps(profile, indent=2) if profile is not None else f"No profile for {host_key()} at {path}")
+        return
+
+    rows = []
+    for inter_threads in args.inter_threads:
+        print(f"Measuring with {inter_threads} inter-op thread(s)...")
+        rows += measure_in_subprocess(inter_threads, args)
+    if not rows:
+        print("No setting could be measured.")
+        sys.exit(1)
+
+    import pandas as pd
+
+    DEFAULT_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    csv_path = DEFAULT_OUTPUT_DIR / f"autotune_{host_key()}_{rows[0]['engine']}.csv"
+    results = pd.DataFrame(rows).sort_values("tweets_per_sec", ascending=False)
+    results.to_csv(csv_path, index=False)
+    print(results.to_string(index=False, float_format=lambda value: f"{value:.1f}"))
+
+    chosen = choose(rows, args.max_p95_ms, args.tolerance)
+    if chosen is None:
+        print(f"No setting meets a p95 of {args.max_p95_ms} ms; profile left unchanged.")
+        sys.exit(1)
+    save_profile(chosen, path)
+    print(
+        f"\n{chosen['engine']} on {host_key()}: {chosen['intra_op_threads']} intra-op / "
+        f"{chosen['inter_op_threads']} inter-op threads, batch size {chosen['batch_size']} "
+        f"({chosen['tweets_per_sec']:.1f} tweets/s, p95 {chosen['p95_ms']:.1f} ms)"
+    )
+    print(f"Profile written to {path}; full grid in {csv_path}")
+
+
+if __name__ == "__main__":
+    main()
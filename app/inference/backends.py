@@ -0,0 +1,130 @@
+"""
+Inference backends for the transformer model.
+
+Every backend implements the same contract: `predict_logits(batch)` takes a
+dict of int64 NumPy arrays (`input_ids`, `attention_mask`, `token_type_ids`)
+shaped (batch, sequence) and returns float32 logits shaped (batch, 3). The
+analyzer tokenizes, buckets and post-processes; backends only run the network.
+
+Available backends:
+- `torch`: the Hugging Face PyTorch model (float or INT8 dynamic-quantized).
+- `onnx`: an ONNX Runtime session over `model.onnx` exported with
+  `python -m app.inference.export_onnx`.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.inference.metrics import stage
+
+BACKENDS = ("torch", "onnx")
+ONNX_MODEL_NAME = "model.onnx"
+
+
+class InferenceBackend:
+    """Base class: run the transformer on a padded batch and return its logits."""
+
+    name = "base"
+
+    def predict_logits(self, batch: Dict[str, np.ndarray]) -> np.ndarray:
+        raise NotImplementedError
+
+
+class TorchBackend(InferenceBackend):
+    name = "torch"
+
+    def __init__(self, model, device=None) -> None:
+        import torch
+
+        self._torch = torch
+        self.model = model
+        self.device = device if device is not None else torch.device("cpu")
+
+    def predict_logits(self, batch: Dict[str, np.ndarray]) -> np.ndarray:
+        torch = self._torch
+        with stage("forward"):
+            inputs = {key: torch.from_numpy(value).to(self.device) for key, value in batch.items()}
+            with torch.no_grad():
+                outputs = self.model(**inputs)
+        # On CUDA this also waits for the queued kernels to finish
+        with stage("transfer"):
+            return outputs.logits.cpu().numpy()
+
+
+class OnnxBackend(InferenceBackend):
+    name = "onnx"
+
+    def __init__(self, model_path: Path, intra_op_threads: Optional[int] = None) -> None:
+        try:
+            import onnxruntime as ort
+        except ImportError as exc:
+            raise ImportError(
+                "The onnxruntime package is required for the ONNX backend. "
+                "Install it via `pip install onnxruntime`."
+            ) from exc
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.model_path = Path(model_path)
+        self.session = ort.InferenceSession(
+            str(self.model_path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [node.name for node in self.session.get_inputs()]
+
+    def predict_logits(self, batch: Dict[str, np.ndarray]) -> np.ndarray:
+        feed = {name: batch[name] for name in self.input_names}
+        with stage("forward"):
+            return self.session.run(["logits"], feed)[0]
+
+
+def iter_length_buckets(
+    tokenizer, texts: Sequence[str], batch_size: int, max_length: int
+) -> Iterator[Tuple[np.ndarray, Dict[str, np.ndarray]]]:
+    """Tokenize ``texts`` once and yield ``(indices, arrays)`` buckets.
+
+    Texts are sorted by token count and split into buckets of ``batch_size``.
+    Each bucket is right-padded only to its own longest member; ``indices``
+    gives the input positions of the bucket's rows.
+    """
+    with stage("tokenize"):
+        encoded = tokenizer(list(texts), truncation=True, max_length=max_length)
+    lengths = np.fromiter(
+        (len(ids) for ids in encoded["input_ids"]), dtype=np.int64, count=len(texts)
+    )
+    order = np.argsort(lengths, kind="stable")
+    pad_id = tokenizer.pad_token_id or 0
+
+    for start in range(0, len(order), batch_size):
+        bucket = order[start:start + batch_size]
+        width = int(lengths[bucket[-1]])
+        with stage("pad"):
+            arrays = {
+                key: np.full((len(bucket), width), pad_id if key == "input_ids" else 0, dtype=np.int64)
+                for key in encoded.keys()
+            }
+            for row, index in enumerate(bucket):
+                for key, values in arrays.items():
+                    sequence = encoded[key][index]
+                    values[row, :len(sequence)] = sequence
+        yield bucket, arrays
+
+
+def predict_logits_bucketed(
+    backend: InferenceBackend,
+    tokenizer,
+    texts: Sequence[str],
+    batch_size: int,
+    max_length: int,
+    num_labels: int = 3,
+) -> np.ndarray:
+    """Run ``backend`` over length buckets and return logits in input order."""
+    logits = np.empty((len(texts), num_labels), dtype=np.float32)
+    for bucket, arrays in iter_length_buckets(tokenizer, texts, batch_size, max_length):
+        logits[bucket] = backend.predict_logits(arrays)
+    return logits
@@ -0,0 +1,278 @@
+"""
+Reproducible inference benchmark for `TweetAnalyzer`.
+
+Every backend is benchmarked in its own fresh Python process, so the cold-load
+time and peak RSS of one backend are not skewed by another. Within that
+process each dataset is scored at each batch size with the result cache off.
+Per (backend, dataset, batch size) the suite records:
+
+- cold-load time (imports and analyzer construction)
+- warm p50/p95/p99 latency of one `analyze_batch` call
+- tweets/sec
+- peak RSS
+
+Results go to `<output>.json` (with host metadata) and `<output>.csv`. With
+`--baseline`, the run exits with status 1 when a metric is worse than the
+stored run by more than `--max-regression`, or when a configuration of the
+stored run is missing from the new one.
+
+Usage:
+    python -m app.inference.benchmark --backends bert-torch,baseline --batch-sizes 1,8,32
+
+    # Store a reference run, then compare later runs against it
+    python -m app.inference.benchmark --output exports/benchmark_baseline
+    python -m app.inference.benchmark --baseline exports/benchmark_baseline.json --max-regression 0.15
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+_PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(_PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(_PROJECT_ROOT))
+
+from app.inference.autotune import engine_name
+
+DATASETS = {
+    "test_tweets": _PROJECT_ROOT / "test_tweets.csv",
+    "ground_truth": _PROJECT_ROOT / "Final_Project_Deliverables" / "ground_truth_test_set.csv",
+}
+
+# TweetAnalyzer keyword arguments of each benchmarked backend
+BENCHMARK_BACKENDS: Dict[str, Dict[str, str]] = {
+    "bert-torch": {"model": "auto", "backend": "torch", "quantization": "none"},
+    "bert-onnx": {"model": "auto", "backend": "onnx", "quantization": "none"},
+    "bert-int8": {"model": "auto", "backend": "torch", "quantization": "dynamic"},
+    "baseline": {"model": "baseline"},
+}
+
+DEFAULT_OUTPUT = _PROJECT_ROOT / "exports" / "benchmark_results"
+RESULT_MARKER = "BENCHMARK_RESULT "
+
+# Metric name -> True when larger values are better
+METRICS = {
+    "cold_load_seconds": False,
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "tweets_per_sec": True,
+    "peak_rss_mb": False,
+}
+KEY_COLUMNS = ["backend", "dataset", "batch_size"]
+
+
+def load_texts(dataset: str, limit: Optional[int] = None) -> List[str]:
+    from app.inference.bulk_score import resolve_text_column
+
+    df = pd.read_csv(DATASETS[dataset])
+    texts = df[resolve_text_column(list(df.columns))].dropna().astype(str)
+    texts = texts[texts.str.strip().str.len() > 0].tolist()
+    return texts[:limit] if limit is not None else texts
+
+
+def run_backend(
+    backend: str,
+    datasets: Sequence[str],
+    batch_sizes: Sequence[int],
+    passes: int = 3,
+    limit: Optional[int] = None,
+) -> List[Dict]:
+    """Benchmark one backend in the current process; returns one row per dataset and batch size."""
+    from app.inference.memory import peak_rss_mb
+
+    started = time.perf_counter()
+    from app.inference.predictor import TweetAnalyzer, import_heavy_dependencies
+
+    if backend != "baseline":
+        import_heavy_dependencies()
+    analyzer = TweetAnalyzer(cache_max_entries=0, near_dup_max_entries=0, **BENCHMARK_BACKENDS[backend])
+    cold_load_seconds = time.perf_counter() - started
+    expected = {"bert-torch": "bert-torch", "bert-onnx": "bert-onnx", "bert-int8": "bert-torch-int8"}
+    if expected.get(backend, "baseline") != engine_name(analyzer):
+        raise RuntimeError(f"{backend} is unavailable here; the analyzer loaded {engine_name(analyzer)}.")
+
+    torch = sys.modules.get("torch")
+    rows = []
+    for dataset in datasets:
+        texts = load_texts(dataset, limit)
+        for batch_size in batch_sizes:
+            batches = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+            # One untimed batch warms up kernels and allocator pools
+            analyzer.analyze_batch(batches[0], batch_size=batch_size)
+            latencies = []
+            tick = time.perf_counter()
+            for _ in range(passes):
+                for batch in batches:
+                    call_started = time.perf_counter()
+                    analyzer.analyze_batch(batch, batch_size=batch_size)
+                    latencies.append((time.perf_counter() - call_started) * 1000)
+            elapsed = time.perf_counter() - tick
+            rows.append({
+                "backend": backend,
+                "dataset": dataset,
+                "batch_size": batch_size,
+                "tweets": len(texts),
+                "passes": passes,
+                "cold_load_seconds": cold_load_seconds,
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p95_ms": float(np.percentile(latencies, 95)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+                "tweets_per_sec": len(texts) * passes / elapsed,
+                "peak_rss_mb": peak_rss_mb(),
+                "torch_threads": torch.get_num_threads() if torch is not None else None,
+            })
+    return rows
+
+
+def run_in_subprocess(backend: str, args: argparse.Namespace) -> List[Dict]:
+    command = [
+        sys.executable, "-m", "app.inference.benchmark",
+        "--worker", backend,
+        "--datasets", ",".join(args.datasets),
+        "--batch-sizes", ",".join(str(size) for size in args.batch_sizes),
+        "--passes", str(args.passes),
+    ]
+    if args.limit is not None:
+        command += ["--limit", str(args.limit)]
+    env = dict(os.environ)
+    if args.threads is not None:
+        # Fixed thread counts keep runs on the same host comparable
+        env.update(OMP_NUM_THREADS=str(args.threads), MKL_NUM_THREADS=str(args.threads))
+    completed = subprocess.run(command, cwd=_PROJECT_ROOT, env=env, capture_output=True, text=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    error = (completed.stderr.strip().splitlines() or ["no output"])[-1]
+    print(f"Skipping {backend}: {error}")
+    return []
+
+
+def host_metadata() -> Dict:
+    metadata = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+    }
+    for package in ("torch", "transformers", "onnxruntime", "sklearn"):
+        try:
+            metadata[package] = __import__(package).__version__
+        except ImportError:
+            metadata[package] = None
+    return metadata
+
+
+def find_regressions(current: pd.DataFrame, reference: pd.DataFrame, max_regression: float) -> pd.DataFrame:
+    """Rows where a metric is worse than ``reference`` by more than ``max_regression``.
+
+    Changes are relative: 0.1 flags a latency or RSS 10% higher, or a
+    throughput 10% lower, than the stored run. A (backend, dataset, batch
+    size) of the stored run that the current run did not produce, e.g.
+    because that backend failed to load, is reported with metric "missing".
+    """
+    merged = reference.merge(
+        current, on=KEY_COLUMNS, how="left", suffixes=("_reference", ""), indicator=True
+    )
+    regressions = [
+        {**{key: merged.at[index, key] for key in KEY_COLUMNS},
+         "metric": "missing", "reference": np.nan, "current": np.nan, "change": np.nan}
+        for index in merged.index[merged["_merge"] == "left_only"]
+    ]
+    for metric, higher_is_better in METRICS.items():
+        if f"{metric}_reference" not in merged or metric not in merged:
+            continue
+        new, old = merged[metric], merged[f"{metric}_reference"]
+        change = (new - old) / old.where(old != 0)
+        worse = change < -max_regression if higher_is_better else change > max_regression
+        for index in merged.index[worse.fillna(False)]:
+            regressions.append({
+                **{key: merged.at[index, key] for key in KEY_COLUMNS},
+                "metric": metric,
+                "reference": old[index],
+                "current": new[index],
+                "change": change[index],
+            })
+    return pd.DataFrame(regressions)
+
+
+def _csv_list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", type=_csv_list, default=["bert-torch", "baseline"],
+                        help=f"Comma-separated subset of {', '.join(BENCHMARK_BACKENDS)}")
+    parser.add_argument("--datasets", type=_csv_list, default=list(DATASETS),
+                        help=f"Comma-separated subset of {', '.join(DATASETS)}")
+    parser.add_argument("--batch-sizes", type=lambda value: [int(size) for size in _csv_list(value)],
+                        default=[1, 8, 32])
+    parser.add_argument("--passes", type=int, default=3, help="Timed passes over each dataset")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N tweets of each dataset")
+    parser.add_argument("--threads", type=int, default=None, help="OMP/MKL threads for the backend processes")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT, help="Writes <output>.json and <output>.csv")
+    parser.add_argument("--baseline", type=Path, default=None, help="Stored benchmark JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.10,
+                        help="Allowed relative slowdown per metric before the run fails")
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.backends if name not in BENCHMARK_BACKENDS]
+    unknown += [name for name in args.datasets if name not in DATASETS]
+    if unknown:
+        parser.error(f"Unknown backend or dataset: {', '.join(unknown)}")
+
+    if args.worker is not None:
+        rows = run_backend(args.worker, args.datasets, args.batch_sizes, args.passes, args.limit)
+        print(RESULT_MARKER + json.dumps(rows))
+        return
+
+    rows = []
+    for backend in args.backends:
+        print(f"Benchmarking {backend}...")
+        rows += run_in_subprocess(backend, args)
+    if not rows:
+        print("No backend could be benchmarked.")
+        sys.exit(1)
+
+    results = pd.DataFrame(rows)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    json_path, csv_path = args.output.with_suffix(".json"), args.output.with_suffix(".csv")
+    with open(json_path, "w", encoding="utf-8") as handle:
+        json.dump({"metadata": host_metadata(), "settings": {
+            "passes": args.passes, "limit": args.limit, "threads": args.threads,
+        }, "results": rows}, handle, indent=2)
+    results.to_csv(csv_path, index=False)
+
+    columns = KEY_COLUMNS + list(METRICS)
+    print(results[columns].to_string(index=False, float_format=lambda value: f"{value:.2f}"))
+    print(f"\nSaved to {json_path} and {csv_path}")
+
+    if args.baseline is not None:
+        with open(args.baseline, encoding="utf-8") as handle:
+            reference = pd.DataFrame(json.load(handle)["results"])
+        regressions = find_regressions(results, reference, args.max_regression)
+        if not regressions.empty:
+            print(f"\nRegressions beyond {args.max_regression:.0%} against {args.baseline}:")
+            print(regressions.to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+            sys.exit(1)
+        print(f"\nNo metric regressed by more than {args.max_regression:.0%} against {args.baseline}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Streaming, resumable bulk scoring of large tweet files.
+
+The input CSV or JSONL is read in fixed-size chunks. Each chunk is scored with
+`TweetAnalyzer.analyze_batch` and appended to the output file, so memory stays
+bounded by the chunk size whatever the input size. After every chunk a small
+`<output>.progress.json` file records how many input rows are done and how
+many output bytes they produced. An interrupted run started again with the
+same arguments truncates any partially written chunk and continues from there.
+
+Usage:
+    python -m app.inference.bulk_score Final_Project_Deliverables/TwitterToxicity.csv \\
+        --output exports/TwitterToxicity_scored.csv
+
+    # Start over instead of resuming
+    python -m app.inference.bulk_score tweets.jsonl --output scored.jsonl --restart
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+_PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(_PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(_PROJECT_ROOT))
+
+from app.inference.predictor import SENTIMENT_LABELS
+
+TEXT_COLUMN_CANDIDATES = ("tweet", "text", "review")
+DEFAULT_CHUNK_SIZE = 2048
+
+
+def file_format(path: Path) -> str:
+    """``"jsonl"`` for .jsonl/.ndjson files, ``"csv"`` otherwise."""
+    return "jsonl" if path.suffix.lower() in (".jsonl", ".ndjson") else "csv"
+
+
+def iter_chunks(path: Path, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Yield successive DataFrames of at most ``chunk_size`` rows.
+
+    JSONL records need not share their keys, so the first chunk fixes the
+    column set and every later chunk is reindexed to it (missing keys become
+    NaN, new keys are dropped). Every output chunk then has the same columns,
+    which keeps CSV output aligned with its header.
+    """
+    if file_format(path) == "csv":
+        yield from pd.read_csv(path, chunksize=chunk_size)
+        return
+    columns: Optional[List[str]] = None
+    with open(path, encoding="utf-8") as handle:
+        lines = (line for line in handle if line.strip())
+        while True:
+            block = list(itertools.islice(lines, chunk_size))
+            if not block:
+                return
+            chunk = pd.DataFrame([json.loads(line) for line in block])
+            if columns is None:
+                columns = list(chunk.columns)
+            else:
+                dropped = [column for column in chunk.columns if column not in columns]
+                if dropped:
+                    print(f"Ignoring keys absent from the first {chunk_size} records: {dropped}")
+                chunk = chunk.reindex(columns=columns)
+            yield chunk
+
+
+def resolve_text_column(columns: Sequence[str], requested: Optional[str] = None) -> str:
+    if requested is not None:
+        if requested not in columns:
+            raise ValueError(f"Column {requested!r} not found; available columns: {list(columns)}")
+        return requested
+    for candidate in TEXT_COLUMN_CANDIDATES:
+        if candidate in columns:
+            return candidate
+    raise ValueError(
+        f"No text column found (looked for {', '.join(TEXT_COLUMN_CANDIDATES)}); pass --text-column."
+    )
+
+
+def score_frame(analyzer, df: pd.DataFrame, text_column: str, batch_size: Optional[int] = None) -> pd.DataFrame:
+    """Return ``df`` with sentiment, confidence and per-class score columns added.
+
+    Rows with missing or blank text are kept with empty predictions, so row
+    counts always match the input. ``batch_size`` defaults to the analyzer's
+    own (host profile) batch size.
+    """
+    texts = df[text_column].fillna("").astype(str)
+    valid = texts.str.strip().ne("").to_numpy()
+    labels = np.full(len(df), None, dtype=object)
+    confidence = np.full(len(df), np.nan)
+    scores = np.full((len(df), len(SENTIMENT_LABELS)), np.nan)
+    if valid.any():
+        results = analyzer.analyze_batch(texts[valid].tolist(), batch_size=batch_size)
+        labels[valid] = [result.sentiment_label for result in results]
+        confidence[valid] = [result.confidence for result in results]
+        scores[valid] = [[result.sentiment_scores[label] for label in SENTIMENT_LABELS] for result in results]
+
+    scored = df.copy()
+    scored["sentiment"] = labels
+    scored["confidence"] = confidence
+    for column, label in enumerate(SENTIMENT_LABELS):
+        scored[f"score_{label}"] = scores[:, column]
+    return scored
+
+
+class ProgressFile:
+    """Atomic JSON record of how far a bulk-scoring run has got."""
+
+    def __init__(self, output_path: Path) -> None:
+        self.path = output_path.with_name(output_path.name + ".progress.json")
+
+    def load(self) -> Optional[Dict]:
+        if not self.path.exists():
+            return None
+        with open(self.path, encoding="utf-8") as handle:
+            return json.load(handle)
+
+    def save(self, state: Dict) -> None:
+        temporary = self.path.with_name(self.path.name + ".tmp")
+        with open(temporary, "w", encoding="utf-8") as handle:
+            json.dump(state, handle, indent=2)
+        os.replace(temporary, self.path)
+
+
+def _input_identity(path: Path) -> Dict:
+    stat = path.stat()
+    return {"input": str(path.resolve()), "input_size": stat.st_size, "input_mtime_ns": stat.st_mtime_ns}
+
+
+def _write_chunk(handle, scored: pd.DataFrame, fmt: str, write_header: bool) -> None:
+    if fmt == "csv":
+        scored.to_csv(handle, index=False, header=write_header)
+    else:
+        records = scored.to_json(orient="records", lines=True, force_ascii=False)
+        # Older pandas versions omit the trailing newline
+        handle.write(records if records.endswith("\n") else records + "\n")
+
+
+def bulk_score(
+    analyzer,
+    input_path: Path,
+    output_path: Path,
+    text_column: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    batch_size: Optional[int] = None,
+    restart: bool = False,
+) -> Dict:
+    """Score ``input_path`` into ``output_path`` chunk by chunk, resuming if possible.
+
+    Returns a summary with the rows scored in this run and the throughput.
+    """
+    progress = ProgressFile(output_path)
+    identity = _input_identity(input_path)
+    state = None if restart else progress.load()
+    if state is not None and {key: state.get(key) for key in identity} != identity:
+        raise ValueError(
+            f"{progress.path} belongs to a different input file; pass --restart to overwrite {output_path}."
+        )
+    if state is None:
+        state = {**identity, "rows_done": 0, "output_bytes": 0, "completed": False}
+    if state["completed"]:
+        print(f"{output_path} is already complete ({state['rows_done']} rows); pass --restart to redo it.")
+        return {"rows_scored": 0, "rows_total": state["rows_done"], "seconds": 0.0, "rows_per_sec": 0.0}
+
+    output_format = file_format(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    skip = state["rows_done"]
+    if skip:
+        print(f"Resuming after {skip} rows already written to {output_path}")
+
+    scored_rows = 0
+    started = time.perf_counter()
+    # Drop anything written after the last checkpoint (an interrupted chunk)
+    with open(output_path, "a+b") as raw:
+        raw.truncate(state["output_bytes"])
+    with open(output_path, "a", encoding="utf-8", newline="") as handle:
+        for chunk in iter_chunks(input_path, chunk_size):
+            if skip >= len(chunk):
+                skip -= len(chunk)
+                continue
+            chunk = chunk.iloc[skip:]
+            skip = 0
+            column = resolve_text_column(list(chunk.columns), text_column)
+            scored = score_frame(analyzer, chunk, column, batch_size)
+            _write_chunk(handle, scored, output_format, write_header=state["output_bytes"] == 0)
+            handle.flush()
+            os.fsync(handle.fileno())
+
+            scored_rows += len(chunk)
+            state["rows_done"] += len(chunk)
+            state["output_bytes"] = output_path.stat().st_size
+            progress.save(state)
+            elapsed = time.perf_counter() - started
+            print(f"{state['rows_done']} rows done | {scored_rows / elapsed:,.0f} rows/sec")
+
+    state["completed"] = True
+    progress.save(state)
+    elapsed = time.perf_counter() - started
+    return {
+        "rows_scored": scored_rows,
+        "rows_total": state["rows_done"],
+        "seconds": elapsed,
+        "rows_per_sec": scored_rows / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from app.inference.predictor import TweetAnalyzer
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", type=Path, help="CSV or JSONL file with one tweet per row")
+    parser.add_argument("--output", type=Path, default=None, help="Defaults to exports/<input stem>_scored.<ext>")
+    parser.add_argument("--text-column", default=None, help=f"Defaults to the first of {TEXT_COLUMN_CANDIDATES}")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows read and checkpointed at a time")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="Tweets per forward pass (default: the host profile's batch size)")
+    parser.add_argument("--restart", action="store_true", help="Ignore saved progress and overwrite the output")
+    args = parser.parse_args(argv)
+
+    output_path = args.output or _PROJECT_ROOT / "exports" / f"{args.input.stem}_scored{args.input.suffix}"
+    # Bulk inputs rarely repeat, so the result cache would only cost memory
+    analyzer = TweetAnalyzer(cache_max_entries=0, near_dup_max_entries=0)
+    summary = bulk_score(
+        analyzer,
+        args.input,
+        output_path,
+        text_column=args.text_column,
+        chunk_size=args.chunk_size,
+        batch_size=args.batch_size,
+        restart=args.restart,
+    )
+    print(
+        f"Scored {summary['rows_scored']} rows in {summary['seconds']:.1f}s "
+        f"({summary['rows_per_sec']:,.0f} rows/sec); {summary['rows_total']} rows in {output_path}"
+    )
+
+
+if __name__ == "__main__":
+    main()
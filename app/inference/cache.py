@@ -0,0 +1,275 @@
+"""
+Bounded in-process result caches for the Twitter toxicity analyzer.
+
+`ResultCache` answers exact repeats. Entries are evicted least-recently-used
+first whenever the cache exceeds its entry or memory budget, and expire after
+an optional time-to-live. `NearDuplicateIndex` answers near-copies, such as
+the same text with another @mention, URL, hashtag or emoji. It is bounded by
+entry count and evicts least-recently-used entries too. Lookups and inserts
+on both are thread-safe, so they can be shared by API worker threads.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+_WHITESPACE_RE = re.compile(r"\s+")
+# Parts of a tweet that vary between copies of the same message
+_VARIABLE_PARTS_RE = re.compile(r"(?:https?://|www\.)\S+|[@#]\w+")
+# Words and numbers; emoji and punctuation are not part of any token
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+# Rough per-entry overhead (OrderedDict node, tuple and float objects) added to
+# the measured size of the key and value when enforcing the memory budget.
+_ENTRY_OVERHEAD_BYTES = 200
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace, the variations the models ignore."""
+    return _WHITESPACE_RE.sub(" ", text.lower()).strip()
+
+
+def file_fingerprint(paths: Iterable[Path]) -> str:
+    """Cheap fingerprint of model files based on their name, size and mtime.
+
+    Missing files are skipped, so the fingerprint only reflects what exists.
+    """
+    digest = hashlib.sha256()
+    for path in sorted(Path(p) for p in paths):
+        if path.exists():
+            stat = path.stat()
+            digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()[:16]
+
+
+def _sizeof(obj: Any) -> int:
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (tuple, list)):
+        size += sum(_sizeof(item) for item in obj)
+    return size
+
+
+class ResultCache:
+    """LRU cache bounded by entry count and approximate memory, with optional TTL."""
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: Optional[float] = None,
+    ) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries must be a positive integer.")
+        if max_bytes < 1:
+            raise ValueError("max_bytes must be a positive integer.")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds if ttl_seconds and ttl_seconds > 0 else None
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, stored_at, size = entry
+            if self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = _sizeof(key) + _sizeof(value) + _ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._entries[key] = (value, time.monotonic(), size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def similarity_shingles(text: str) -> FrozenSet[str]:
+    """Words and adjacent word pairs of ``text`` without mentions, URLs, hashtags or emoji."""
+    tokens = _TOKEN_RE.findall(_VARIABLE_PARTS_RE.sub(" ", text.lower()))
+    return frozenset(tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])])
+
+
+@dataclass(frozen=True)
+class NearDuplicateProbe:
+    """A tweet's shingles and LSH band keys, computed once for lookup and insert."""
+
+    shingles: FrozenSet[str]
+    band_keys: Tuple[Hashable, ...]
+
+
+class NearDuplicateIndex:
+    """Recently scored tweets, found again by Jaccard similarity of their shingles.
+
+    MinHash signatures of `similarity_shingles` are split into bands; tweets
+    sharing any band are candidates, and a candidate is a match when the exact
+    Jaccard similarity reaches ``threshold``. With the default 8 bands of 4
+    rows a pair at similarity 0.8 becomes a candidate 98.5% of the time. Keys
+    also carry the sarcasm keyword hits, which the decision rules read, so a
+    stored result is only reused for a tweet the rules treat the same way.
+    """
+
+    NUM_PERMUTATIONS = 32
+    NUM_BANDS = 8
+    # Bounds the cost of a lookup when many stored tweets share a band
+    MAX_CANDIDATES = 64
+    # Multiply-shift hash family: (a * x + b) mod 2**64, top 32 bits, odd a.
+    # Fixed seed, so every index (and process) computes the same signatures.
+    _rng = np.random.default_rng(0)
+    _A = _rng.integers(0, 2**63, size=(NUM_PERMUTATIONS, 1), dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    _B = _rng.integers(0, 2**63, size=(NUM_PERMUTATIONS, 1), dtype=np.uint64)
+    del _rng
+
+    def __init__(self, max_entries: int = 10000, threshold: float = 0.8, min_shingles: int = 3) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries must be a positive integer.")
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError("threshold must be in (0, 1].")
+        self.max_entries = max_entries
+        self.threshold = threshold
+        # Very short tweets differ in meaning by a single word; they are never indexed
+        self.min_shingles = min_shingles
+        self._rows = self.NUM_PERMUTATIONS // self.NUM_BANDS
+        # entry id -> (shingles, band keys, value)
+        self._entries: "OrderedDict[int, Tuple[FrozenSet[str], Tuple[Hashable, ...], Any]]" = OrderedDict()
+        self._buckets: Dict[Hashable, Set[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def probe(self, text: str, keyword_hits: bytes = b"") -> Optional[NearDuplicateProbe]:
+        """Shingles and band keys of ``text``, or None when it is too short to index."""
+        shingles = similarity_shingles(text)
+        if len(shingles) < self.min_shingles:
+            with self._lock:
+                self.skipped += 1
+            return None
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles)
+        )
+        permuted = self._A * hashes
+        permuted += self._B
+        permuted >>= np.uint64(32)
+        signature = permuted.min(axis=1).astype(np.uint32).tobytes()
+        width = 4 * self._rows
+        band_keys = tuple(
+            (band, keyword_hits, signature[band * width:(band + 1) * width]) for band in range(self.NUM_BANDS)
+        )
+        return NearDuplicateProbe(shingles, band_keys)
+
+    def get(self, probe: NearDuplicateProbe) -> Optional[Any]:
+        """Value of the most similar stored tweet at or above the threshold."""
+        with self._lock:
+            candidates: List[int] = []
+            for key in probe.band_keys:
+                candidates.extend(self._buckets.get(key, ()))
+            best_id, best_similarity = None, self.threshold
+            for entry_id in set(candidates[:self.MAX_CANDIDATES]):
+                shingles = self._entries[entry_id][0]
+                similarity = len(shingles & probe.shingles) / len(shingles | probe.shingles)
+                if similarity >= best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id][2]
+
+    def put(self, probe: NearDuplicateProbe, value: Any) -> None:
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (probe.shingles, probe.band_keys, value)
+            for key in probe.band_keys:
+                self._buckets.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                evicted_id, (_, band_keys, _) = self._entries.popitem(last=False)
+                for key in band_keys:
+                    bucket = self._buckets[key]
+                    bucket.discard(evicted_id)
+                    if not bucket:
+                        del self._buckets[key]
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "skipped_short": self.skipped,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,134 @@
+"""
+Threshold sweep for the confidence-gated TF-IDF -> BERT cascade.
+
+With `TWEET_MODEL=cascade` every tweet is scored by the TF-IDF baseline first.
+Only tweets whose baseline certainty is below `TWEET_CASCADE_THRESHOLD` are
+escalated to BERT. Certainty is either the top score (`confidence`) or the gap
+between the top two scores (`margin`). This tool scores a split once with
+both models and replays the cascade decision for a grid of thresholds. For
+each threshold it reports the escalation rate, macro-F1 and estimated compute
+per tweet, and then suggests the cheapest threshold within `--max-f1-drop` of
+BERT alone.
+
+Usage:
+    python -m app.inference.cascade --split val
+    python -m app.inference.cascade --gate margin --max-f1-drop 0.005
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score, f1_score
+
+from app.inference import postprocess
+from app.inference.data import load_split
+from app.inference.predictor import DEFAULT_BATCH_SIZE, TweetAnalyzer, _PROJECT_ROOT
+
+REPORT_DIR = _PROJECT_ROOT / "exports"
+DEFAULT_THRESHOLDS = np.round(np.arange(0.0, 1.0001, 0.025), 3)
+
+
+def score_both(analyzer: TweetAnalyzer, texts: Sequence[str], batch_size: int = DEFAULT_BATCH_SIZE) -> Dict:
+    """Baseline and BERT score matrices for ``texts`` plus per-tweet cost of each model."""
+    texts = list(texts)
+    hits = postprocess.keyword_hits(texts, analyzer.postprocess)
+    started = time.perf_counter()
+    baseline = analyzer._predict_baseline_batch(texts, hits)
+    baseline_ms = (time.perf_counter() - started) * 1000 / len(texts)
+    started = time.perf_counter()
+    bert = analyzer._predict_transformer_batch(texts, batch_size, hits)
+    bert_ms = (time.perf_counter() - started) * 1000 / len(texts)
+    return {
+        "baseline": baseline, "bert": bert, "hits": hits, "postprocess": analyzer.postprocess,
+        "baseline_ms": baseline_ms, "bert_ms": bert_ms,
+    }
+
+
+def sweep(
+    scored: Dict,
+    labels: np.ndarray,
+    gate: str = "confidence",
+    thresholds: Sequence[float] = DEFAULT_THRESHOLDS,
+) -> pd.DataFrame:
+    """Replay the cascade for each threshold; one report row per threshold."""
+    baseline, bert, hits = scored["baseline"], scored["bert"].astype(np.float64), scored["hits"]
+    certainty = postprocess.gate_values(baseline, gate)
+    rows = []
+    # A threshold above 1 escalates everything, i.e. BERT alone
+    for threshold in list(thresholds) + [1.01]:
+        escalate = certainty < threshold
+        combined = np.where(escalate[:, None], bert, baseline)
+        label_index, _ = postprocess.decide(combined, hits, scored["postprocess"])
+        # Decision indices 0/1/2 correspond to dataset labels -1/0/1
+        predictions = label_index - 1
+        rate = float(escalate.mean())
+        rows.append({
+            "gate": gate,
+            "threshold": float(threshold),
+            "escalation_rate": rate,
+            "f1_macro": float(f1_score(labels, predictions, labels=[-1, 0, 1], average="macro", zero_division=0)),
+            "accuracy": float(accuracy_score(labels, predictions)),
+            "est_ms_per_tweet": scored["baseline_ms"] + rate * scored["bert_ms"],
+        })
+    report = pd.DataFrame(rows)
+    bert_only = report.iloc[-1]
+    report["f1_delta_vs_bert"] = report["f1_macro"] - bert_only["f1_macro"]
+    report["bert_compute_saved"] = 1.0 - report["escalation_rate"]
+    return report
+
+
+def recommend(report: pd.DataFrame, max_f1_drop: float) -> pd.Series:
+    """Lowest-escalation row whose macro-F1 is within ``max_f1_drop`` of BERT alone."""
+    eligible = report[report["f1_delta_vs_bert"] >= -max_f1_drop]
+    return eligible.sort_values(["escalation_rate", "f1_macro"], ascending=[True, False]).iloc[0]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--split", choices=["train", "val", "test"], default="val")
+    parser.add_argument("--gate", choices=list(postprocess.CASCADE_GATES) + ["both"], default="both")
+    parser.add_argument("--max-f1-drop", type=float, default=0.01, help="Allowed macro-F1 loss versus BERT alone")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N tweets of the split")
+    parser.add_argument("--output-dir", type=Path, default=REPORT_DIR)
+    args = parser.parse_args(argv)
+
+    analyzer = TweetAnalyzer(cache_max_entries=0, near_dup_max_entries=0)
+    if analyzer.transformer_backend is None or analyzer.baseline_pipeline is None:
+        raise SystemExit("The cascade sweep needs both the BERT checkpoint and the baseline model.")
+
+    texts, labels = load_split(args.split)
+    if args.limit is not None:
+        texts, labels = texts[:args.limit], labels[:args.limit]
+    print(f"Scoring {len(texts)} {args.split} tweets with both models...")
+    scored = score_both(analyzer, texts, args.batch_size)
+    print(f"Baseline {scored['baseline_ms']:.3f} ms/tweet, BERT {scored['bert_ms']:.3f} ms/tweet")
+
+    gates = postprocess.CASCADE_GATES if args.gate == "both" else (args.gate,)
+    report = pd.concat([sweep(scored, labels, gate) for gate in gates], ignore_index=True)
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    output_path = args.output_dir / f"cascade_sweep_{args.split}.csv"
+    report.to_csv(output_path, index=False)
+
+    columns = ["gate", "threshold", "escalation_rate", "f1_macro", "f1_delta_vs_bert", "est_ms_per_tweet"]
+    print(report[columns].to_string(index=False, float_format=lambda value: f"{value:.4f}"))
+    best = recommend(report, args.max_f1_drop)
+    print(
+        f"\nRecommended (macro-F1 within {args.max_f1_drop} of BERT): "
+        f"TWEET_MODEL=cascade TWEET_CASCADE_GATE={best['gate']} TWEET_CASCADE_THRESHOLD={best['threshold']:g}"
+    )
+    print(
+        f"  escalates {best['escalation_rate']:.1%} of tweets to BERT, "
+        f"macro-F1 {best['f1_macro']:.4f} ({best['f1_delta_vs_bert']:+.4f} vs BERT)"
+    )
+    print(f"\nSaved to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,448 @@
+"""
+Compiled, memory-mapped form of the TF-IDF + logistic regression baseline.
+
+The joblib baseline needs `TfidfVectorizer.transform` and
+`LogisticRegression.predict_proba` for every batch. Each call spends most of
+its time in sklearn input validation, and every process unpickles its own
+vocabulary dict and coefficient matrix. Compiling turns the fitted pair into
+plain arrays in `models/baseline_compiled/<key>/`, where the key is a hash of
+the two joblib files:
+
+- `terms.npy`: the vocabulary as sorted UTF-8 byte strings
+- `weights.npy`: one row per term holding its IDF weight followed by its
+  logistic regression coefficient for every class
+- `intercept.npy`: the per-class intercepts
+- `meta.json`: tokenizer settings, classes, the probability link and SHA-256
+  hashes of the joblib files the arrays were built from
+
+The arrays are build outputs, not part of the repository: the analyzer
+compiles them the first time it loads a joblib pair (checking them against
+sklearn on texts made of the vocabulary's own terms) and reuses them while the
+joblib files are unchanged. They are opened with `np.load(mmap_mode="r")`, so
+processes serving the baseline share one copy in the page cache. `CompiledBaseline` reproduces the
+vectorizer's analyzer (lowercasing, token pattern, word n-grams) and performs
+the same floating-point operations in the same order as sklearn, so its
+probabilities match the joblib pipeline bit for bit. The compile command
+checks this over the whole dataset.
+
+The IDF weight is kept as its own column rather than pre-multiplied into the
+coefficients. Pre-multiplying would change the rounding and break the exact
+match.
+
+Usage:
+    # Compile models/baseline_tfidf_*.joblib ahead of time and check it against
+    # sklearn over the whole dataset
+    python -m app.inference.compiled_baseline compile
+
+    # Time both scorers on the dataset
+    python -m app.inference.compiled_baseline report --batch-sizes 1,32,1024
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from importlib import metadata
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+META_NAME = "meta.json"
+FORMAT_VERSION = 1
+
+
+class SparseRows(NamedTuple):
+    """TF-IDF rows of a batch in CSR order: entries sorted by document, then term."""
+
+    doc: np.ndarray
+    term: np.ndarray
+    value: np.ndarray
+    n_docs: int
+
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def installed_sklearn_version() -> Optional[str]:
+    """Version of the installed scikit-learn, read without importing it."""
+    try:
+        return metadata.version("scikit-learn")
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def check_supported(vectorizer) -> None:
+    """Raise ValueError for vectorizer settings the compiled analyzer does not reproduce."""
+    unsupported = {
+        "analyzer": vectorizer.analyzer != "word",
+        "preprocessor": vectorizer.preprocessor is not None,
+        "tokenizer": vectorizer.tokenizer is not None,
+        "strip_accents": vectorizer.strip_accents is not None,
+        "stop_words": bool(getattr(vectorizer, "stop_words_", None)) or vectorizer.stop_words is not None,
+        "binary": vectorizer.binary,
+        "norm": vectorizer.norm not in ("l2", None),
+        "dtype": np.dtype(vectorizer.dtype) != np.float64,
+    }
+    found = [name for name, flag in unsupported.items() if flag]
+    if found:
+        raise ValueError(f"Unsupported TfidfVectorizer settings: {', '.join(found)}.")
+
+
+def _probability_link(model, features) -> str:
+    """``"softmax"`` or ``"ovr"``, whichever the installed sklearn uses for ``model``.
+
+    Older sklearn releases normalise one-vs-rest sigmoids for liblinear models
+    while newer ones apply a softmax, so the link is detected, not assumed.
+    """
+    from scipy.special import expit, softmax
+
+    decision = model.decision_function(features)
+    expected = model.predict_proba(features)
+    ovr = expit(decision)
+    ovr /= ovr.sum(axis=1, keepdims=True)
+    if np.allclose(expected, softmax(decision, axis=1), rtol=0, atol=1e-12):
+        return "softmax"
+    if np.allclose(expected, ovr, rtol=0, atol=1e-12):
+        return "ovr"
+    raise ValueError("predict_proba is neither a softmax nor normalised one-vs-rest sigmoids.")
+
+
+def compile_baseline(
+    vectorizer,
+    model,
+    output_dir: Path,
+    source_paths: Sequence[Path] = (),
+    probe_texts: Sequence[str] = ("good day", "bad day"),
+) -> Path:
+    """Write the arrays and metadata for ``vectorizer`` + ``model`` to ``output_dir``."""
+    check_supported(vectorizer)
+    if model.coef_.ndim != 2 or model.coef_.shape[0] < 3:
+        raise ValueError("Only multiclass logistic regression models can be compiled.")
+
+    vocabulary = vectorizer.vocabulary_
+    # UTF-8 preserves code point order, so byte order matches the vectorizer's column order
+    encoded = sorted((term.encode("utf-8"), column) for term, column in vocabulary.items())
+    columns = np.array([column for _, column in encoded], dtype=np.int64)
+    terms = np.array([term for term, _ in encoded], dtype=f"S{max(len(term) for term, _ in encoded)}")
+
+    n_terms, n_classes = len(columns), model.coef_.shape[0]
+    weights = np.empty((n_terms, n_classes + 1), dtype=np.float64)
+    weights[:, 0] = vectorizer.idf_[columns] if vectorizer.use_idf else 1.0
+    weights[:, 1:] = model.coef_.T[columns]
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    np.save(output_dir / "terms.npy", terms)
+    np.save(output_dir / "weights.npy", weights)
+    np.save(output_dir / "intercept.npy", np.asarray(model.intercept_, dtype=np.float64))
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "classes": [int(label) for label in model.classes_],
+        "lowercase": bool(vectorizer.lowercase),
+        "token_pattern": vectorizer.token_pattern,
+        "ngram_range": list(vectorizer.ngram_range),
+        "sublinear_tf": bool(vectorizer.sublinear_tf),
+        "use_idf": bool(vectorizer.use_idf),
+        "norm": vectorizer.norm,
+        "link": _probability_link(model, vectorizer.transform(list(probe_texts))),
+        "sources": {Path(path).name: sha256_file(Path(path)) for path in source_paths},
+        "sklearn_version": installed_sklearn_version(),
+    }
+    with open(output_dir / META_NAME, "w", encoding="utf-8") as handle:
+        json.dump(meta, handle, indent=2)
+    return output_dir
+
+
+class WordNgramAnalyzer:
+    """sklearn-free equivalent of `TfidfVectorizer.build_analyzer()` for word n-grams.
+
+    Only covers the settings `check_supported` accepts.
+    """
+
+    def __init__(self, token_pattern: str, lowercase: bool, ngram_range: Sequence[int]) -> None:
+        self.token_pattern = token_pattern
+        self.lowercase = lowercase
+        self.min_n, self.max_n = ngram_range
+        self._token_re = re.compile(token_pattern)
+
+    @classmethod
+    def from_vectorizer(cls, vectorizer) -> "WordNgramAnalyzer":
+        check_supported(vectorizer)
+        return cls(vectorizer.token_pattern, vectorizer.lowercase, vectorizer.ngram_range)
+
+    def __call__(self, text: str) -> List[str]:
+        return self.ngrams(self.tokens(text))
+
+    def tokens(self, text: str) -> List[str]:
+        return self._token_re.findall(text.lower() if self.lowercase else text)
+
+    def ngrams(self, tokens: list, separator=" ") -> list:
+        """Tokens followed by their 2..max_n-grams, joined with ``separator`` (str or bytes)."""
+        grams = list(tokens) if self.min_n == 1 else []
+        join = separator.join
+        for n in range(max(self.min_n, 2), min(self.max_n, len(tokens)) + 1):
+            grams.extend(join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return grams
+
+
+class CompiledBaseline:
+    """TF-IDF + logistic regression scorer over memory-mapped arrays.
+
+    It stands in for both halves of the joblib pipeline: `transform` replaces
+    the vectorizer and `predict_proba` plus `classes_` replace the model.
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = Path(directory)
+        with open(self.directory / META_NAME, encoding="utf-8") as handle:
+            self.meta = json.load(handle)
+        if self.meta.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"{self.directory} uses format {self.meta.get('format_version')}, not {FORMAT_VERSION}.")
+        # Plain ndarray views of the mappings skip np.memmap's per-index overhead
+        self.terms = np.asarray(np.load(self.directory / "terms.npy", mmap_mode="r"))
+        self.weights = np.asarray(np.load(self.directory / "weights.npy", mmap_mode="r"))
+        self.intercept = np.load(self.directory / "intercept.npy")
+        self.classes_ = np.array(self.meta["classes"])
+        self.analyzer = WordNgramAnalyzer(self.meta["token_pattern"], self.meta["lowercase"], self.meta["ngram_range"])
+
+    def analyze(self, text: str) -> List[str]:
+        return self.analyzer(text)
+
+    def transform(self, texts: Sequence[str]) -> SparseRows:
+        """Normalised TF-IDF entries of ``texts``, like `TfidfVectorizer.transform`."""
+        grams: List[bytes] = []
+        lengths = []
+        for text in texts:
+            # Encoding the tokens first is cheaper than encoding every n-gram
+            doc_grams = self.analyzer.ngrams([token.encode("utf-8") for token in self.analyzer.tokens(text)], b" ")
+            grams.extend(doc_grams)
+            lengths.append(len(doc_grams))
+        docs = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+
+        n_terms = len(self.terms)
+        if grams:
+            candidates = np.array(grams)
+            if candidates.itemsize > self.terms.itemsize:
+                # Longer n-grams cannot be in the vocabulary and casting would truncate them
+                keep = np.char.str_len(candidates) <= self.terms.itemsize
+                candidates, docs = candidates[keep].astype(self.terms.dtype), docs[keep]
+            position = np.minimum(np.searchsorted(self.terms, candidates), n_terms - 1)
+            found = self.terms[position] == candidates
+            keys = docs[found] * n_terms + position[found]
+        else:
+            keys = np.empty(0, dtype=np.int64)
+        keys, counts = np.unique(keys, return_counts=True)
+        doc, term = np.divmod(keys, n_terms)
+
+        value = counts.astype(np.float64)
+        if self.meta["sublinear_tf"]:
+            np.log(value, out=value)
+            value += 1.0
+        if self.meta["use_idf"]:
+            value *= self.weights[term, 0]
+        if self.meta["norm"] == "l2":
+            # bincount sums sequentially, in the same order as sklearn's row normalisation
+            norms = np.sqrt(np.bincount(doc, weights=value * value, minlength=len(texts)))
+            value /= norms[doc]
+        return SparseRows(doc, term, value, len(texts))
+
+    def decision_function(self, features: SparseRows) -> np.ndarray:
+        coef = self.weights[features.term, 1:]
+        scores = np.empty((features.n_docs, len(self.classes_)), dtype=np.float64)
+        for column in range(scores.shape[1]):
+            scores[:, column] = np.bincount(
+                features.doc, weights=features.value * coef[:, column], minlength=features.n_docs
+            )
+        return scores + self.intercept
+
+    def predict_proba(self, features: SparseRows) -> np.ndarray:
+        """Class probabilities, columns ordered like `classes_`."""
+        scores = self.decision_function(features)
+        if self.meta["link"] == "softmax":
+            scores -= scores.max(axis=1).reshape(-1, 1)
+            np.exp(scores, out=scores)
+        else:
+            from scipy.special import expit
+
+            expit(scores, out=scores)
+        scores /= scores.sum(axis=1).reshape(-1, 1)
+        return scores
+
+
+def load_compiled(directory: Path, source_paths: Sequence[Path] = ()) -> Optional[CompiledBaseline]:
+    """The compiled scorer in ``directory``, or None when missing or stale.
+
+    The artifact is stale when any of ``source_paths`` no longer has the hash
+    recorded at compile time.
+    """
+    if not (Path(directory) / META_NAME).exists():
+        return None
+    try:
+        compiled = CompiledBaseline(directory)
+    except (OSError, ValueError, KeyError) as exc:
+        print(f"Ignoring compiled baseline in {directory}: {exc}")
+        return None
+    recorded = compiled.meta.get("sources", {})
+    for path in source_paths:
+        path = Path(path)
+        if path.exists() and recorded.get(path.name) != sha256_file(path):
+            print(f"Compiled baseline in {directory} is older than {path.name}; it will be recompiled.")
+            return None
+    return compiled
+
+
+def sources_key(source_paths: Sequence[Path]) -> str:
+    """SHA-256 over the names and contents of the joblib files a compiled baseline comes from."""
+    digest = hashlib.sha256()
+    for path in sorted((Path(path) for path in source_paths), key=lambda path: path.name):
+        digest.update(f"{path.name}\0{sha256_file(path)}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def compiled_dir(cache_dir: Path, source_paths: Sequence[Path]) -> Path:
+    """Where the compiled form of ``source_paths`` lives inside ``cache_dir``."""
+    return Path(cache_dir) / sources_key(source_paths)[:16]
+
+
+def vocabulary_probe_texts(vectorizer, count: int = 256, terms_per_text: int = 24) -> List[str]:
+    """Texts made of the vectorizer's own terms, spread evenly over its vocabulary."""
+    terms = sorted(vectorizer.vocabulary_)
+    step = max(1, len(terms) // (count * terms_per_text))
+    picked = terms[::step][:count * terms_per_text]
+    return [" ".join(picked[start:start + terms_per_text]) for start in range(0, len(picked), terms_per_text)]
+
+
+def load_or_compile(cache_dir: Path, model_path: Path, vectorizer_path: Path) -> Optional[CompiledBaseline]:
+    """The compiled scorer for a joblib pair, compiling it on first use.
+
+    Returns None when the joblib files are missing, the pair cannot be
+    compiled, the arrays do not reproduce sklearn or ``cache_dir`` is not
+    writable; the caller then scores with sklearn.
+    """
+    sources = (Path(model_path), Path(vectorizer_path))
+    if not all(path.exists() for path in sources):
+        return None
+    directory = compiled_dir(cache_dir, sources)
+    compiled = load_compiled(directory, sources)
+    if compiled is not None:
+        return compiled
+    # Per-process scratch directory: pool workers may all compile on first start
+    tmp_dir = directory.with_name(f".{directory.name}.{os.getpid()}.tmp")
+    try:
+        vectorizer, model = _joblib_pipeline(*sources)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        compile_baseline(vectorizer, model, tmp_dir, sources)
+        difference = max_difference(CompiledBaseline(tmp_dir), vectorizer, model, vocabulary_probe_texts(vectorizer))
+        if difference > 1e-12:
+            raise ValueError(f"compiled scores differ from sklearn by up to {difference:.3g}")
+        if directory.exists() and load_compiled(directory, sources) is None:
+            # Partial, corrupt or older-format copy under this key; replaced below
+            shutil.rmtree(directory, ignore_errors=True)
+        try:
+            os.replace(tmp_dir, directory)
+        except OSError:
+            # Another process finished first; keep its copy
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    except (ImportError, OSError, ValueError) as exc:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        print(f"Could not compile the baseline ({exc}); scoring with scikit-learn.")
+        return None
+    compiled = load_compiled(directory, sources)
+    if compiled is None:
+        print(f"Compiled baseline in {directory} could not be loaded; scoring with scikit-learn.")
+        return None
+    print(f"Compiled the baseline into {directory}")
+    return compiled
+
+
+def _joblib_pipeline(model_path: Path, vectorizer_path: Path):
+    import joblib
+
+    return joblib.load(vectorizer_path), joblib.load(model_path)
+
+
+def max_difference(compiled: CompiledBaseline, vectorizer, model, texts: Sequence[str], chunk: int = 4096) -> float:
+    """Largest absolute probability difference between ``compiled`` and sklearn over ``texts``."""
+    worst = 0.0
+    for start in range(0, len(texts), chunk):
+        batch = list(texts[start:start + chunk])
+        expected = model.predict_proba(vectorizer.transform(batch))
+        actual = compiled.predict_proba(compiled.transform(batch))
+        worst = max(worst, float(np.abs(expected - actual).max()))
+    return worst
+
+
+def time_scorers(compiled: CompiledBaseline, vectorizer, model, texts: Sequence[str], batch_size: int) -> Dict:
+    batches = [list(texts[start:start + batch_size]) for start in range(0, len(texts), batch_size)]
+    timings = {}
+    for name, score in (
+        ("sklearn", lambda batch: model.predict_proba(vectorizer.transform(batch))),
+        ("compiled", lambda batch: compiled.predict_proba(compiled.transform(batch))),
+    ):
+        score(batches[0])
+        started = time.perf_counter()
+        for batch in batches:
+            score(batch)
+        elapsed = time.perf_counter() - started
+        timings[f"{name}_us_per_tweet"] = elapsed * 1e6 / len(texts)
+        timings[f"{name}_tweets_per_sec"] = len(texts) / elapsed
+    timings["speedup"] = timings["sklearn_us_per_tweet"] / timings["compiled_us_per_tweet"]
+    return {"batch_size": batch_size, "tweets": len(texts), **timings}
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    from app.inference.data import load_dataset
+    from app.inference.predictor import BASELINE_MODEL_PATH, BASELINE_VECTORIZER_PATH, COMPILED_BASELINE_DIR
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compile_parser = subparsers.add_parser("compile", help="Write the compiled baseline arrays")
+    compile_parser.add_argument("--output-dir", type=Path, default=None,
+                                help="Defaults to models/baseline_compiled/<joblib hash>/")
+    compile_parser.add_argument("--limit", type=int, default=None, help="Only check the first N tweets")
+    report_parser = subparsers.add_parser("report", help="Time sklearn and the compiled scorer")
+    report_parser.add_argument("--batch-sizes", type=lambda value: [int(size) for size in value.split(",")],
+                               default=[1, 32, 1024])
+    report_parser.add_argument("--limit", type=int, default=5000, help="Tweets to score per batch size")
+    args = parser.parse_args(argv)
+
+    sources = (BASELINE_MODEL_PATH, BASELINE_VECTORIZER_PATH)
+    vectorizer, model = _joblib_pipeline(*sources)
+    texts = load_dataset()["review"].fillna("").astype(str).tolist()
+    if args.limit is not None:
+        texts = texts[:args.limit]
+
+    if args.command == "compile":
+        output_dir = args.output_dir or compiled_dir(COMPILED_BASELINE_DIR, sources)
+        compile_baseline(vectorizer, model, output_dir, sources, probe_texts=texts[:256])
+        difference = max_difference(CompiledBaseline(output_dir), vectorizer, model, texts)
+        if difference > 1e-12:
+            raise SystemExit(f"Compiled scores differ from sklearn by up to {difference:.3g}; not using them.")
+        size_kb = sum(path.stat().st_size for path in output_dir.iterdir()) / 1024
+        print(f"Compiled {len(vectorizer.vocabulary_)} terms into {output_dir} ({size_kb:.0f} KB)")
+        print(f"Max probability difference against sklearn over {len(texts)} tweets: {difference:.3g}")
+        return
+
+    compiled = load_compiled(compiled_dir(COMPILED_BASELINE_DIR, sources), sources)
+    if compiled is None:
+        raise SystemExit("No up-to-date compiled baseline; run the compile command first.")
+    for batch_size in args.batch_sizes:
+        row = time_scorers(compiled, vectorizer, model, texts, batch_size)
+        print(
+            f"batch {batch_size:>5}: sklearn {row['sklearn_us_per_tweet']:8.1f} µs/tweet, "
+            f"compiled {row['compiled_us_per_tweet']:8.1f} µs/tweet ({row['speedup']:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
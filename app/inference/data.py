@@ -0,0 +1,61 @@
+"""
+Dataset and split loading shared by the offline tools.
+
+`train_ids.csv`, `val_ids.csv` and `test_ids.csv` hold row positions into
+TwitterToxicity.csv (columns `review,label` with labels -1/0/1), as assigned
+when the splits were created.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.inference.predictor import (
+    TEST_IDS_PATH,
+    TRAIN_IDS_PATH,
+    TWITTER_CSV_PATH,
+    VAL_IDS_PATH,
+    _PROJECT_ROOT,
+)
+
+# The dataset ships with the project deliverables; a fresh export lands at the root
+DATASET_CANDIDATES = (TWITTER_CSV_PATH, _PROJECT_ROOT / "TwitterToxicity.csv")
+SPLIT_PATHS = {"train": TRAIN_IDS_PATH, "val": VAL_IDS_PATH, "test": TEST_IDS_PATH}
+
+
+def dataset_path() -> Path:
+    for candidate in DATASET_CANDIDATES:
+        if candidate.exists():
+            return candidate
+    raise FileNotFoundError(f"TwitterToxicity.csv not found; looked in {[str(path) for path in DATASET_CANDIDATES]}")
+
+
+def load_dataset() -> pd.DataFrame:
+    """The full dataset with an `id` column equal to the row position."""
+    df = pd.read_csv(dataset_path())
+    df["id"] = np.arange(len(df))
+    return df
+
+
+def load_split(name: str) -> Tuple[List[str], np.ndarray]:
+    """Texts and -1/0/1 labels of a split, skipping rows with empty text.
+
+    Read from the dataset cache when one was built from the current files
+    (`python -m app.inference.dataset_cache build`), otherwise from the CSV.
+    """
+    if name not in SPLIT_PATHS:
+        raise ValueError(f"Unknown split {name!r}; expected one of {tuple(SPLIT_PATHS)}.")
+    from app.inference.dataset_cache import open_current
+
+    cache = open_current()
+    if cache is not None:
+        return cache.split(name)
+    df = load_dataset()
+    ids = pd.read_csv(SPLIT_PATHS[name])["id"].to_numpy()
+    split = df.iloc[ids].dropna(subset=["review", "label"])
+    split = split[split["review"].astype(str).str.strip().str.len() > 0]
+    return split["review"].astype(str).tolist(), split["label"].astype(int).to_numpy()
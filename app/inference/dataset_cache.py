@@ -0,0 +1,328 @@
+"""
+Pre-tokenized, memory-mapped cache of TwitterToxicity.csv and its splits.
+
+`build` reads the dataset and the split id files once and writes the
+following to `models/dataset_cache/<data hash>/`, indexed by dataset row id:
+
+- `text.bin` and `text_offsets.npy`: every row's text as UTF-8, exactly as
+  the CSV path of `data.load_split` returns it (surrounding whitespace
+  included). Row i spans offsets i to i+1.
+- `labels.npy`: int8 labels -1/0/1.
+- `split.npy`: int8 split codes (0: none, 1: train, 2: val, 3: test).
+- `valid.npy`: rows with non-blank text and a -1/0/1 label.
+
+The checkpoint tokenizer's output goes to
+`tokens-<tokenizer hash>-L<max length>/` inside that directory:
+
+- `input_ids.npy` and `token_offsets.npy`: every row's int32 token ids,
+  concatenated.
+- `lengths.npy`: tokens per row. The attention mask is ones up to this length.
+
+The data hash covers the CSV, the three id files and the cache format. The tokenizer hash covers
+the checkpoint's tokenizer files. When either changes, a new cache is built
+next to the old one instead of serving stale rows. `data.load_split` reads
+from the cache when one matches the current files. `iter_length_buckets`
+yields padded batches straight from the token arrays, so repeated evaluation
+and training runs never tokenize again. The buckets come in the same order
+and with the same padding as the analyzer's own, so logits computed from the
+cache equal those of `analyze_batch`.
+
+Usage:
+    python -m app.inference.dataset_cache build
+    python -m app.inference.dataset_cache build --checkpoint checkpoints/bert-base/variants/L6-ft
+    python -m app.inference.dataset_cache info
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.inference.compiled_baseline import sha256_file
+from app.inference.data import SPLIT_PATHS, dataset_path
+from app.inference.predictor import MODELS_DIR, SENTIMENT_LABELS, TOKENIZER_FILES, TRANSFORMER_MAX_LENGTH
+from app.inference.registry import content_hash
+
+CACHE_DIR = Path(os.environ.get("TWEET_DATASET_CACHE", MODELS_DIR / "dataset_cache"))
+SPLIT_CODES = {"train": 1, "val": 2, "test": 3}
+META_NAME = "meta.json"
+# Part of the data hash; bump when the stored arrays change meaning
+CACHE_FORMAT = 2
+# Rows per tokenizer call while building
+TOKENIZE_CHUNK = 4096
+
+
+def cell_text(text: object) -> str:
+    """Text of a CSV cell as `data.load_split` reads it ("" when missing)."""
+    return text if isinstance(text, str) else ""
+
+
+def data_hash() -> str:
+    """Content hash of the dataset CSV and the split id files."""
+    paths = {"dataset": dataset_path(), **SPLIT_PATHS}
+    files = {name: sha256_file(path) for name, path in paths.items()}
+    return content_hash({**files, "format": str(CACHE_FORMAT)})
+
+
+def tokenizer_hash(checkpoint_dir: Path) -> str:
+    files = {
+        name: sha256_file(Path(checkpoint_dir) / name)
+        for name in TOKENIZER_FILES if (Path(checkpoint_dir) / name).exists()
+    }
+    if not files:
+        raise FileNotFoundError(f"No tokenizer files in {checkpoint_dir}.")
+    return content_hash(files)
+
+
+def _tokens_dirname(checkpoint_dir: Path, max_length: int) -> str:
+    return f"tokens-{tokenizer_hash(checkpoint_dir)[:16]}-L{max_length}"
+
+
+def _write_json(path: Path, payload: Dict) -> None:
+    path.write_text(json.dumps(payload, indent=2))
+
+
+def build_data(cache_dir: Path = CACHE_DIR) -> Path:
+    """Write the text, label and split arrays for the current files (no-op when present)."""
+    import pandas as pd
+
+    digest = data_hash()
+    directory = cache_dir / digest[:16]
+    if (directory / META_NAME).exists():
+        return directory
+    df = pd.read_csv(dataset_path())
+    # Raw text, so the cache and the CSV path give the same evaluation set hash
+    texts = [cell_text(text) for text in df["review"]]
+    encoded = [text.encode("utf-8") for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(chunk) for chunk in encoded], out=offsets[1:])
+
+    raw_labels = pd.to_numeric(df["label"], errors="coerce")
+    known = raw_labels.isin([-1, 0, 1]).to_numpy()
+    labels = np.where(known, raw_labels.fillna(0).to_numpy(), 0).astype(np.int8)
+    splits = np.zeros(len(df), dtype=np.int8)
+    for name, path in SPLIT_PATHS.items():
+        splits[pd.read_csv(path)["id"].to_numpy()] = SPLIT_CODES[name]
+    valid = known & np.array([bool(text.strip()) for text in texts])
+
+    # Written beside the final directory and renamed, so a crash leaves no half cache
+    tmp_dir = directory.with_name(f".{directory.name}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    (tmp_dir / "text.bin").write_bytes(b"".join(encoded))
+    np.save(tmp_dir / "text_offsets.npy", offsets)
+    np.save(tmp_dir / "labels.npy", labels)
+    np.save(tmp_dir / "split.npy", splits)
+    np.save(tmp_dir / "valid.npy", valid)
+    _write_json(tmp_dir / META_NAME, {
+        "data_hash": digest,
+        "dataset": str(dataset_path()),
+        "rows": len(df),
+        "valid_rows": int(valid.sum()),
+        "split_rows": {name: int(((splits == code) & valid).sum()) for name, code in SPLIT_CODES.items()},
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    })
+    os.replace(tmp_dir, directory)
+    return directory
+
+
+def build_tokens(data_dir: Path, checkpoint_dir: Path, max_length: int = TRANSFORMER_MAX_LENGTH) -> Path:
+    """Tokenize every valid row with ``checkpoint_dir``'s tokenizer (no-op when present)."""
+    from transformers import AutoTokenizer
+
+    directory = data_dir / _tokens_dirname(checkpoint_dir, max_length)
+    if (directory / META_NAME).exists():
+        return directory
+    cache = DatasetCache(data_dir)
+    tokenizer = AutoTokenizer.from_pretrained(checkpoint_dir, use_fast=True)
+    rows = np.flatnonzero(cache.valid)
+    lengths = np.zeros(len(cache), dtype=np.int32)
+    chunks: List[np.ndarray] = []
+    input_names: List[str] = []
+    for start in range(0, len(rows), TOKENIZE_CHUNK):
+        batch = rows[start:start + TOKENIZE_CHUNK]
+        encoded = tokenizer(cache.texts(batch), truncation=True, max_length=max_length)
+        input_names = list(encoded.keys())
+        for row, ids in zip(batch, encoded["input_ids"]):
+            lengths[row] = len(ids)
+            chunks.append(np.asarray(ids, dtype=np.int32))
+    offsets = np.zeros(len(cache) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    tmp_dir = directory.with_name(f".{directory.name}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    # Valid rows were tokenized in row order, so the chunks follow the offsets
+    np.save(tmp_dir / "input_ids.npy", np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int32))
+    np.save(tmp_dir / "token_offsets.npy", offsets)
+    np.save(tmp_dir / "lengths.npy", lengths)
+    _write_json(tmp_dir / META_NAME, {
+        "tokenizer_hash": tokenizer_hash(checkpoint_dir),
+        "checkpoint": str(checkpoint_dir),
+        "max_length": max_length,
+        "input_names": input_names,
+        "pad_token_id": tokenizer.pad_token_id or 0,
+        "tokens": int(offsets[-1]),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    })
+    os.replace(tmp_dir, directory)
+    return directory
+
+
+class DatasetCache:
+    """Read-only view of a built cache; every array is memory-mapped."""
+
+    def __init__(self, data_dir: Path, checkpoint_dir: Optional[Path] = None,
+                 max_length: int = TRANSFORMER_MAX_LENGTH) -> None:
+        self.directory = Path(data_dir)
+        self.meta = json.loads((self.directory / META_NAME).read_text())
+        self._text = np.memmap(self.directory / "text.bin", dtype=np.uint8, mode="r") \
+            if (self.directory / "text.bin").stat().st_size else np.zeros(0, dtype=np.uint8)
+        self._text_offsets = np.load(self.directory / "text_offsets.npy", mmap_mode="r")
+        self.labels = np.load(self.directory / "labels.npy", mmap_mode="r")
+        self.splits = np.load(self.directory / "split.npy", mmap_mode="r")
+        self.valid = np.load(self.directory / "valid.npy", mmap_mode="r")
+        self.tokens_meta: Optional[Dict] = None
+        if checkpoint_dir is not None:
+            tokens_dir = self.directory / _tokens_dirname(checkpoint_dir, max_length)
+            if not (tokens_dir / META_NAME).exists():
+                raise FileNotFoundError(
+                    f"No tokens for {checkpoint_dir} in {self.directory}; "
+                    "run `python -m app.inference.dataset_cache build --checkpoint ...`."
+                )
+            self.tokens_meta = json.loads((tokens_dir / META_NAME).read_text())
+            self.input_ids = np.load(tokens_dir / "input_ids.npy", mmap_mode="r")
+            self._token_offsets = np.load(tokens_dir / "token_offsets.npy", mmap_mode="r")
+            self.lengths = np.load(tokens_dir / "lengths.npy", mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def text(self, row: int) -> str:
+        return bytes(self._text[self._text_offsets[row]:self._text_offsets[row + 1]]).decode("utf-8")
+
+    def texts(self, rows: Sequence[int]) -> List[str]:
+        return [self.text(int(row)) for row in rows]
+
+    def split_rows(self, name: str) -> np.ndarray:
+        """Valid row ids of a split, in the order of its id file."""
+        import pandas as pd
+
+        if name not in SPLIT_CODES:
+            raise ValueError(f"Unknown split {name!r}; expected one of {tuple(SPLIT_CODES)}.")
+        ids = pd.read_csv(SPLIT_PATHS[name])["id"].to_numpy()
+        return ids[np.asarray(self.valid)[ids]]
+
+    def split(self, name: str) -> Tuple[List[str], np.ndarray]:
+        """Texts and -1/0/1 labels of a split, like `data.load_split`."""
+        rows = self.split_rows(name)
+        return self.texts(rows), np.asarray(self.labels[rows], dtype=np.int64)
+
+    def token_ids(self, row: int) -> np.ndarray:
+        return self.input_ids[self._token_offsets[row]:self._token_offsets[row + 1]]
+
+    def pad(self, rows: Sequence[int], width: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Right-padded int64 model inputs of ``rows``, as the tokenizer names them."""
+        if self.tokens_meta is None:
+            raise RuntimeError("This cache was opened without tokens; pass checkpoint_dir.")
+        lengths = np.asarray(self.lengths[rows])
+        width = int(lengths.max()) if width is None else width
+        input_ids = np.full((len(rows), width), self.tokens_meta["pad_token_id"], dtype=np.int64)
+        for position, row in enumerate(rows):
+            input_ids[position, :lengths[position]] = self.token_ids(int(row))
+        arrays = {"input_ids": input_ids}
+        if "attention_mask" in self.tokens_meta["input_names"]:
+            arrays["attention_mask"] = (np.arange(width)[None, :] < lengths[:, None]).astype(np.int64)
+        if "token_type_ids" in self.tokens_meta["input_names"]:
+            arrays["token_type_ids"] = np.zeros((len(rows), width), dtype=np.int64)
+        return arrays
+
+    def iter_length_buckets(
+        self, rows: Sequence[int], batch_size: int
+    ) -> Iterator[Tuple[np.ndarray, Dict[str, np.ndarray]]]:
+        """Yield ``(positions, arrays)`` buckets of ``rows`` sorted by token count.
+
+        Mirrors `backends.iter_length_buckets`: ``positions`` index into
+        ``rows`` and each bucket is padded to its own longest member.
+        """
+        rows = np.asarray(rows)
+        order = np.argsort(np.asarray(self.lengths[rows]), kind="stable")
+        for start in range(0, len(order), batch_size):
+            bucket = order[start:start + batch_size]
+            yield bucket, self.pad(rows[bucket])
+
+
+def open_current(
+    checkpoint_dir: Optional[Path] = None,
+    max_length: int = TRANSFORMER_MAX_LENGTH,
+    cache_dir: Path = CACHE_DIR,
+) -> Optional[DatasetCache]:
+    """The cache built from the current dataset files, or None when there is none yet.
+
+    With ``checkpoint_dir``, None is also returned when that tokenizer's
+    tokens have not been built.
+    """
+    directory = cache_dir / data_hash()[:16]
+    if not (directory / META_NAME).exists():
+        return None
+    try:
+        return DatasetCache(directory, checkpoint_dir, max_length)
+    except FileNotFoundError:
+        return None
+
+
+def transformer_logits(analyzer, cache: DatasetCache, rows: Sequence[int], batch_size: int) -> np.ndarray:
+    """Logits of ``rows`` from the cached tokens, in ``rows`` order, without tokenizing."""
+    logits = np.empty((len(rows), len(SENTIMENT_LABELS)), dtype=np.float32)
+    for bucket, arrays in cache.iter_length_buckets(rows, batch_size):
+        logits[bucket] = analyzer.transformer_backend.predict_logits(arrays)
+    return logits
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    from app.inference.predictor import CHECKPOINT_DIR
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Build the cache for the current dataset files")
+    build_parser.add_argument("--checkpoint", type=Path, default=CHECKPOINT_DIR, help="Tokenizer to cache tokens for")
+    build_parser.add_argument("--max-length", type=int, default=TRANSFORMER_MAX_LENGTH)
+    build_parser.add_argument("--no-tokens", action="store_true", help="Only cache text, labels and splits")
+    subparsers.add_parser("info", help="Show the cache of the current files and how fast it opens")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        started = time.perf_counter()
+        data_dir = build_data()
+        print(f"Data: {data_dir} ({time.perf_counter() - started:.2f}s)")
+        if not args.no_tokens:
+            started = time.perf_counter()
+            tokens_dir = build_tokens(data_dir, args.checkpoint, args.max_length)
+            print(f"Tokens: {tokens_dir} ({time.perf_counter() - started:.2f}s)")
+        return
+
+    started = time.perf_counter()
+    cache = open_current()
+    if cache is None:
+        raise SystemExit("No cache for the current dataset files; run `python -m app.inference.dataset_cache build`.")
+    opened_ms = (time.perf_counter() - started) * 1000
+    print(json.dumps(cache.meta, indent=2))
+    for tokens_dir in sorted(cache.directory.glob("tokens-*")):
+        meta = json.loads((tokens_dir / META_NAME).read_text())
+        print(f"{tokens_dir.name}: {meta['tokens']} tokens from {meta['checkpoint']}")
+    started = time.perf_counter()
+    texts, _ = cache.split("test")
+    print(f"Opened in {opened_ms:.1f} ms (hashing included); test split ({len(texts)} tweets) "
+          f"read in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+"""
+Batched, parallel evaluation of every backend; regenerates the comparison reports.
+
+Each backend (`bert-torch`, `bert-onnx`, `bert-int8`, `baseline`) is loaded in
+its own worker process, as in the benchmark. Up to `--jobs` workers run at the
+same time, and the host's cores are split between them. A worker scores these
+sets with `analyze_batch`:
+
+- the test split (`test_ids.csv`)
+- `Final_Project_Deliverables/ground_truth_test_set.csv`
+- the hand-labelled tweets of `Experiments/inference_experiments_*.csv`
+
+Accuracy, macro precision, recall and F1 and the confusion matrix all come
+from one `np.bincount` per set. The run writes:
+
+- `exports/model_comparison.csv`: the existing columns, one row per backend
+  and set, plus the model hash and timing columns.
+- `exports/confusion_matrices/<backend>_<set>.csv`
+- `Experiments/inference_experiments_<name>.csv`: rewritten in its existing
+  per-tweet schema with `--experiments-backend`, plus the backend and its
+  per-tweet latency. The `.xlsx` copies are not touched.
+
+Predictions are cached in `models/eval_cache/` under a key made of:
+
+- the backend
+- a content hash of the model files it loads
+- the post-processing fingerprint
+
+Each set is stored with a hash of its texts and labels. A later run only
+starts workers for backends whose model, rules or sets changed. The metrics
+and reports are recomputed from the cache every time.
+
+Usage:
+    python -m app.inference.evaluate
+    python -m app.inference.evaluate --backends bert-torch,baseline --jobs 2
+    python -m app.inference.evaluate --checkpoint checkpoints/bert-base/variants/L6-ft --no-cache
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+_PROJECT_ROOT = Path(__file__).resolve().parents[2]
+if str(_PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(_PROJECT_ROOT))
+
+from app.inference.autotune import engine_name
+from app.inference.benchmark import BENCHMARK_BACKENDS
+
+REPORT_DIR = _PROJECT_ROOT / "exports"
+EXPERIMENTS_DIR = _PROJECT_ROOT / "Experiments"
+GROUND_TRUTH_PATH = _PROJECT_ROOT / "Final_Project_Deliverables" / "ground_truth_test_set.csv"
+CACHE_DIR = Path(os.environ.get("TWEET_EVAL_CACHE", _PROJECT_ROOT / "models" / "eval_cache"))
+RESULT_MARKER = "EVALUATION_RESULT "
+
+# Engine each backend must load; it also selects the checkpoint files that are hashed
+BACKEND_ENGINES = {"bert-torch": "bert-torch", "bert-onnx": "bert-onnx", "bert-int8": "bert-torch-int8",
+                   "baseline": "baseline"}
+# Model column of exports/model_comparison.csv
+MODEL_NAMES = {
+    "baseline": "Baseline (TF-IDF + LogReg)",
+    "bert-torch": "BERT-base-uncased",
+    "bert-onnx": "BERT-base-uncased (ONNX)",
+    "bert-int8": "BERT-base-uncased (INT8)",
+}
+# Sets reported in model_comparison.csv; the experiments sets are per-tweet reports
+COMPARISON_SETS = ("test", "ground_truth")
+LABEL_VALUES = (-1, 0, 1)
+# Label names of the Experiments reports
+EXPERIMENT_LABEL_NAMES = {-1: "Toxic", 0: "Neutral", 1: "Positive"}
+
+
+def confusion_matrix(labels: np.ndarray, predictions: np.ndarray) -> np.ndarray:
+    """3x3 counts of -1/0/1 labels (rows) against predictions (columns)."""
+    labels, predictions = np.asarray(labels), np.asarray(predictions)
+    return np.bincount((labels + 1) * 3 + (predictions + 1), minlength=9).reshape(3, 3)
+
+
+def label_metrics(labels: np.ndarray, predictions: np.ndarray) -> Dict[str, float]:
+    """Accuracy and macro precision, recall and F1 over the classes -1/0/1.
+
+    A class that is never predicted (or never present) scores 0, as sklearn
+    does with ``zero_division=0``.
+    """
+    confusion = confusion_matrix(labels, predictions)
+    true_positive = np.diag(confusion).astype(np.float64)
+    predicted, actual = confusion.sum(axis=0), confusion.sum(axis=1)
+    precision = np.divide(true_positive, predicted, out=np.zeros(3), where=predicted > 0)
+    recall = np.divide(true_positive, actual, out=np.zeros(3), where=actual > 0)
+    f1 = np.divide(2 * true_positive, predicted + actual, out=np.zeros(3), where=predicted + actual > 0)
+    return {
+        "accuracy": float(true_positive.sum() / max(len(labels), 1)),
+        "precision_macro": float(precision.mean()),
+        "recall_macro": float(recall.mean()),
+        "f1_macro": float(f1.mean()),
+    }
+
+
+def _experiment_names() -> List[str]:
+    return sorted(path.stem[len("inference_experiments_"):]
+                  for path in EXPERIMENTS_DIR.glob("inference_experiments_*.csv"))
+
+
+def set_names() -> List[str]:
+    return list(COMPARISON_SETS) + [f"experiments_{name}" for name in _experiment_names()]
+
+
+def load_set(name: str) -> Tuple[List[str], np.ndarray]:
+    """Texts and -1/0/1 labels of an evaluation set, skipping rows with empty text."""
+    from app.inference.data import load_split
+
+    if name == "test":
+        return load_split("test")
+    if name == "ground_truth":
+        df, text_column, label_column = pd.read_csv(GROUND_TRUTH_PATH), "review", "label"
+    elif name.startswith("experiments_"):
+        path = EXPERIMENTS_DIR / f"inference_experiments_{name[len('experiments_'):]}.csv"
+        df, text_column, label_column = pd.read_csv(path), "Tweet", "True_Label"
+    else:
+        raise ValueError(f"Unknown evaluation set {name!r}; expected one of {set_names()}.")
+    df = df.dropna(subset=[text_column, label_column])
+    df = df[df[text_column].astype(str).str.strip().str.len() > 0]
+    return df[text_column].astype(str).tolist(), df[label_column].astype(int).to_numpy()
+
+
+def set_hash(texts: Sequence[str], labels: np.ndarray) -> str:
+    digest = hashlib.sha256()
+    for text, label in zip(texts, labels):
+        digest.update(f"{int(label)}\t{text}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def checkpoint_dir_for(checkpoint: Optional[Path]) -> Path:
+    """Checkpoint the analyzer loads by default (TWEET_MODEL_VARIANT aware) unless given."""
+    from app.inference.predictor import CHECKPOINT_DIR, MODEL_VARIANT, VARIANTS_DIR
+
+    if checkpoint is not None:
+        return Path(checkpoint)
+    return VARIANTS_DIR / MODEL_VARIANT if MODEL_VARIANT else CHECKPOINT_DIR
+
+
+def model_hash(backend: str, checkpoint_dir: Path) -> Optional[str]:
+    """Content hash of the files ``backend`` loads, or None when some are missing."""
+    from app.inference.compiled_baseline import sha256_file
+    from app.inference.predictor import BASELINE_MODEL_PATH, BASELINE_VECTORIZER_PATH
+    from app.inference.registry import content_hash
+
+    if backend == "baseline":
+        paths = [BASELINE_MODEL_PATH, BASELINE_VECTORIZER_PATH]
+        if not all(path.exists() for path in paths):
+            return None
+        return content_hash({path.name: sha256_file(path) for path in paths})
+    from app.inference.logit_store import checkpoint_hash
+
+    if not (checkpoint_dir / "config.json").exists():
+        return None
+    return checkpoint_hash(checkpoint_dir, BACKEND_ENGINES[backend])
+
+
+def cache_path(backend: str, digest: str, postprocess_fingerprint: str) -> Path:
+    return CACHE_DIR / f"{backend}-{digest[:16]}-pp{postprocess_fingerprint}.json"
+
+
+def read_cache(path: Optional[Path]) -> Dict:
+    if path is None or not path.exists():
+        return {"sets": {}}
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {"sets": {}}
+
+
+def write_cache(path: Path, entry: Dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps(entry))
+    os.replace(tmp_path, path)
+
+
+def run_backend(backend: str, sets: Sequence[str], checkpoint: Optional[Path] = None,
+                batch_size: Optional[int] = None) -> Dict:
+    """Score ``sets`` with one backend in the current process."""
+    started = time.perf_counter()
+    from app.inference.predictor import LABEL_MAP, TweetAnalyzer
+
+    kwargs = dict(BENCHMARK_BACKENDS[backend])
+    if checkpoint is not None and backend != "baseline":
+        kwargs["checkpoint_dir"] = checkpoint
+    analyzer = TweetAnalyzer(cache_max_entries=0, near_dup_max_entries=0, **kwargs)
+    load_seconds = time.perf_counter() - started
+    if BACKEND_ENGINES[backend] != engine_name(analyzer):
+        raise RuntimeError(f"{backend} is unavailable here; the analyzer loaded {engine_name(analyzer)}.")
+
+    as_label = {name: value for value, name in LABEL_MAP.items()}
+    scored = {}
+    for name in sets:
+        texts, _ = load_set(name)
+        # One untimed call warms up kernels and allocator pools
+        analyzer.analyze_batch(texts[:8], batch_size=batch_size)
+        tick = time.perf_counter()
+        results = analyzer.analyze_batch(texts, batch_size=batch_size)
+        scored[name] = {
+            "predictions": [as_label[result.sentiment_label] for result in results],
+            "confidence": [round(result.confidence, 6) for result in results],
+            "score_seconds": time.perf_counter() - tick,
+        }
+    return {"engine": engine_name(analyzer), "load_seconds": load_seconds, "sets": scored}
+
+
+def run_in_subprocess(backend: str, sets: Sequence[str], args: argparse.Namespace, threads: int) -> Optional[Dict]:
+    command = [sys.executable, "-m", "app.inference.evaluate", "--worker", backend, "--sets", ",".join(sets)]
+    if args.checkpoint is not None:
+        command += ["--checkpoint", str(args.checkpoint)]
+    if args.batch_size is not None:
+        command += ["--batch-size", str(args.batch_size)]
+    # Workers running side by side share the cores instead of each taking all of them
+    env = dict(os.environ, OMP_NUM_THREADS=str(threads), MKL_NUM_THREADS=str(threads))
+    completed = subprocess.run(command, cwd=_PROJECT_ROOT, env=env, capture_output=True, text=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    error = (completed.stderr.strip().splitlines() or ["no output"])[-1]
+    print(f"Skipping {backend}: {error}")
+    return None
+
+
+def comparison_row(backend: str, entry: Dict, name: str, labels: np.ndarray, cached: bool) -> Dict:
+    scored = entry["sets"][name]
+    metrics = label_metrics(labels, np.asarray(scored["predictions"]))
+    return {
+        "Model": MODEL_NAMES[backend],
+        "Accuracy": metrics["accuracy"],
+        "Precision": metrics["precision_macro"],
+        "Recall": metrics["recall_macro"],
+        "F1-macro": metrics["f1_macro"],
+        "Dataset": name,
+        "Backend": backend,
+        "Engine": entry["engine"],
+        "Model_Hash": entry.get("model_hash"),
+        "Tweets": len(labels),
+        "Load_Seconds": entry["load_seconds"],
+        "Score_Seconds": scored["score_seconds"],
+        "Tweets_Per_Second": len(labels) / scored["score_seconds"] if scored["score_seconds"] else None,
+        "Cached": cached,
+    }
+
+
+def write_experiment_report(name: str, backend: str, scored: Dict, texts: Sequence[str], labels: np.ndarray,
+                            output_dir: Path) -> Path:
+    predictions = np.asarray(scored["predictions"])
+    report = pd.DataFrame({
+        "Tweet": texts,
+        "True_Label": labels,
+        "True_Label_Name": [EXPERIMENT_LABEL_NAMES[label] for label in labels],
+        "Predicted_Label": predictions,
+        "Predicted_Label_Name": [EXPERIMENT_LABEL_NAMES[label] for label in predictions],
+        "Confidence": np.round(scored["confidence"], 4),
+        "Correct": np.where(predictions == labels, "Correct", "Incorrect"),
+        "Backend": backend,
+        "Latency_ms": round(scored["score_seconds"] * 1000 / max(len(texts), 1), 3),
+    })
+    output_dir.mkdir(parents=True, exist_ok=True)
+    path = output_dir / f"inference_experiments_{name}.csv"
+    report.to_csv(path, index=False)
+    return path
+
+
+def _csv_list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", type=_csv_list, default=list(BENCHMARK_BACKENDS),
+                        help=f"Comma-separated subset of {', '.join(BENCHMARK_BACKENDS)}")
+    parser.add_argument("--sets", type=_csv_list, default=None, help="Comma-separated subset of the evaluation sets")
+    parser.add_argument("--checkpoint", type=Path, default=None,
+                        help="Checkpoint for the BERT backends (default: the one the API serves)")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--jobs", type=int, default=None, help="Backends scored at once (default: one per core)")
+    parser.add_argument("--experiments-backend", default="bert-torch",
+                        help="Backend whose predictions fill the Experiments reports (falls back to the first available)")
+    parser.add_argument("--no-cache", action="store_true", help="Rescore every backend and set")
+    parser.add_argument("--output-dir", type=Path, default=REPORT_DIR)
+    parser.add_argument("--experiments-dir", type=Path, default=EXPERIMENTS_DIR)
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    sets = args.sets or set_names()
+    unknown = [name for name in args.backends if name not in BENCHMARK_BACKENDS]
+    unknown += [name for name in sets if name not in set_names()]
+    if unknown:
+        parser.error(f"Unknown backend or set: {', '.join(unknown)}")
+
+    if args.worker is not None:
+        result = run_backend(args.worker, sets, args.checkpoint, args.batch_size)
+        print(RESULT_MARKER + json.dumps(result))
+        return
+
+    from app.inference.predictor import POSTPROCESS_CONFIG
+    from app.inference.postprocess import DEFAULT_POSTPROCESS, PostProcess
+
+    rules = PostProcess.load(Path(POSTPROCESS_CONFIG)) if POSTPROCESS_CONFIG else DEFAULT_POSTPROCESS
+    checkpoint_dir = checkpoint_dir_for(args.checkpoint)
+    data = {name: load_set(name) for name in sets}
+    hashes = {name: set_hash(*data[name]) for name in sets}
+
+    # Cached entries first; only the stale or missing sets go to workers
+    entries: Dict[str, Dict] = {}
+    paths: Dict[str, Optional[Path]] = {}
+    todo: Dict[str, List[str]] = {}
+    for backend in args.backends:
+        digest = model_hash(backend, checkpoint_dir)
+        paths[backend] = cache_path(backend, digest, rules.fingerprint()) if digest is not None else None
+        entries[backend] = {"sets": {}} if args.no_cache else read_cache(paths[backend])
+        entries[backend]["model_hash"] = digest
+        stale = [name for name in sets if entries[backend]["sets"].get(name, {}).get("sha256") != hashes[name]]
+        if stale:
+            todo[backend] = stale
+    cached_sets = {backend: set(sets) - set(todo.get(backend, ())) for backend in args.backends}
+
+    if todo:
+        jobs = max(1, min(args.jobs or os.cpu_count() or 1, len(todo)))
+        threads = max(1, (os.cpu_count() or 1) // jobs)
+        print(f"Scoring {', '.join(todo)} in {jobs} process(es) with {threads} thread(s) each...")
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = {backend: pool.submit(run_in_subprocess, backend, stale, args, threads)
+                       for backend, stale in todo.items()}
+        for backend, future in futures.items():
+            result = future.result()
+            if result is None:
+                continue
+            entry = entries[backend]
+            entry.update(engine=result["engine"], load_seconds=result["load_seconds"], backend=backend)
+            for name, scored in result["sets"].items():
+                entry["sets"][name] = {**scored, "sha256": hashes[name]}
+            # The baseline may have been trained by the worker just now
+            if entry["model_hash"] is None:
+                entry["model_hash"] = model_hash(backend, checkpoint_dir)
+                if entry["model_hash"] is not None:
+                    paths[backend] = cache_path(backend, entry["model_hash"], rules.fingerprint())
+            if paths[backend] is not None:
+                write_cache(paths[backend], entry)
+        print(f"Scored in {time.perf_counter() - started:.1f}s")
+
+    available = [backend for backend in args.backends if all(name in entries[backend]["sets"] for name in sets)]
+    if not available:
+        print("No backend could be evaluated.")
+        sys.exit(1)
+
+    rows = []
+    matrices_dir = args.output_dir / "confusion_matrices"
+    matrices_dir.mkdir(parents=True, exist_ok=True)
+    label_names = [EXPERIMENT_LABEL_NAMES[value] for value in LABEL_VALUES]
+    for backend in available:
+        for name in sets:
+            texts, labels = data[name]
+            rows.append(comparison_row(backend, entries[backend], name, labels, name in cached_sets[backend]))
+            matrix = confusion_matrix(labels, np.asarray(entries[backend]["sets"][name]["predictions"]))
+            pd.DataFrame(matrix, index=label_names, columns=label_names).to_csv(
+                matrices_dir / f"{backend}_{name}.csv", index_label="True \\ Predicted"
+            )
+    report = pd.DataFrame(rows)
+    comparison = report[report["Dataset"].isin(COMPARISON_SETS)]
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    comparison_path = args.output_dir / "model_comparison.csv"
+    if not comparison.empty:
+        comparison.to_csv(comparison_path, index=False)
+
+    experiments_backend = args.experiments_backend if args.experiments_backend in available else available[0]
+    experiment_paths = [
+        write_experiment_report(
+            name[len("experiments_"):], experiments_backend, entries[experiments_backend]["sets"][name],
+            *data[name], args.experiments_dir,
+        )
+        for name in sets if name.startswith("experiments_")
+    ]
+
+    columns = ["Backend", "Dataset", "Accuracy", "Precision", "Recall", "F1-macro", "Tweets_Per_Second", "Cached"]
+    print(report[columns].to_string(index=False, float_format=lambda value: f"{value:.4f}"))
+    if not comparison.empty:
+        print(f"\nSaved to {comparison_path}")
+    print(f"Confusion matrices in {matrices_dir}")
+    if experiment_paths:
+        print(f"Experiments reports ({experiments_backend}): {', '.join(str(path) for path in experiment_paths)}")
+
+
+if __name__ == "__main__":
+    main()
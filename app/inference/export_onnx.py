@@ -0,0 +1,125 @@
+"""
+Export the fine-tuned BERT checkpoint to ONNX and check it against PyTorch.
+
+The exported graph has dynamic batch and sequence axes, so it accepts the
+length-bucketed batches produced by the analyzer. After exporting, the logits
+of the ONNX Runtime and PyTorch backends are compared on `test_tweets.csv`.
+
+Usage:
+    # Export checkpoints/bert-base/best/model.onnx and run the parity check
+    python -m app.inference.export_onnx
+
+    # Only re-run the parity check against an existing model.onnx
+    python -m app.inference.export_onnx --check-only
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import torch
+from transformers import AutoTokenizer
+
+from app.inference.backends import (
+    ONNX_MODEL_NAME,
+    OnnxBackend,
+    TorchBackend,
+    iter_length_buckets,
+)
+from app.inference.weights import load_pretrained_model
+
+_PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+TEST_TWEETS_PATH = _PROJECT_ROOT / "test_tweets.csv"
+INPUT_NAMES = ["input_ids", "attention_mask", "token_type_ids"]
+MAX_LENGTH = 128
+
+
+def export_onnx(checkpoint_dir: Path, output_path: Path, opset: int = 17) -> Path:
+    """Trace the checkpoint into ONNX with dynamic (batch, sequence) axes."""
+    tokenizer = AutoTokenizer.from_pretrained(checkpoint_dir, use_fast=True)
+    model = load_pretrained_model(checkpoint_dir)
+
+    sample = tokenizer(
+        ["an example tweet", "a slightly longer example tweet for tracing"],
+        padding=True, return_tensors="pt",
+    )
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in INPUT_NAMES}
+    dynamic_axes["logits"] = {0: "batch"}
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (),
+            str(output_path),
+            kwargs={name: sample[name] for name in INPUT_NAMES},
+            input_names=INPUT_NAMES,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            dynamo=False,
+        )
+    return output_path
+
+
+def parity_check(
+    checkpoint_dir: Path,
+    onnx_path: Path,
+    texts: Sequence[str],
+    batch_size: int = 16,
+    atol: float = 1e-4,
+) -> float:
+    """Compare ONNX Runtime and PyTorch logits on ``texts``.
+
+    Both backends receive identical length-bucketed batches. Returns the
+    largest absolute difference and raises ``AssertionError`` above ``atol``.
+    """
+    tokenizer = AutoTokenizer.from_pretrained(checkpoint_dir, use_fast=True)
+    model = load_pretrained_model(checkpoint_dir)
+    torch_backend = TorchBackend(model)
+    onnx_backend = OnnxBackend(onnx_path)
+
+    max_diff = 0.0
+    for _, arrays in iter_length_buckets(tokenizer, texts, batch_size, MAX_LENGTH):
+        expected = torch_backend.predict_logits(arrays)
+        actual = onnx_backend.predict_logits(arrays)
+        max_diff = max(max_diff, float(np.max(np.abs(expected - actual))))
+    if max_diff > atol:
+        raise AssertionError(
+            f"ONNX logits differ from PyTorch by {max_diff:.2e} (tolerance {atol:.0e})."
+        )
+    return max_diff
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    from app.inference.predictor import CHECKPOINT_DIR
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--checkpoint", type=Path, default=CHECKPOINT_DIR)
+    parser.add_argument("--output", type=Path, default=None, help=f"Defaults to <checkpoint>/{ONNX_MODEL_NAME}")
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--tweets", type=Path, default=TEST_TWEETS_PATH, help="CSV with a `tweet` column")
+    parser.add_argument("--atol", type=float, default=1e-4)
+    parser.add_argument("--check-only", action="store_true", help="Skip the export")
+    args = parser.parse_args(argv)
+
+    output_path = args.output or args.checkpoint / ONNX_MODEL_NAME
+    if not args.check_only:
+        export_onnx(args.checkpoint, output_path, args.opset)
+        print(f"Exported {output_path} ({output_path.stat().st_size / (1024 * 1024):.2f} MB)")
+
+    texts = pd.read_csv(args.tweets)["tweet"].dropna().astype(str).tolist()
+    try:
+        max_diff = parity_check(args.checkpoint, output_path, texts, atol=args.atol)
+    except AssertionError as exc:
+        print(f"Parity check FAILED: {exc}")
+        sys.exit(1)
+    print(f"Parity check passed on {len(texts)} tweets: max |logit diff| = {max_diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
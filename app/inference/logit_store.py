@@ -0,0 +1,236 @@
+"""
+Raw BERT logits stored on disk, so the post-processing rules can be tuned offline.
+
+`compute` runs the transformer once over every row of TwitterToxicity.csv and
+of the ground-truth test set. It writes the raw (N, 3) float32 logits to
+`models/logit_store/<key>/<source>.npy`. Row i holds the logits of row i of
+the source CSV, so `val_ids.csv` and `test_ids.csv` index the dataset array
+directly. Rows with empty text stay NaN.
+
+The key combines a content hash of the checkpoint with the inference engine
+(`bert-torch`, `bert-torch-int8`, `bert-onnx`). The hash covers the config,
+weight and tokenizer files, plus the quantized or ONNX file when the engine
+uses one. Each model version therefore gets its own store, and a registry
+version shares the store of the checkpoint it was copied from.
+
+When `python -m app.inference.dataset_cache build` has cached the
+checkpoint's tokens, dataset rows are scored from them without tokenizing.
+
+Work is done in chunks and can be resumed: an interrupted run continues at
+the first missing row. Stores are opened with `np.load(mmap_mode="r")`, so
+opening one reads no rows until they are used. `python -m
+app.inference.tuning` replays post-processing configurations over a store.
+
+Usage:
+    python -m app.inference.logit_store compute
+    python -m app.inference.logit_store compute --checkpoint checkpoints/bert-base/variants/L6-ft
+    python -m app.inference.logit_store compute --quantization dynamic --sources dataset
+    python -m app.inference.logit_store list
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from app.inference import dataset_cache
+from app.inference.autotune import engine_name
+from app.inference.backends import ONNX_MODEL_NAME
+from app.inference.compiled_baseline import sha256_file
+from app.inference.data import dataset_path
+from app.inference.predictor import MODELS_DIR, SENTIMENT_LABELS, TweetAnalyzer, _PROJECT_ROOT
+from app.inference.registry import SKIPPED_CHECKPOINT_FILES, content_hash
+
+STORE_DIR = Path(os.environ.get("TWEET_LOGIT_STORE", MODELS_DIR / "logit_store"))
+GROUND_TRUTH_PATH = _PROJECT_ROOT / "Final_Project_Deliverables" / "ground_truth_test_set.csv"
+SOURCES = ("dataset", "ground_truth")
+META_NAME = "meta.json"
+QUANTIZED_WEIGHTS_NAME = "pytorch_model_quantized.bin"
+# Files derived from the float weights; only hashed when the engine loads them
+DERIVED_FILES = {QUANTIZED_WEIGHTS_NAME, ONNX_MODEL_NAME}
+# Tweets per chunk written (and flushed) before moving on
+CHUNK_SIZE = 2048
+
+
+def source_path(source: str) -> Path:
+    if source == "dataset":
+        return dataset_path()
+    if source == "ground_truth":
+        return GROUND_TRUTH_PATH
+    raise ValueError(f"Unknown logit source {source!r}; expected one of {SOURCES}.")
+
+
+def source_texts(source: str) -> List[Optional[str]]:
+    """Texts of ``source`` by row position; None where the text is missing or blank."""
+    reviews = pd.read_csv(source_path(source))["review"]
+    return [text if isinstance(text, str) and text.strip() else None for text in reviews]
+
+
+def checkpoint_hash(checkpoint_dir: Path, engine: str) -> str:
+    """Content hash of the checkpoint files that determine ``engine``'s logits."""
+    used = set()
+    if "int8" in engine:
+        used.add(QUANTIZED_WEIGHTS_NAME)
+    if "onnx" in engine:
+        used.add(ONNX_MODEL_NAME)
+    files = {
+        path.name: sha256_file(path)
+        for path in sorted(Path(checkpoint_dir).iterdir())
+        if path.is_file()
+        and path.name not in SKIPPED_CHECKPOINT_FILES
+        and (path.name not in DERIVED_FILES or path.name in used)
+    }
+    return content_hash(files)
+
+
+def store_key(analyzer: TweetAnalyzer) -> str:
+    engine = engine_name(analyzer)
+    return f"{checkpoint_hash(analyzer.checkpoint_dir, engine)[:16]}-{engine}"
+
+
+def _read_meta(directory: Path) -> Dict:
+    path = directory / META_NAME
+    return json.loads(path.read_text()) if path.exists() else {"sources": {}}
+
+
+def _write_meta(directory: Path, meta: Dict) -> None:
+    tmp_path = directory / f"{META_NAME}.tmp"
+    tmp_path.write_text(json.dumps(meta, indent=2))
+    os.replace(tmp_path, directory / META_NAME)
+
+
+def compute(
+    analyzer: TweetAnalyzer,
+    sources: Sequence[str] = SOURCES,
+    batch_size: Optional[int] = None,
+    store_dir: Path = STORE_DIR,
+) -> Path:
+    """Fill in the missing logits of every source for ``analyzer``'s model; returns the store."""
+    if analyzer.transformer_backend is None:
+        raise RuntimeError("Storing logits needs the transformer; only the baseline loaded.")
+    key = store_key(analyzer)
+    directory = store_dir / key
+    directory.mkdir(parents=True, exist_ok=True)
+    meta = _read_meta(directory)
+    meta.update({
+        "key": key,
+        "engine": engine_name(analyzer),
+        "checkpoint": str(analyzer.checkpoint_dir),
+        "labels": SENTIMENT_LABELS,
+    })
+
+    for source in sources:
+        texts = source_texts(source)
+        source_hash = sha256_file(source_path(source))
+        path = directory / f"{source}.npy"
+        previous = meta["sources"].get(source)
+        if path.exists() and previous is not None and previous["sha256"] == source_hash:
+            logits = np.load(path, mmap_mode="r+")
+        else:
+            # New source, or the CSV changed since the rows were computed
+            logits = np.lib.format.open_memmap(
+                path, mode="w+", dtype=np.float32, shape=(len(texts), len(SENTIMENT_LABELS))
+            )
+            logits[:] = np.nan
+        meta["sources"][source] = {
+            "path": str(source_path(source)),
+            "sha256": source_hash,
+            "rows": len(texts),
+            "scored_rows": sum(text is not None for text in texts),
+            "complete": False,
+        }
+        _write_meta(directory, meta)
+
+        missing = np.isnan(logits).any(axis=1)
+        todo = [row for row, text in enumerate(texts) if text is not None and missing[row]]
+        # Dataset rows are read pre-tokenized when the cache has this tokenizer's tokens
+        cache = dataset_cache.open_current(analyzer.checkpoint_dir) if source == "dataset" else None
+        print(f"{source}: {len(texts)} rows, {len(todo)} to score{' (tokens from the dataset cache)' if cache else ''}")
+        started = time.perf_counter()
+        for start in range(0, len(todo), CHUNK_SIZE):
+            rows = np.array(todo[start:start + CHUNK_SIZE])
+            cached = np.asarray(cache.valid)[rows] if cache is not None else np.zeros(len(rows), dtype=bool)
+            if cached.any():
+                logits[rows[cached]] = dataset_cache.transformer_logits(
+                    analyzer, cache, rows[cached], batch_size or analyzer.batch_size
+                )
+            if not cached.all():
+                logits[rows[~cached]] = analyzer._transformer_logits(
+                    [texts[row] for row in rows[~cached]], batch_size or analyzer.batch_size
+                )
+            logits.flush()
+            done = start + len(rows)
+            elapsed = time.perf_counter() - started
+            remaining = elapsed / done * (len(todo) - done)
+            print(f"  {done}/{len(todo)} rows, {elapsed:.0f}s elapsed, ~{remaining:.0f}s left")
+        del logits
+        meta["sources"][source]["complete"] = True
+        meta["sources"][source]["computed"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        _write_meta(directory, meta)
+    return directory
+
+
+def load(key: str, source: str, store_dir: Path = STORE_DIR) -> np.ndarray:
+    """Memory-mapped (N, 3) logits of ``source``; rows follow the source CSV."""
+    directory = store_dir / key
+    entry = _read_meta(directory)["sources"].get(source)
+    if entry is None or not entry["complete"]:
+        raise FileNotFoundError(
+            f"No complete {source!r} logits in {directory}; run `python -m app.inference.logit_store compute`."
+        )
+    if sha256_file(Path(entry["path"])) != entry["sha256"]:
+        print(f"Warning: {entry['path']} changed after its logits were stored; recompute the store.")
+    return np.load(directory / f"{source}.npy", mmap_mode="r")
+
+
+def list_stores(store_dir: Path = STORE_DIR) -> List[Dict]:
+    if not store_dir.exists():
+        return []
+    stores = [_read_meta(directory) for directory in sorted(store_dir.iterdir()) if (directory / META_NAME).exists()]
+    return [meta for meta in stores if "key" in meta]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compute_parser = subparsers.add_parser("compute", help="Score the sources and store their raw logits")
+    compute_parser.add_argument("--checkpoint", type=Path, default=None,
+                                help="Checkpoint directory (default: the one the API serves)")
+    compute_parser.add_argument("--backend", default=None, help="Inference backend (default: TWEET_BACKEND)")
+    compute_parser.add_argument("--quantization", default=None, help="none or dynamic (default: TWEET_QUANTIZATION)")
+    compute_parser.add_argument("--sources", nargs="+", choices=SOURCES, default=list(SOURCES))
+    compute_parser.add_argument("--batch-size", type=int, default=None)
+    subparsers.add_parser("list", help="Show stored logit sets")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for meta in list_stores():
+            sources = ", ".join(
+                f"{name} ({entry['scored_rows']} rows{'' if entry['complete'] else ', incomplete'})"
+                for name, entry in meta["sources"].items()
+            )
+            print(f"{meta['key']}  {meta['checkpoint']}  {sources}")
+        return
+
+    analyzer = TweetAnalyzer(
+        model="auto",
+        backend=args.backend,
+        quantization=args.quantization,
+        checkpoint_dir=args.checkpoint,
+        cache_max_entries=0,
+        near_dup_max_entries=0,
+    )
+    directory = compute(analyzer, args.sources, args.batch_size)
+    print(f"Saved to {directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Process memory helpers used by the reports and the worker pool.
+
+On Linux the numbers come from `/proc`, which distinguishes memory a process
+shares with others (for example model weights inherited from a parent) from
+memory that is private to it. Elsewhere only the peak RSS of the current
+process is available.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Dict, Optional
+
+_MB = 1024 * 1024
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process in megabytes (Linux), else peak RSS."""
+    try:
+        with open("/proc/self/statm") as handle:
+            resident_pages = int(handle.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / _MB
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in megabytes."""
+    import resource
+    import sys
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / _MB if sys.platform == "darwin" else peak / 1024
+
+
+def process_memory_mb(pid: Optional[int] = None) -> Dict[str, float]:
+    """RSS, PSS, shared, private and anonymous memory of ``pid`` (default: this process).
+
+    PSS (proportional set size) divides each shared page by the number of
+    processes mapping it, so summing PSS across workers gives their real
+    combined footprint. Anonymous memory excludes file-backed pages such as
+    memory-mapped weights, which the kernel can share and reclaim. Returns an
+    empty dict when `/proc` is unavailable.
+    """
+    path = f"/proc/{pid or 'self'}/smaps_rollup"
+    fields = {
+        "Rss": "rss_mb",
+        "Pss": "pss_mb",
+        "Shared_Clean": "shared_clean_mb",
+        "Shared_Dirty": "shared_dirty_mb",
+        "Private_Clean": "private_clean_mb",
+        "Private_Dirty": "private_dirty_mb",
+        "Anonymous": "anonymous_mb",
+    }
+    usage: Dict[str, float] = {}
+    try:
+        with open(path) as handle:
+            for line in handle:
+                key, _, rest = line.partition(":")
+                if key in fields:
+                    usage[fields[key]] = int(rest.split()[0]) / 1024
+    except (OSError, ValueError, IndexError):
+        return {}
+    usage["shared_mb"] = usage.get("shared_clean_mb", 0.0) + usage.get("shared_dirty_mb", 0.0)
+    usage["private_mb"] = usage.get("private_clean_mb", 0.0) + usage.get("private_dirty_mb", 0.0)
+    return usage
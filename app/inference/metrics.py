@@ -0,0 +1,230 @@
+"""
+In-process latency histograms and counters in Prometheus text format.
+
+The analyzer records how long each hot-path stage takes (tokenization,
+forward pass, device-to-host transfer, rule post-processing, ...) and which
+model served every tweet. The FastAPI app exposes everything at `/metrics`.
+Only the standard library is used, so the hooks cost a `perf_counter` call and
+a short lock per stage and need no extra dependency.
+"""
+
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+# Latency buckets in seconds, from 100 µs to 10 s
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}.")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        if not items and not self.labelnames:
+            items = [((), 0.0)]
+        lines = self.header()
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram per label combination."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label key -> (per-bucket counts incl. +Inf, sum, count)
+        self._series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the wall-clock seconds spent inside the ``with`` block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self, **labels: str) -> Dict[str, float]:
+        """Count and sum of one series (zeros when never observed)."""
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return {"count": series[2], "sum": series[1]} if series else {"count": 0, "sum": 0.0}
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, [list(series[0]), series[1], series[2]]) for key, series in self._series.items())
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(float(bound))}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            plain = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{plain} {_format_value(float(total))}")
+            lines.append(f"{self.name}_count{plain} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metrics plus callbacks that report point-in-time gauges."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._gauge_callbacks: List[Callable[[], Dict[str, Tuple[str, float]]]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def add_gauge_callback(self, callback: Callable[[], Dict[str, Tuple[str, float]]]) -> None:
+        """Register ``callback() -> {name: (help, value)}``.
+
+        Used for values another component already tracks (queue depth, cache
+        hits), which are read when `/metrics` is scraped.
+        """
+        with self._lock:
+            self._gauge_callbacks.append(callback)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            callbacks = list(self._gauge_callbacks)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for callback in callbacks:
+            for name, (help_text, value) in callback().items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+                lines.append(f"{name} {_format_value(float(value))}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "tweet_inference_stage_seconds",
+    "Seconds per invocation of each inference stage (tokenize, pad, forward, transfer, ...).",
+    labelnames=("stage",),
+)
+BATCH_SIZE = REGISTRY.histogram(
+    "tweet_inference_batch_size",
+    "Tweets per uncached analyze_batch call.",
+    buckets=BATCH_SIZE_BUCKETS,
+)
+PREDICTIONS = REGISTRY.counter(
+    "tweet_predictions_total",
+    "Tweets scored, by what served them (transformer, baseline, cache or near_duplicate).",
+    labelnames=("model",),
+)
+# Export zeros up front so alerts on the baseline rate work from the first scrape
+for _model in ("transformer", "baseline", "cache", "near_duplicate"):
+    PREDICTIONS.inc(0, model=_model)
+
+FALLBACKS = REGISTRY.counter(
+    "tweet_model_fallbacks_total",
+    "Batches the transformer failed on and the TF-IDF baseline served instead.",
+)
+
+
+def stage(name: str):
+    """Shorthand for ``STAGE_SECONDS.time(stage=name)``."""
+    return STAGE_SECONDS.time(stage=name)
@@ -0,0 +1,148 @@
+"""
+Hit rate and agreement of the near-duplicate index on the dataset.
+
+With `TWEET_NEAR_DUP_MAX_ENTRIES` set, the analyzer keeps recently scored
+tweets in a `NearDuplicateIndex`. A new tweet whose shingles reach
+`TWEET_NEAR_DUP_THRESHOLD` Jaccard similarity with a stored one reuses that
+tweet's label and scores without a model call. This tool scores the dataset
+once with full inference, in file order as a stand-in for live traffic. It
+then replays the index for a grid of thresholds. For each threshold it
+reports the hit rate, how often a reused label agrees with full inference,
+and the macro-F1 of the served labels. It then suggests the lowest threshold
+whose reused labels agree at least `--min-agreement` of the time.
+
+Usage:
+    python -m app.inference.near_duplicates
+    python -m app.inference.near_duplicates --limit 5000 --max-entries 2000 --min-agreement 0.98
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import f1_score
+
+from app.inference import postprocess
+from app.inference.cache import NearDuplicateIndex
+from app.inference.data import load_dataset
+from app.inference.predictor import LABEL_MAP, SENTIMENT_LABELS, TweetAnalyzer, _PROJECT_ROOT
+
+REPORT_DIR = _PROJECT_ROOT / "exports"
+DEFAULT_THRESHOLDS = (0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+
+def replay(
+    texts: Sequence[str],
+    predicted: np.ndarray,
+    scores: np.ndarray,
+    labels: np.ndarray,
+    threshold: float,
+    max_entries: int,
+) -> Dict:
+    """Serve ``texts`` in order through a fresh index; one report row."""
+    hits = postprocess.keyword_hits(texts)
+    index = NearDuplicateIndex(max_entries=max_entries, threshold=threshold)
+    served = predicted.copy()
+    score_diffs: List[float] = []
+    started = time.perf_counter()
+    for position, text in enumerate(texts):
+        probe = index.probe(text, hits[position].tobytes())
+        if probe is None:
+            continue
+        stored = index.get(probe)
+        if stored is None:
+            index.put(probe, position)
+            continue
+        served[position] = predicted[stored]
+        score_diffs.append(float(np.abs(scores[stored] - scores[position]).max()))
+    lookup_us = (time.perf_counter() - started) * 1e6 / len(texts)
+
+    stats = index.stats()
+    reused = stats["hits"]
+    disagreements = int((served != predicted).sum())
+    # Served labels are indexes into SENTIMENT_LABELS; dataset labels are -1/0/1
+    as_dataset = np.array([{name: value for value, name in LABEL_MAP.items()}[name] for name in SENTIMENT_LABELS])
+    return {
+        "threshold": threshold,
+        "max_entries": max_entries,
+        "tweets": len(texts),
+        "reused": reused,
+        "hit_rate": reused / len(texts),
+        "skipped_short": stats["skipped_short"],
+        "evictions": stats["evictions"],
+        "label_agreement": 1.0 - disagreements / reused if reused else float("nan"),
+        "disagreements": disagreements,
+        "mean_max_score_diff": float(np.mean(score_diffs)) if score_diffs else float("nan"),
+        "f1_macro_full": f1_score(labels, as_dataset[predicted], average="macro"),
+        "f1_macro_served": f1_score(labels, as_dataset[served], average="macro"),
+        "lookup_us_per_tweet": lookup_us,
+    }
+
+
+def recommend(report: pd.DataFrame, min_agreement: float) -> Optional[pd.Series]:
+    """Lowest threshold whose reused labels agree with full inference often enough."""
+    eligible = report[(report["reused"] > 0) & (report["label_agreement"] >= min_agreement)]
+    if eligible.empty:
+        return None
+    return eligible.sort_values("threshold").iloc[0]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=list(DEFAULT_THRESHOLDS))
+    parser.add_argument("--max-entries", type=int, default=10000, help="Index size, as TWEET_NEAR_DUP_MAX_ENTRIES")
+    parser.add_argument("--min-agreement", type=float, default=0.99,
+                        help="Required agreement of reused labels with full inference")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N tweets of the dataset")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--output-dir", type=Path, default=REPORT_DIR)
+    args = parser.parse_args(argv)
+
+    df = load_dataset().dropna(subset=["review", "label"])
+    df = df[df["review"].astype(str).str.strip().str.len() > 0]
+    if args.limit is not None:
+        df = df.head(args.limit)
+    texts = df["review"].astype(str).tolist()
+    labels = df["label"].astype(int).to_numpy()
+
+    analyzer = TweetAnalyzer(cache_max_entries=0, near_dup_max_entries=0)
+    print(f"Scoring {len(texts)} tweets with full inference ({analyzer.primary_model})...")
+    started = time.perf_counter()
+    results = analyzer.analyze_batch(texts, batch_size=args.batch_size)
+    model_ms = (time.perf_counter() - started) * 1000 / len(texts)
+    predicted = np.array([SENTIMENT_LABELS.index(result.sentiment_label) for result in results])
+    scores = np.array([[result.sentiment_scores[name] for name in SENTIMENT_LABELS] for result in results])
+    print(f"{model_ms:.3f} ms/tweet")
+
+    report = pd.DataFrame([
+        replay(texts, predicted, scores, labels, threshold, args.max_entries) for threshold in args.thresholds
+    ])
+    report["model_ms_per_tweet"] = model_ms
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    output_path = args.output_dir / "near_duplicates_report.csv"
+    report.to_csv(output_path, index=False)
+
+    columns = ["threshold", "hit_rate", "label_agreement", "f1_macro_full", "f1_macro_served", "lookup_us_per_tweet"]
+    print(report[columns].to_string(index=False, float_format=lambda value: f"{value:.4f}"))
+    best = recommend(report, args.min_agreement)
+    if best is None:
+        print(f"\nNo threshold reuses results with {args.min_agreement:.1%} label agreement on this data.")
+    else:
+        print(
+            f"\nRecommended (reused labels agree >= {args.min_agreement:.1%}): "
+            f"TWEET_NEAR_DUP_MAX_ENTRIES={args.max_entries} TWEET_NEAR_DUP_THRESHOLD={best['threshold']:g}"
+        )
+        print(
+            f"  answers {best['hit_rate']:.1%} of tweets without a model call, "
+            f"macro-F1 {best['f1_macro_served']:.4f} ({best['f1_macro_served'] - best['f1_macro_full']:+.4f})"
+        )
+    print(f"\nSaved to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
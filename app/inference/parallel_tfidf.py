@@ -0,0 +1,162 @@
+"""
+Multi-process `TfidfVectorizer` fitting and transformation.
+
+`TfidfVectorizer` tokenizes in a single Python thread. Here the corpus is
+split into one chunk per worker process:
+
+1. Each worker counts the document frequency and total count of every n-gram
+   in its chunk. The parent merges the counts and prunes them exactly like
+   `CountVectorizer` does (`min_df`, `max_df`, `max_features`). It then
+   derives the smoothed IDF weights exactly like `TfidfTransformer`.
+2. Each worker turns its chunk into a term-count matrix over that vocabulary.
+   The parent stacks the chunks and applies the TF-IDF weighting.
+
+Workers tokenize with `WordNgramAnalyzer` and import neither this project's
+model code nor sklearn, so they start quickly. The fitted vectorizer is a
+regular `TfidfVectorizer` with the same vocabulary and IDF weights as a serial
+fit, and `transform` returns exactly what `TfidfVectorizer.transform` would.
+Settings the analyzer does not reproduce, and vectorizers without IDF
+weighting, fall back to the serial path.
+"""
+
+from __future__ import annotations
+
+import os
+from collections import Counter
+from numbers import Integral
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from joblib import Parallel, delayed
+
+from app.inference.compiled_baseline import WordNgramAnalyzer
+
+# Below this many documents per worker, process start-up outweighs the gain
+MIN_DOCS_PER_JOB = 5000
+
+
+def resolve_jobs(n_jobs: Optional[int], n_docs: int) -> int:
+    """Worker count for ``n_docs`` documents; ``None`` means one per core."""
+    n_jobs = max(1, n_jobs or os.cpu_count() or 1)
+    return max(1, min(n_jobs, n_docs // MIN_DOCS_PER_JOB))
+
+
+def _chunks(items: Sequence, count: int) -> List[Sequence]:
+    size = -(-len(items) // count)
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def _count_terms(texts: Sequence[str], analyzer: WordNgramAnalyzer) -> Tuple[Counter, Counter]:
+    """Document frequency and total count of every n-gram in ``texts``."""
+    document_counts: Counter = Counter()
+    term_counts: Counter = Counter()
+    for text in texts:
+        grams = analyzer(text)
+        term_counts.update(grams)
+        document_counts.update(set(grams))
+    return document_counts, term_counts
+
+
+def _count_matrix(
+    texts: Sequence[str], analyzer: WordNgramAnalyzer, vocabulary: Dict[str, int]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """CSR ``(data, indices, indptr)`` of term counts, like `CountVectorizer._count_vocab`."""
+    indices: List[int] = []
+    data: List[int] = []
+    indptr = [0]
+    for text in texts:
+        counts: Dict[int, int] = {}
+        for gram in analyzer(text):
+            column = vocabulary.get(gram)
+            if column is not None:
+                counts[column] = counts.get(column, 0) + 1
+        indices.extend(counts)
+        data.extend(counts.values())
+        indptr.append(len(indices))
+    return np.array(data, dtype=np.int64), np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)
+
+
+def _analyzer_or_none(vectorizer) -> Optional[WordNgramAnalyzer]:
+    try:
+        return WordNgramAnalyzer.from_vectorizer(vectorizer)
+    except ValueError:
+        return None
+
+
+def _prune(document_counts: Counter, term_counts: Counter, n_docs: int, vectorizer) -> Tuple[List[str], np.ndarray]:
+    """Kept terms in column order and their document frequencies."""
+    # CountVectorizer sorts terms alphabetically before limiting max_features
+    terms = sorted(document_counts)
+    dfs = np.array([document_counts[term] for term in terms], dtype=np.int64)
+    max_df, min_df = vectorizer.max_df, vectorizer.min_df
+    max_doc_count = max_df if isinstance(max_df, Integral) else max_df * n_docs
+    min_doc_count = min_df if isinstance(min_df, Integral) else min_df * n_docs
+    if max_doc_count < min_doc_count:
+        raise ValueError("max_df corresponds to < documents than min_df")
+    mask = (dfs <= max_doc_count) & (dfs >= min_doc_count)
+    limit = vectorizer.max_features
+    if limit is not None and mask.sum() > limit:
+        tfs = np.array([term_counts[term] for term in terms], dtype=np.int64)
+        limited = np.zeros(len(dfs), dtype=bool)
+        limited[np.where(mask)[0][(-tfs[mask]).argsort()[:limit]]] = True
+        mask = limited
+    kept = np.where(mask)[0]
+    if len(kept) == 0:
+        raise ValueError("After pruning, no terms remain. Try a lower min_df or a higher max_df.")
+    return [terms[index] for index in kept], dfs[kept]
+
+
+def fit_transform(vectorizer, texts: Sequence[str], n_jobs: Optional[int] = None):
+    """Fit the unfitted ``vectorizer`` on ``texts`` and return their TF-IDF matrix."""
+    texts = list(texts)
+    n_jobs = resolve_jobs(n_jobs, len(texts))
+    analyzer = _analyzer_or_none(vectorizer)
+    if n_jobs == 1 or analyzer is None or not vectorizer.use_idf or vectorizer.vocabulary is not None:
+        # fit_transform rounds differently from transform; this matches the parallel path
+        return vectorizer.fit(texts).transform(texts)
+
+    counted = Parallel(n_jobs=n_jobs)(delayed(_count_terms)(chunk, analyzer) for chunk in _chunks(texts, n_jobs))
+    document_counts, term_counts = counted[0]
+    for chunk_documents, chunk_terms in counted[1:]:
+        document_counts.update(chunk_documents)
+        term_counts.update(chunk_terms)
+    terms, dfs = _prune(document_counts, term_counts, len(texts), vectorizer)
+
+    vectorizer.vocabulary_ = {term: column for column, term in enumerate(terms)}
+    # Same arithmetic as TfidfTransformer.fit
+    idf = np.full(len(terms), len(texts) + int(vectorizer.smooth_idf), dtype=np.float64)
+    idf /= dfs.astype(np.float64) + float(vectorizer.smooth_idf)
+    np.log(idf, out=idf)
+    idf += 1.0
+    vectorizer.idf_ = idf
+    return transform(vectorizer, texts, n_jobs)
+
+
+def transform(vectorizer, texts: Sequence[str], n_jobs: Optional[int] = None):
+    """``vectorizer.transform(texts)`` spread over ``n_jobs`` processes."""
+    import scipy.sparse as sp
+    from sklearn.feature_extraction.text import TfidfTransformer
+
+    texts = list(texts)
+    n_jobs = resolve_jobs(n_jobs, len(texts))
+    analyzer = _analyzer_or_none(vectorizer)
+    if n_jobs == 1 or analyzer is None or not vectorizer.use_idf:
+        return vectorizer.transform(texts)
+
+    vocabulary = vectorizer.vocabulary_
+    parts = Parallel(n_jobs=n_jobs)(
+        delayed(_count_matrix)(chunk, analyzer, vocabulary) for chunk in _chunks(texts, n_jobs)
+    )
+    counts = sp.vstack(
+        [sp.csr_matrix(part, shape=(len(part[2]) - 1, len(vocabulary)), dtype=vectorizer.dtype) for part in parts],
+        format="csr",
+    )
+    counts.sort_indices()
+    transformer = TfidfTransformer(
+        norm=vectorizer.norm,
+        use_idf=True,
+        smooth_idf=vectorizer.smooth_idf,
+        sublinear_tf=vectorizer.sublinear_tf,
+    )
+    transformer.idf_ = vectorizer.idf_
+    return transformer.transform(counts, copy=False)
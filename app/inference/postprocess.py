@@ -0,0 +1,392 @@
+"""
+Vectorized post-processing rules for the Twitter toxicity analyzer.
+
+The analyzer corrects the raw model output with three hand-written rules:
+temperature scaling of the BERT logits, a sarcasm check ("wonderful ...
+another day of dealing with this nonsense") and a redistribution that reduces
+the model's neutral bias. This module applies those rules to a whole batch at
+once: scores are (N, 3) matrices in the order negative, neutral, positive, and
+the sarcasm lexicon is matched with a single precompiled regular expression per
+text. The arithmetic mirrors the original per-tweet rules operation for
+operation so that the outputs are bit-for-bit identical.
+
+Every constant of the BERT rules and of the label decision is a field of
+`PostProcess`, whose defaults are the shipped values. Other configurations can
+be replayed over stored logits (`python -m app.inference.tuning`) and served
+with `TWEET_POSTPROCESS_CONFIG`.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import functools
+import hashlib
+import json
+import re
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# Sarcasm patterns: a positive word together with any of its negative contexts.
+# The score adjustment and the final label decision historically used slightly
+# different lexicons; both are kept as-is.
+SCORE_SARCASM_LEXICON: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("wonderful", ("nonsense", "dealing", "another day")),
+    ("perfect", ("nonsense", "dealing", "another day", "just")),
+    ("great", ("nonsense", "dealing", "another day")),
+    ("amazing", ("nonsense", "dealing", "another day")),
+)
+DECISION_SARCASM_LEXICON: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("wonderful", ("nonsense", "dealing", "another day", "perfect")),
+    ("perfect", ("nonsense", "dealing", "another day", "just")),
+    ("great", ("nonsense", "dealing", "another day")),
+    ("amazing", ("nonsense", "dealing", "another day")),
+)
+
+NEGATIVE, NEUTRAL, POSITIVE = 0, 1, 2
+
+
+class KeywordMatcher:
+    """Find which of a fixed set of keywords occur (as substrings) in each text.
+
+    All keywords are compiled into one regular expression wrapped in a
+    lookahead, so a single left-to-right scan reports overlapping occurrences
+    the same way repeated ``keyword in text`` checks would.
+    """
+
+    def __init__(self, keywords: Sequence[str]) -> None:
+        self.keywords: List[str] = sorted(set(keywords))
+        self.index: Dict[str, int] = {word: i for i, word in enumerate(self.keywords)}
+        # Longest first, so a keyword is never hidden by one of its own prefixes;
+        # the prefixes themselves are recovered through ``_implied``.
+        alternation = "|".join(
+            re.escape(word) for word in sorted(self.keywords, key=len, reverse=True)
+        )
+        self._pattern = re.compile(f"(?=({alternation}))")
+        self._implied = {
+            word: [self.index[other] for other in self.keywords if word.startswith(other)]
+            for word in self.keywords
+        }
+
+    def hits(self, texts: Sequence[str]) -> np.ndarray:
+        """Return an (N, K) boolean matrix of keyword occurrences (case-insensitive)."""
+        hits = np.zeros((len(texts), len(self.keywords)), dtype=bool)
+        for row, text in enumerate(texts):
+            for found in set(self._pattern.findall(text.lower())):
+                hits[row, self._implied[found]] = True
+        return hits
+
+
+class SarcasmRule:
+    """Evaluate a sarcasm lexicon against a keyword hit matrix."""
+
+    def __init__(
+        self, lexicon: Sequence[Tuple[str, Sequence[str]]], matcher: KeywordMatcher
+    ) -> None:
+        size = len(matcher.keywords)
+        self._positive = np.array([matcher.index[word] for word, _ in lexicon])
+        self._context = np.zeros((len(lexicon), size), dtype=bool)
+        for rule, (_, contexts) in enumerate(lexicon):
+            self._context[rule, [matcher.index[word] for word in contexts]] = True
+
+    def detect(self, hits: np.ndarray) -> np.ndarray:
+        """Return an (N,) boolean array: does any positive word meet one of its contexts?"""
+        positive_present = hits[:, self._positive]
+        context_present = hits @ self._context.T
+        return np.any(positive_present & context_present, axis=1)
+
+
+@functools.lru_cache(maxsize=8)
+def _sarcasm_rules(
+    score_lexicon: Tuple[Tuple[str, Tuple[str, ...]], ...],
+    decision_lexicon: Tuple[Tuple[str, Tuple[str, ...]], ...],
+) -> Tuple[KeywordMatcher, SarcasmRule, SarcasmRule]:
+    """One keyword matcher covering both lexicons, plus a rule for each."""
+    matcher = KeywordMatcher(
+        [word for lexicon in (score_lexicon, decision_lexicon)
+         for positive, contexts in lexicon for word in (positive, *contexts)]
+    )
+    return matcher, SarcasmRule(score_lexicon, matcher), SarcasmRule(decision_lexicon, matcher)
+
+
+def _as_lexicon(value: Any) -> Tuple[Tuple[str, Tuple[str, ...]], ...]:
+    return tuple((str(positive), tuple(str(word) for word in contexts)) for positive, contexts in value)
+
+
+@dataclass(frozen=True)
+class PostProcess:
+    """Constants of the post-processing rules; the defaults reproduce the shipped rules.
+
+    Shares of moved probability mass are separate fields (rather than ``x``
+    and ``1 - x``) so the defaults keep the original float arithmetic.
+    """
+
+    # Lower temperature makes BERT predictions more confident and less neutral-biased
+    temperature: float = 0.7
+    # BERT sarcasm rule: positive above the minimum loses min(max_shift, positive - floor)
+    sarcasm_min_positive: float = 0.5
+    sarcasm_max_shift: float = 0.15
+    sarcasm_positive_floor: float = 0.3
+    sarcasm_negative_share: float = 0.8
+    sarcasm_neutral_share: float = 0.2
+    # BERT neutral-bias rule: a neutral score inside (low, high) with a strong
+    # enough runner-up loses `reduction` (`reduction_strong` above `strong`)
+    bias_neutral_low: float = 0.35
+    bias_neutral_high: float = 0.6
+    bias_min_non_neutral: float = 0.25
+    bias_strong_neutral: float = 0.5
+    bias_reduction_strong: float = 0.08
+    bias_reduction: float = 0.12
+    bias_major_share: float = 0.7
+    bias_minor_share: float = 0.3
+    # Label decision: a narrow neutral win goes to the stronger non-neutral class
+    close_call_max_neutral: float = 0.6
+    close_call_min_non_neutral: float = 0.3
+    close_call_margin: float = 0.15
+    prefer_negative_min: float = 0.25
+    prefer_negative_max_positive: float = 0.4
+    # Label decision: sarcasm with a positive score above the minimum is negative
+    decision_sarcasm_min_positive: float = 0.4
+    decision_sarcasm_keep_negative: float = 0.3
+    decision_sarcasm_min_confidence: float = 0.4
+    score_sarcasm_lexicon: Tuple[Tuple[str, Tuple[str, ...]], ...] = SCORE_SARCASM_LEXICON
+    decision_sarcasm_lexicon: Tuple[Tuple[str, Tuple[str, ...]], ...] = DECISION_SARCASM_LEXICON
+
+    @property
+    def matcher(self) -> KeywordMatcher:
+        return _sarcasm_rules(self.score_sarcasm_lexicon, self.decision_sarcasm_lexicon)[0]
+
+    @property
+    def score_sarcasm(self) -> SarcasmRule:
+        return _sarcasm_rules(self.score_sarcasm_lexicon, self.decision_sarcasm_lexicon)[1]
+
+    @property
+    def decision_sarcasm(self) -> SarcasmRule:
+        return _sarcasm_rules(self.score_sarcasm_lexicon, self.decision_sarcasm_lexicon)[2]
+
+    def replace(self, **changes: Any) -> "PostProcess":
+        return PostProcess.from_dict({**self.to_dict(), **changes})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dataclasses.asdict(self)
+
+    @classmethod
+    def from_dict(cls, values: Dict[str, Any]) -> "PostProcess":
+        fields = {field.name for field in dataclasses.fields(cls)}
+        unknown = sorted(set(values) - fields)
+        if unknown:
+            raise ValueError(f"Unknown post-processing settings {unknown}; expected some of {sorted(fields)}.")
+        converted = {
+            name: _as_lexicon(value) if name.endswith("_lexicon") else float(value)
+            for name, value in values.items()
+        }
+        if converted.get("temperature", 1.0) <= 0:
+            raise ValueError("temperature must be positive.")
+        return cls(**converted)
+
+    @classmethod
+    def load(cls, path: Path) -> "PostProcess":
+        with open(path, encoding="utf-8") as handle:
+            return cls.from_dict(json.load(handle))
+
+    def save(self, path: Path) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(json.dumps(self.to_dict(), indent=2) + "\n")
+
+    def fingerprint(self) -> str:
+        """Short hash of the settings, part of the analyzer's result cache keys."""
+        return hashlib.sha256(json.dumps(self.to_dict(), sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+DEFAULT_POSTPROCESS = PostProcess()
+MATCHER = DEFAULT_POSTPROCESS.matcher
+SCORE_SARCASM = DEFAULT_POSTPROCESS.score_sarcasm
+DECISION_SARCASM = DEFAULT_POSTPROCESS.decision_sarcasm
+
+
+def keyword_hits(texts: Sequence[str], config: PostProcess = DEFAULT_POSTPROCESS) -> np.ndarray:
+    """Scan each text once for every sarcasm keyword used by ``config``'s rules."""
+    return config.matcher.hits(texts)
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    """Row-wise softmax of a float32 logit matrix.
+
+    When torch is already loaded (the transformer path) its kernel is used on a
+    zero-copy view of the whole batch, which keeps results bit-identical to the
+    historical ``torch.softmax`` call; otherwise NumPy is used.
+    """
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        return torch.softmax(torch.from_numpy(np.ascontiguousarray(logits)), dim=-1).numpy()
+    shifted = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return shifted / shifted.sum(axis=1, keepdims=True)
+
+
+def transformer_scores(
+    logits: np.ndarray, hits: np.ndarray, config: PostProcess = DEFAULT_POSTPROCESS
+) -> np.ndarray:
+    """Turn an (N, 3) float32 BERT logit matrix into adjusted probabilities.
+
+    Returns a float32 (N, 3) matrix. The float32/float64 mix of every operation
+    matches the original scalar implementation.
+    """
+    probs = softmax(np.asarray(logits, dtype=np.float32) / config.temperature)
+    negative, neutral, positive = probs[:, NEGATIVE], probs[:, NEUTRAL], probs[:, POSITIVE]
+    max_non_neutral = np.maximum(negative, positive)
+    out = probs.copy()
+
+    # If sarcasm detected and positive is high, move mass from positive to negative.
+    sarcastic = config.score_sarcasm.detect(hits) & (positive > config.sarcasm_min_positive)
+    if sarcastic.any():
+        neg, neu, pos = negative[sarcastic], neutral[sarcastic], positive[sarcastic]
+        # min(max_shift, pos - floor): the constant stays a Python float (products
+        # in float64, then rounded) while the difference stays float32.
+        reduction = pos - config.sarcasm_positive_floor
+        keep_constant = ~(reduction < config.sarcasm_max_shift)
+        major = np.where(
+            keep_constant,
+            np.float32(config.sarcasm_max_shift * config.sarcasm_negative_share),
+            reduction * config.sarcasm_negative_share,
+        )
+        minor = np.where(
+            keep_constant,
+            np.float32(config.sarcasm_max_shift * config.sarcasm_neutral_share),
+            reduction * config.sarcasm_neutral_share,
+        )
+        pos = np.where(keep_constant, pos - config.sarcasm_max_shift, pos - reduction)
+        neg = neg + major
+        neu = neu + minor
+        total = neg + neu + pos
+        adjusted = np.stack([neg, neu, pos], axis=1)
+        positive_total = total > 0
+        adjusted[positive_total] /= total[positive_total, None]
+        out[sarcastic] = adjusted
+
+    # General bias reduction: if neutral is only slightly higher, boost non-neutral.
+    biased = (
+        ~sarcastic
+        & (neutral > config.bias_neutral_low)
+        & (neutral < config.bias_neutral_high)
+        & (max_non_neutral > config.bias_min_non_neutral)
+    )
+    if biased.any():
+        neg, neu, pos = negative[biased], neutral[biased], positive[biased]
+        reduction = np.where(neu > config.bias_strong_neutral, config.bias_reduction_strong, config.bias_reduction)
+        major = (reduction * config.bias_major_share).astype(np.float32)
+        minor = (reduction * config.bias_minor_share).astype(np.float32)
+        neu = np.maximum(np.float32(0.0), neu - reduction.astype(np.float32))
+        # Redistribute to the stronger non-neutral class (prefer negative for toxic content)
+        negative_wins = neg > pos
+        neg = neg + np.where(negative_wins, major, minor)
+        pos = pos + np.where(negative_wins, minor, major)
+        total = neg + neu + pos
+        adjusted = np.stack([neg, neu, pos], axis=1)
+        positive_total = total > 0
+        adjusted[positive_total] /= total[positive_total, None]
+        out[biased] = adjusted
+
+    return out
+
+
+def baseline_scores(
+    probs: np.ndarray,
+    class_order: Sequence[int],
+    hits: np.ndarray,
+    config: PostProcess = DEFAULT_POSTPROCESS,
+) -> np.ndarray:
+    """Adjust an (N, C) ``predict_proba`` matrix from the baseline model.
+
+    Columns are reordered to negative, neutral, positive using ``class_order``
+    (missing classes get probability 0). Returns a float64 (N, 3) matrix. Only
+    the sarcasm lexicon of ``config`` applies; the baseline keeps its own
+    thresholds.
+    """
+    probs = np.asarray(probs, dtype=np.float64)
+    ordered = np.zeros((probs.shape[0], 3), dtype=np.float64)
+    for column, label in enumerate(class_order):
+        if int(label) in (-1, 0, 1):
+            ordered[:, int(label) + 1] = probs[:, column]
+    neg, neu, pos = ordered[:, NEGATIVE].copy(), ordered[:, NEUTRAL].copy(), ordered[:, POSITIVE].copy()
+    max_non_neutral = np.maximum(neg, pos)
+
+    # If sarcasm detected and positive is high, move mass from positive to negative.
+    sarcastic = config.score_sarcasm.detect(hits) & (pos > 0.4)
+    reduction = np.minimum(0.15, pos - 0.25)
+    pos = np.where(sarcastic, np.maximum(0.0, pos - reduction), pos)
+    neg = np.where(sarcastic, neg + reduction * 0.8, neg)
+    neu_sarcastic = neu + reduction * 0.2
+
+    # More aggressive threshold to reduce neutral bias
+    biased = ~sarcastic & (neu > 0.35) & (neu < 0.6) & (max_non_neutral > 0.25)
+    reduction = np.where(neu > 0.5, 0.08, 0.12)
+    negative_wins = neg > pos
+    neu = np.where(sarcastic, neu_sarcastic, np.where(biased, np.maximum(0.0, neu - reduction), neu))
+    neg_biased = neg + reduction * np.where(negative_wins, 0.7, 0.3)
+    pos_biased = pos + reduction * np.where(negative_wins, 0.3, 0.7)
+    neg = np.where(biased, neg_biased, neg)
+    pos = np.where(biased, pos_biased, pos)
+
+    # Renormalize
+    total = neg + neu + pos
+    out = np.stack([neg, neu, pos], axis=1)
+    positive_total = total > 0
+    out[positive_total] /= total[positive_total, None]
+    return out
+
+
+def decide(
+    scores: np.ndarray, hits: np.ndarray, config: PostProcess = DEFAULT_POSTPROCESS
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Pick a label index (0=negative, 1=neutral, 2=positive) and confidence per row."""
+    scores = np.asarray(scores, dtype=np.float64)
+    negative, neutral, positive = scores[:, NEGATIVE], scores[:, NEUTRAL], scores[:, POSITIVE]
+    max_non_neutral = np.maximum(negative, positive)
+
+    # Normal case: use the class with highest probability (first one on ties)
+    labels = np.argmax(scores, axis=1)
+    confidence = scores[np.arange(len(scores)), labels]
+
+    # If neutral is the highest but only by a small margin, prefer non-neutral
+    close_call = (
+        (neutral == scores.max(axis=1))
+        & (neutral < config.close_call_max_neutral)
+        & (max_non_neutral > config.close_call_min_non_neutral)
+        & (np.abs(neutral - max_non_neutral) < config.close_call_margin)
+    )
+    prefer_negative = (negative > positive) | (
+        (negative > config.prefer_negative_min) & (positive < config.prefer_negative_max_positive)
+    )
+    labels = np.where(close_call, np.where(prefer_negative, NEGATIVE, POSITIVE), labels)
+    confidence = np.where(close_call, np.where(prefer_negative, negative, positive), confidence)
+
+    # If sarcasm detected and positive is high, classify as negative
+    sarcastic = config.decision_sarcasm.detect(hits) & (positive > config.decision_sarcasm_min_positive)
+    labels = np.where(sarcastic, NEGATIVE, labels)
+    confidence = np.where(
+        sarcastic,
+        np.where(
+            negative > config.decision_sarcasm_keep_negative,
+            negative,
+            np.maximum(negative, config.decision_sarcasm_min_confidence),
+        ),
+        confidence,
+    )
+    return labels, confidence
+
+
+CASCADE_GATES = ("confidence", "margin")
+
+
+def gate_values(scores: np.ndarray, gate: str = "confidence") -> np.ndarray:
+    """Certainty of each row for the cascade: top score, or top minus runner-up."""
+    scores = np.asarray(scores, dtype=np.float64)
+    if gate == "confidence":
+        return scores.max(axis=1)
+    if gate == "margin":
+        top_two = np.sort(scores, axis=1)[:, -2:]
+        return top_two[:, 1] - top_two[:, 0]
+    raise ValueError(f"Unknown cascade gate {gate!r}; expected one of {CASCADE_GATES}.")
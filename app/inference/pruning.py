@@ -0,0 +1,88 @@
+"""
+Attention-head pruning for BERT classifiers.
+
+Head-pruned variants (see `app.inference.variants`) store smaller attention
+matrices than their `config.json` implies; `config.pruned_heads` records which
+heads were removed. A model built from such a config has to be pruned the
+same way before the saved weights fit into it. transformers 4.x does this
+itself while building the model (`init_weights` prunes `config.pruned_heads`),
+5.x does not, so `prune_to_config` checks each layer's shape and only prunes
+layers that still have all their heads. The functions here work on skeletons
+whose parameters live on the meta device, so a variant can be rebuilt before
+its weights are loaded.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Sequence
+
+import torch
+
+
+def encoder_layers(model: torch.nn.Module) -> torch.nn.ModuleList:
+    return model.base_model.encoder.layer
+
+
+def configured_pruned_heads(config) -> Dict[int, List[int]]:
+    """``config.pruned_heads`` with integer layer keys (JSON stores them as strings)."""
+    pruned = getattr(config, "pruned_heads", None) or {}
+    return {int(layer): sorted(int(head) for head in heads) for layer, heads in pruned.items()}
+
+
+def _select_linear(linear: torch.nn.Linear, index: torch.Tensor, dim: int) -> torch.nn.Linear:
+    """Copy of ``linear`` keeping only output rows (``dim=0``) or input columns (``dim=1``)."""
+    weight = linear.weight.index_select(dim, index).detach().clone()
+    bias = linear.bias
+    if bias is not None:
+        bias = (bias.index_select(0, index) if dim == 0 else bias).detach().clone()
+    selected = torch.nn.Linear(
+        weight.shape[1], weight.shape[0], bias=bias is not None, device=weight.device, dtype=weight.dtype
+    )
+    selected.weight = torch.nn.Parameter(weight, requires_grad=linear.weight.requires_grad)
+    if bias is not None:
+        selected.bias = torch.nn.Parameter(bias, requires_grad=linear.bias.requires_grad)
+    return selected
+
+
+def prune_heads(model: torch.nn.Module, heads: Dict[int, Sequence[int]]) -> None:
+    """Remove attention ``heads`` ({layer: [head, ...]}) from ``model`` in place.
+
+    Head indices refer to the layer's original, unpruned heads.
+    """
+    layers = encoder_layers(model)
+    for layer_index, pruned in heads.items():
+        attention = layers[layer_index].attention
+        self_attention = attention.self
+        size = self_attention.attention_head_size
+        keep = [head for head in range(self_attention.num_attention_heads) if head not in set(pruned)]
+        if not keep:
+            raise ValueError(f"Cannot prune every attention head of layer {layer_index}.")
+        index = torch.cat([torch.arange(head * size, (head + 1) * size) for head in keep])
+        for name in ("query", "key", "value"):
+            setattr(self_attention, name, _select_linear(getattr(self_attention, name), index, dim=0))
+        attention.output.dense = _select_linear(attention.output.dense, index, dim=1)
+        self_attention.num_attention_heads = len(keep)
+        self_attention.all_head_size = len(keep) * size
+
+
+def attention_heads(layer: torch.nn.Module) -> int:
+    """Heads ``layer`` actually has, judged by the shape of its query projection."""
+    self_attention = layer.attention.self
+    return self_attention.query.out_features // self_attention.attention_head_size
+
+
+def prune_to_config(model: torch.nn.Module) -> None:
+    """Prune ``model`` to its ``config.pruned_heads``, skipping layers that already are."""
+    total = model.config.num_attention_heads
+    layers = encoder_layers(model)
+    pending: Dict[int, List[int]] = {}
+    for layer_index, heads in configured_pruned_heads(model.config).items():
+        present = attention_heads(layers[layer_index])
+        if present == total:
+            pending[layer_index] = heads
+        elif present != total - len(heads):
+            raise ValueError(
+                f"Layer {layer_index} has {present} attention heads; config.pruned_heads expects {total - len(heads)}."
+            )
+    if pending:
+        prune_heads(model, pending)
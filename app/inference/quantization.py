@@ -0,0 +1,193 @@
+"""
+INT8 dynamic quantization of the fine-tuned BERT checkpoint.
+
+Dynamic quantization stores the weights of every `torch.nn.Linear` layer as
+INT8 and quantizes activations on the fly, which is the usual 2-3x CPU speedup
+for BERT-base. The analyzer enables it with `TWEET_QUANTIZATION=dynamic`
+(or `TweetAnalyzer(quantization="dynamic")`).
+
+Usage:
+    # Write checkpoints/bert-base/best/pytorch_model_quantized.bin
+    python -m app.inference.quantization export
+
+    # Compare float vs INT8 latency, memory and macro-F1
+    python -m app.inference.quantization report
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import torch
+from transformers import AutoConfig, AutoModelForSequenceClassification
+
+from app.inference.memory import current_rss_mb
+from app.inference.pruning import prune_to_config
+from app.inference.weights import load_pretrained_model
+
+_PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+GROUND_TRUTH_PATH = _PROJECT_ROOT / "Final_Project_Deliverables" / "ground_truth_test_set.csv"
+REPORT_DIR = _PROJECT_ROOT / "exports"
+QUANTIZED_WEIGHTS_NAME = "pytorch_model_quantized.bin"
+
+
+def quantize_model(model: torch.nn.Module) -> torch.nn.Module:
+    """Return an eval-mode copy of ``model`` with INT8 dynamic-quantized Linear layers."""
+    model.eval()
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_quantized_model(checkpoint_dir: Path, weights_path: Path) -> torch.nn.Module:
+    """Load a state dict saved from a dynamic-quantized model.
+
+    The float architecture is built from ``config.json`` and quantized first so
+    that its modules expect the packed INT8 parameters stored in the file.
+    """
+    config = AutoConfig.from_pretrained(checkpoint_dir)
+    model = AutoModelForSequenceClassification.from_config(config)
+    # Head-pruned variants were saved with smaller attention matrices
+    prune_to_config(model)
+    model = quantize_model(model)
+    state = torch.load(weights_path, map_location="cpu")
+    model.load_state_dict(state, strict=True)
+    model.eval()
+    return model
+
+
+def export_quantized(checkpoint_dir: Path, output_path: Optional[Path] = None) -> Path:
+    """Quantize the float checkpoint in ``checkpoint_dir`` and save its state dict."""
+    output_path = output_path or checkpoint_dir / QUANTIZED_WEIGHTS_NAME
+    model = load_pretrained_model(checkpoint_dir)
+    torch.save(quantize_model(model).state_dict(), output_path)
+    return output_path
+
+
+def model_size_mb(model: torch.nn.Module) -> float:
+    """Serialized size of the model's state dict in megabytes."""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / (1024 * 1024)
+
+
+def _macro_f1(labels: np.ndarray, predictions: np.ndarray) -> float:
+    from sklearn.metrics import f1_score
+    return float(f1_score(labels, predictions, labels=[-1, 0, 1], average="macro", zero_division=0))
+
+
+def evaluate_mode(
+    mode: str,
+    texts: Sequence[str],
+    labels: np.ndarray,
+    latency_samples: int = 200,
+    batch_size: int = 32,
+) -> Dict:
+    """Load the analyzer in ``mode`` and measure load cost, latency and accuracy."""
+    from app.inference.predictor import LABEL_MAP, TweetAnalyzer
+
+    rss_before = current_rss_mb()
+    started = time.perf_counter()
+    analyzer = TweetAnalyzer(quantization=mode, cache_max_entries=0, near_dup_max_entries=0)
+    load_seconds = time.perf_counter() - started
+    if analyzer.transformer_model is None:
+        raise RuntimeError(f"BERT could not be loaded in {mode!r} mode; nothing to compare.")
+    rss_after = current_rss_mb()
+
+    # Warm up kernels before timing
+    analyzer.analyze_batch(list(texts[:batch_size]), batch_size=batch_size)
+    single_latencies: List[float] = []
+    for text in texts[:latency_samples]:
+        tick = time.perf_counter()
+        analyzer.analyze(text)
+        single_latencies.append((time.perf_counter() - tick) * 1000)
+
+    tick = time.perf_counter()
+    results = analyzer.analyze_batch(list(texts), batch_size=batch_size)
+    batch_seconds = time.perf_counter() - tick
+
+    label_ids = {name: label for label, name in LABEL_MAP.items()}
+    predictions = np.array([label_ids[result.sentiment_label] for result in results])
+    return {
+        "mode": mode,
+        "load_seconds": load_seconds,
+        "model_size_mb": model_size_mb(analyzer.transformer_model),
+        "rss_increase_mb": rss_after - rss_before,
+        "single_p50_ms": float(np.percentile(single_latencies, 50)),
+        "single_p95_ms": float(np.percentile(single_latencies, 95)),
+        "batch_size": batch_size,
+        "batch_tweets_per_sec": len(texts) / batch_seconds,
+        "accuracy": float(np.mean(predictions == labels)),
+        "f1_macro": _macro_f1(labels, predictions),
+        "predictions": predictions,
+    }
+
+
+def build_report(
+    dataset_path: Path = GROUND_TRUTH_PATH,
+    limit: Optional[int] = None,
+    latency_samples: int = 200,
+    batch_size: int = 32,
+) -> pd.DataFrame:
+    """Evaluate float and INT8 modes on ``dataset_path`` and return one row per mode."""
+    df = pd.read_csv(dataset_path).dropna(subset=["review", "label"])
+    df = df[df["review"].astype(str).str.strip().str.len() > 0]
+    if limit is not None:
+        df = df.head(limit)
+    texts = df["review"].astype(str).tolist()
+    labels = df["label"].astype(int).to_numpy()
+
+    rows = [evaluate_mode(mode, texts, labels, latency_samples, batch_size) for mode in ("none", "dynamic")]
+    baseline_predictions = rows[0]["predictions"]
+    for row in rows:
+        row["agreement_with_float"] = float(np.mean(row.pop("predictions") == baseline_predictions))
+    report = pd.DataFrame(rows)
+    report["speedup_vs_float"] = report["batch_tweets_per_sec"] / report.loc[0, "batch_tweets_per_sec"]
+    report["f1_delta_vs_float"] = report["f1_macro"] - report.loc[0, "f1_macro"]
+    return report
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    from app.inference.predictor import CHECKPOINT_DIR
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Write a dynamic-quantized state dict")
+    export_parser.add_argument("--checkpoint", type=Path, default=CHECKPOINT_DIR)
+    export_parser.add_argument("--output", type=Path, default=None)
+
+    report_parser = subparsers.add_parser("report", help="Compare float and INT8 inference")
+    report_parser.add_argument("--dataset", type=Path, default=GROUND_TRUTH_PATH)
+    report_parser.add_argument("--limit", type=int, default=None, help="Only use the first N rows")
+    report_parser.add_argument("--latency-samples", type=int, default=200)
+    report_parser.add_argument("--batch-size", type=int, default=32)
+    report_parser.add_argument("--output-dir", type=Path, default=REPORT_DIR)
+
+    args = parser.parse_args(argv)
+    if args.command == "export":
+        path = export_quantized(args.checkpoint, args.output)
+        print(f"Saved quantized weights to {path} ({path.stat().st_size / (1024 * 1024):.2f} MB)")
+        return
+
+    report = build_report(args.dataset, args.limit, args.latency_samples, args.batch_size)
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    csv_path = args.output_dir / "quantization_report.csv"
+    json_path = args.output_dir / "quantization_report.json"
+    report.to_csv(csv_path, index=False)
+    json_path.write_text(json.dumps(
+        {"dataset": str(args.dataset), "torch": torch.__version__, "results": report.to_dict(orient="records")},
+        indent=2,
+    ))
+    print(report.to_string(index=False))
+    print(f"\nSaved {csv_path} and {json_path}")
+
+
+if __name__ == "__main__":
+    main()
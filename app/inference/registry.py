@@ -0,0 +1,261 @@
+"""
+Versioned registry of servable model artifacts.
+
+A version bundles a transformer checkpoint directory and/or the baseline
+artifacts: the two joblib files. (The compiled baseline arrays are a build
+output keyed on those files' hashes and are compiled on first load, so they
+are not part of a version.) Registering copies
+them into `models/registry/versions/<version>/`, so a version never changes
+after the fact, even when the originals are retrained or overwritten. Each
+version records the SHA-256 of every file and a content hash over all of
+them. Registering identical content twice returns the existing version.
+
+`registry.json` lists the versions and marks one as active. The API loads the
+active version at startup and can switch to another one without a restart
+(`POST /admin/models/activate`). Without an active version the analyzer uses
+the default checkpoint and `models/` as before.
+
+Usage:
+    # Snapshot the current checkpoint and baseline as a new version
+    python -m app.inference.registry register --name bert-2024-06 --note "retrained on June data"
+
+    # A baseline-only version, or a smaller variant as the transformer
+    python -m app.inference.registry register --no-transformer
+    python -m app.inference.registry register --checkpoint checkpoints/bert-base/variants/L6-ft
+
+    python -m app.inference.registry list
+    python -m app.inference.registry verify bert-2024-06
+
+    # Make a version active for the next start (running servers: use the admin endpoint)
+    python -m app.inference.registry activate bert-2024-06
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from app.inference.compiled_baseline import sha256_file
+from app.inference.predictor import (
+    BASELINE_MODEL_PATH,
+    BASELINE_VECTORIZER_PATH,
+    CHECKPOINT_DIR,
+    MODELS_DIR,
+)
+
+REGISTRY_DIR = Path(os.environ.get("TWEET_MODEL_REGISTRY", MODELS_DIR / "registry"))
+INDEX_NAME = "registry.json"
+# Sub-directories of a version, next to its version.json
+TRANSFORMER_DIRNAME = "transformer"
+BASELINE_DIRNAME = "baseline"
+BASELINE_NAMES = (BASELINE_MODEL_PATH.name, BASELINE_VECTORIZER_PATH.name)
+# Training state that a checkpoint directory may contain but serving never reads
+SKIPPED_CHECKPOINT_FILES = {"training_args.bin", "optimizer.pt", "scheduler.pt", "rng_state.pth"}
+
+
+class RegistryError(ValueError):
+    """Unknown version, empty or corrupted version, or invalid registry operation."""
+
+
+def _index_path(registry_dir: Path) -> Path:
+    return registry_dir / INDEX_NAME
+
+
+def load_index(registry_dir: Path = REGISTRY_DIR) -> Dict:
+    path = _index_path(registry_dir)
+    if not path.exists():
+        return {"active": None, "versions": {}}
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def _write_index(index: Dict, registry_dir: Path) -> None:
+    registry_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = _index_path(registry_dir).with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        json.dump(index, handle, indent=2)
+    os.replace(tmp_path, _index_path(registry_dir))
+
+
+def _collect(checkpoint_dir: Optional[Path], baseline_dir: Optional[Path]) -> Dict[str, Path]:
+    """Files making up a version, keyed by their path inside the version directory."""
+    files: Dict[str, Path] = {}
+    if checkpoint_dir is not None:
+        if not (checkpoint_dir / "config.json").exists():
+            raise RegistryError(f"{checkpoint_dir} is not a transformer checkpoint (no config.json).")
+        for path in sorted(checkpoint_dir.iterdir()):
+            if path.is_file() and path.name not in SKIPPED_CHECKPOINT_FILES:
+                files[f"{TRANSFORMER_DIRNAME}/{path.name}"] = path
+    if baseline_dir is not None:
+        for name in BASELINE_NAMES:
+            path = baseline_dir / name
+            candidates = sorted(path.rglob("*")) if path.is_dir() else [path]
+            for candidate in candidates:
+                if candidate.is_file():
+                    files[f"{BASELINE_DIRNAME}/{candidate.relative_to(baseline_dir).as_posix()}"] = candidate
+        if not any(name.startswith(f"{BASELINE_DIRNAME}/") for name in files):
+            raise RegistryError(f"No baseline artifacts found in {baseline_dir}.")
+    if not files:
+        raise RegistryError("A version needs a transformer checkpoint, baseline artifacts or both.")
+    return files
+
+
+def content_hash(file_hashes: Dict[str, str]) -> str:
+    """SHA-256 over the sorted (relative path, file SHA-256) pairs."""
+    digest = hashlib.sha256()
+    for name in sorted(file_hashes):
+        digest.update(f"{name}\0{file_hashes[name]}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def register(
+    checkpoint_dir: Optional[Path] = CHECKPOINT_DIR,
+    baseline_dir: Optional[Path] = MODELS_DIR,
+    name: Optional[str] = None,
+    note: str = "",
+    registry_dir: Path = REGISTRY_DIR,
+) -> Dict:
+    """Copy the artifacts into a new immutable version and return its entry."""
+    files = _collect(checkpoint_dir, baseline_dir)
+    file_hashes = {relative: sha256_file(path) for relative, path in files.items()}
+    digest = content_hash(file_hashes)
+    index = load_index(registry_dir)
+    for entry in index["versions"].values():
+        if entry["content_hash"] == digest:
+            print(f"Identical content is already registered as {entry['version']}.")
+            return entry
+
+    version = name or f"v{len(index['versions']) + 1}-{digest[:8]}"
+    if version in index["versions"] or not re.fullmatch(r"[A-Za-z0-9][A-Za-z0-9._-]*", version):
+        raise RegistryError(f"Version name {version!r} is taken or not a plain name.")
+    entry = {
+        "version": version,
+        "content_hash": digest,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "note": note,
+        "has_transformer": checkpoint_dir is not None,
+        "has_baseline": baseline_dir is not None,
+        "sources": {
+            "transformer": str(checkpoint_dir) if checkpoint_dir is not None else None,
+            "baseline": str(baseline_dir) if baseline_dir is not None else None,
+        },
+        "files": file_hashes,
+        "size_mb": sum(path.stat().st_size for path in files.values()) / (1024 * 1024),
+    }
+
+    version_dir = registry_dir / "versions" / version
+    # Copied beside the final directory and renamed, so a crash leaves no half version
+    tmp_dir = version_dir.with_name(f".{version}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    for relative, path in files.items():
+        target = tmp_dir / relative
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(path, target)
+    (tmp_dir / "version.json").write_text(json.dumps(entry, indent=2))
+    os.replace(tmp_dir, version_dir)
+
+    index["versions"][version] = {key: value for key, value in entry.items() if key != "files"}
+    _write_index(index, registry_dir)
+    return entry
+
+
+def get_version(version: str, registry_dir: Path = REGISTRY_DIR) -> Dict:
+    version_dir = registry_dir / "versions" / version
+    if version not in load_index(registry_dir)["versions"] or not (version_dir / "version.json").exists():
+        raise RegistryError(f"Unknown model version {version!r}.")
+    return json.loads((version_dir / "version.json").read_text())
+
+
+def verify(version: str, registry_dir: Path = REGISTRY_DIR) -> None:
+    """Raise `RegistryError` unless every file of ``version`` still has its recorded hash."""
+    entry = get_version(version, registry_dir)
+    version_dir = registry_dir / "versions" / version
+    for relative, expected in entry["files"].items():
+        path = version_dir / relative
+        if not path.exists() or sha256_file(path) != expected:
+            raise RegistryError(f"Version {version!r} is corrupted: {relative} does not match its hash.")
+
+
+def analyzer_kwargs(version: str, registry_dir: Path = REGISTRY_DIR) -> Dict:
+    """`TweetAnalyzer` keyword arguments that serve ``version``."""
+    entry = get_version(version, registry_dir)
+    version_dir = registry_dir / "versions" / version
+    return {
+        # A missing transformer directory makes the analyzer serve the baseline
+        "checkpoint_dir": version_dir / TRANSFORMER_DIRNAME,
+        "baseline_dir": version_dir / BASELINE_DIRNAME,
+        "model": None if entry["has_transformer"] else "baseline",
+    }
+
+
+def active_version(registry_dir: Path = REGISTRY_DIR) -> Optional[str]:
+    return load_index(registry_dir).get("active")
+
+
+def set_active(version: str, registry_dir: Path = REGISTRY_DIR) -> None:
+    get_version(version, registry_dir)
+    index = load_index(registry_dir)
+    index["active"] = version
+    _write_index(index, registry_dir)
+
+
+def list_versions(registry_dir: Path = REGISTRY_DIR) -> List[Dict]:
+    return sorted(load_index(registry_dir)["versions"].values(), key=lambda entry: entry["created"])
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    register_parser = subparsers.add_parser("register", help="Snapshot a checkpoint and/or baseline as a version")
+    register_parser.add_argument("--checkpoint", type=Path, default=CHECKPOINT_DIR)
+    register_parser.add_argument("--baseline-dir", type=Path, default=MODELS_DIR)
+    register_parser.add_argument("--transformer", action=argparse.BooleanOptionalAction, default=True,
+                                 help="Include the transformer checkpoint")
+    register_parser.add_argument("--baseline", action=argparse.BooleanOptionalAction, default=True,
+                                 help="Include the baseline artifacts")
+    register_parser.add_argument("--name", default=None, help="Version name (default: v<N>-<hash prefix>)")
+    register_parser.add_argument("--note", default="")
+
+    subparsers.add_parser("list", help="Show registered versions")
+    for command, help_text in (("verify", "Re-hash a version's files"), ("activate", "Serve a version on next start")):
+        subparsers.add_parser(command, help=help_text).add_argument("version")
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == "register":
+            entry = register(
+                args.checkpoint if args.transformer else None,
+                args.baseline_dir if args.baseline else None,
+                args.name,
+                args.note,
+            )
+            print(f"Version {entry['version']} ({entry['content_hash'][:12]}, {entry['size_mb']:.1f} MB)")
+        elif args.command == "list":
+            active = active_version()
+            for entry in list_versions():
+                parts = [name for name in ("transformer", "baseline") if entry[f"has_{name}"]]
+                marker = "*" if entry["version"] == active else " "
+                print(
+                    f"{marker} {entry['version']:<24} {entry['content_hash'][:12]}  {entry['created']}  "
+                    f"{'+'.join(parts):<20} {entry['size_mb']:8.1f} MB  {entry['note']}"
+                )
+        elif args.command == "verify":
+            verify(args.version)
+            print(f"{args.version}: all files match their recorded hashes")
+        else:
+            set_active(args.version)
+            print(f"{args.version} is now the active version; running servers switch via /admin/models/activate")
+    except RegistryError as exc:
+        raise SystemExit(str(exc))
+
+
+if __name__ == "__main__":
+    main()
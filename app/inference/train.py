@@ -0,0 +1,367 @@
+"""
+Fine-tune BERT on the training split on CPU, writing checkpoints the analyzer loads.
+
+Examples come pre-tokenized from the dataset cache (`app.inference.dataset_cache`,
+built on first use). Training does not pad every tweet to 128 tokens as the
+notebooks did:
+
+- Batches are length-grouped. Each epoch is shuffled, cut into megabatches of
+  `--batch-size` x 50 tweets, and each megabatch is sorted by token count
+  before it is split into batches.
+- Each batch is padded only to its own longest tweet.
+
+The log reports the share of real tokens, which is usually above 90%.
+`--grad-accum` accumulates several batches per optimizer step. The loss is
+averaged over every tweet of the step, so the update equals one batch of
+`--batch-size` x `--grad-accum`.
+
+Every `--save-every` steps the run writes a checkpoint to
+`<output>/checkpoints/step-<n>/` and scores the val split. A checkpoint holds:
+
+- `model.safetensors` and `config.json`
+- `training_state.safetensors`: AdamW moments and the torch RNG state
+- `trainer_state.json`: step, epoch, position in the epoch, schedule, history
+  and the run settings (batch size, grad-accum, epochs, max steps, seed, ...)
+
+`--resume` continues from the latest checkpoint exactly where it stopped. It
+refuses to start when the command line settings differ from the stored ones,
+since the resumed run would no longer match an uninterrupted one. Only the
+newest `--keep-checkpoints` are kept. The model with the best val macro-F1
+so far is also written to `<output>/` itself, with safetensors weights,
+tokenizer files and `training.json`. That makes `<output>` a checkpoint
+directory for `TWEET_CHECKPOINT_DIR`, `TweetAnalyzer(checkpoint_dir=...)` or
+`python -m app.inference.registry register`. Val scores use the raw argmax.
+The served labels also pass through the post-processing rules.
+
+`--small` trains a randomly initialized 2-layer, 128-wide BERT with the same
+tokenizer. It takes a few minutes on a laptop CPU and is meant for testing
+the pipeline, not for serving.
+
+Usage:
+    python -m app.inference.train --init bert-base-uncased --output checkpoints/bert-base/retrained
+    python -m app.inference.train --output checkpoints/bert-base/retrained --resume
+    python -m app.inference.train --small --epochs 1 --max-steps 200 --output /tmp/tweet-small
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import torch
+from safetensors.torch import load_file, save_file
+from transformers import AutoModelForSequenceClassification, BertConfig, BertForSequenceClassification
+
+from app.inference import dataset_cache
+from app.inference.evaluate import label_metrics
+from app.inference.predictor import CHECKPOINT_DIR, SENTIMENT_LABELS, TOKENIZER_FILES, TRANSFORMER_MAX_LENGTH
+
+STATE_DIR_NAME = "checkpoints"
+TRAINER_STATE_NAME = "trainer_state.json"
+TRAINING_STATE_NAME = "training_state.safetensors"
+TRAINING_INFO_NAME = "training.json"
+# Tweets per megabatch, in batches; larger groups pad less but shuffle less
+MEGABATCH_FACTOR = 50
+# Defaults follow the best random-search trial in tuning/random_trials.csv
+DEFAULTS = {"learning_rate": 3.5e-5, "batch_size": 16, "weight_decay": 0.018, "epochs": 2}
+SMALL_CONFIG = {"hidden_size": 128, "num_hidden_layers": 2, "num_attention_heads": 2, "intermediate_size": 512}
+
+
+def length_grouped_batches(lengths: np.ndarray, batch_size: int, seed: int, epoch: int) -> List[np.ndarray]:
+    """Batches of positions into ``lengths`` holding tweets of similar length, in random order.
+
+    Deterministic in ``(seed, epoch)``, so a resumed run sees the same batches.
+    """
+    rng = np.random.default_rng([seed, epoch])
+    order = rng.permutation(len(lengths))
+    batches: List[np.ndarray] = []
+    megabatch = batch_size * MEGABATCH_FACTOR
+    for start in range(0, len(order), megabatch):
+        group = order[start:start + megabatch]
+        group = group[np.argsort(-lengths[group], kind="stable")]
+        batches += [group[offset:offset + batch_size] for offset in range(0, len(group), batch_size)]
+    return [batches[index] for index in rng.permutation(len(batches))]
+
+
+def linear_schedule(total_steps: int, warmup_steps: int):
+    """Linear warmup to the base learning rate, then linear decay to zero."""
+    def factor(step: int) -> float:
+        if step < warmup_steps:
+            return (step + 1) / warmup_steps
+        return max(0.0, (total_steps - step) / max(1, total_steps - warmup_steps))
+    return factor
+
+
+def build_model(init: Optional[str], small: bool, vocab_size: int, pad_token_id: int) -> torch.nn.Module:
+    if small:
+        config = BertConfig(
+            vocab_size=vocab_size, pad_token_id=pad_token_id, num_labels=len(SENTIMENT_LABELS), **SMALL_CONFIG
+        )
+        return BertForSequenceClassification(config)
+    return AutoModelForSequenceClassification.from_pretrained(init, num_labels=len(SENTIMENT_LABELS))
+
+
+def _tensors(arrays: Dict[str, np.ndarray]) -> Dict[str, torch.Tensor]:
+    return {name: torch.from_numpy(values) for name, values in arrays.items()}
+
+
+def evaluate_split(model: torch.nn.Module, cache: dataset_cache.DatasetCache, rows: np.ndarray,
+                   batch_size: int = 64) -> Dict[str, float]:
+    """Raw-argmax metrics of ``model`` on ``rows`` of the cache."""
+    predictions = np.empty(len(rows), dtype=np.int64)
+    model.eval()
+    with torch.inference_mode():
+        for bucket, arrays in cache.iter_length_buckets(rows, batch_size):
+            predictions[bucket] = model(**_tensors(arrays)).logits.argmax(dim=-1).numpy()
+    model.train()
+    # Logit indices 0/1/2 are the dataset labels -1/0/1
+    return label_metrics(np.asarray(cache.labels[rows], dtype=np.int64), predictions - 1)
+
+
+def save_checkpoint(directory: Path, model: torch.nn.Module, optimizer: torch.optim.Optimizer,
+                    scheduler, state: Dict) -> None:
+    """Write a resumable checkpoint; the directory only appears once complete."""
+    tmp_dir = directory.with_name(f".{directory.name}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    model.save_pretrained(tmp_dir, safe_serialization=True)
+    optimizer_state = optimizer.state_dict()
+    tensors = {"rng.torch": torch.get_rng_state()}
+    for index, values in optimizer_state["state"].items():
+        for name, value in values.items():
+            tensors[f"optimizer.{index}.{name}"] = value.detach().contiguous()
+    save_file(tensors, tmp_dir / TRAINING_STATE_NAME)
+    payload = {
+        **state,
+        "optimizer_param_groups": optimizer_state["param_groups"],
+        "scheduler": scheduler.state_dict(),
+    }
+    (tmp_dir / TRAINER_STATE_NAME).write_text(json.dumps(payload, indent=2))
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_dir, directory)
+
+
+def latest_checkpoint(output_dir: Path) -> Optional[Path]:
+    state_dir = output_dir / STATE_DIR_NAME
+    if not state_dir.exists():
+        return None
+    complete = [path for path in state_dir.glob("step-*") if (path / TRAINER_STATE_NAME).exists()]
+    return max(complete, key=lambda path: int(path.name.split("-")[1]), default=None)
+
+
+def check_resume_settings(directory: Path, settings: Dict) -> None:
+    """Raise ValueError unless ``directory`` was written by a run with the same ``settings``."""
+    stored = json.loads((directory / TRAINER_STATE_NAME).read_text()).get("settings")
+    if stored is None:
+        raise ValueError(f"{directory} records no run settings; it cannot be resumed exactly.")
+    changed = [
+        f"{name}: {stored.get(name)!r} -> {value!r}" for name, value in settings.items() if stored.get(name) != value
+    ]
+    if changed:
+        raise ValueError(f"Cannot resume from {directory}; settings differ ({', '.join(changed)}).")
+
+
+def load_checkpoint(directory: Path, optimizer: torch.optim.Optimizer, scheduler) -> Dict:
+    """Restore optimizer, schedule and RNG from ``directory``; returns the trainer state."""
+    payload = json.loads((directory / TRAINER_STATE_NAME).read_text())
+    tensors = load_file(directory / TRAINING_STATE_NAME)
+    optimizer_state: Dict[int, Dict[str, torch.Tensor]] = {}
+    for key, value in tensors.items():
+        if key.startswith("optimizer."):
+            _, index, name = key.split(".", 2)
+            optimizer_state.setdefault(int(index), {})[name] = value
+    optimizer.load_state_dict({"state": optimizer_state, "param_groups": payload.pop("optimizer_param_groups")})
+    scheduler.load_state_dict(payload.pop("scheduler"))
+    torch.set_rng_state(tensors["rng.torch"])
+    return payload
+
+
+def prune_checkpoints(output_dir: Path, keep: int) -> None:
+    state_dir = output_dir / STATE_DIR_NAME
+    steps = sorted(state_dir.glob("step-*"), key=lambda path: int(path.name.split("-")[1]))
+    for path in steps[:-keep] if keep > 0 else []:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def export_model(output_dir: Path, model: torch.nn.Module, tokenizer_dir: Path, info: Dict) -> None:
+    """Write ``model`` as a loadable checkpoint into ``output_dir``, replacing its files one by one."""
+    tmp_dir = output_dir / ".export.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    model.save_pretrained(tmp_dir, safe_serialization=True)
+    for name in TOKENIZER_FILES:
+        if (tokenizer_dir / name).exists():
+            shutil.copy2(tokenizer_dir / name, tmp_dir / name)
+    (tmp_dir / TRAINING_INFO_NAME).write_text(json.dumps(info, indent=2))
+    for path in tmp_dir.iterdir():
+        os.replace(path, output_dir / path.name)
+    tmp_dir.rmdir()
+    # Older float weights would otherwise be loaded ahead of, or beside, the new ones
+    for stale in ("pytorch_model.bin", "pytorch_model_quantized.bin"):
+        (output_dir / stale).unlink(missing_ok=True)
+
+
+def train(args: argparse.Namespace) -> Dict:
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(args.seed)
+    output_dir: Path = args.output
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    data_dir = dataset_cache.build_data()
+    dataset_cache.build_tokens(data_dir, args.tokenizer, args.max_length)
+    cache = dataset_cache.DatasetCache(data_dir, args.tokenizer, args.max_length)
+    train_rows, val_rows = cache.split_rows("train"), cache.split_rows("val")
+    if args.limit is not None:
+        train_rows = train_rows[:args.limit]
+    lengths = np.asarray(cache.lengths[train_rows])
+    targets = torch.as_tensor(np.asarray(cache.labels[train_rows], dtype=np.int64) + 1)
+
+    batches_per_epoch = math.ceil(len(train_rows) / args.batch_size)
+    steps_per_epoch = math.ceil(batches_per_epoch / args.grad_accum)
+    total_steps = min(steps_per_epoch * args.epochs, args.max_steps or math.inf)
+    # Everything that shapes the batches, schedule or updates; a resume must match it
+    settings = {
+        "init": "small" if args.small else args.init,
+        "tokenizer": str(args.tokenizer),
+        "max_length": args.max_length,
+        "batch_size": args.batch_size,
+        "grad_accum": args.grad_accum,
+        "learning_rate": args.learning_rate,
+        "weight_decay": args.weight_decay,
+        "warmup_ratio": args.warmup_ratio,
+        "epochs": args.epochs,
+        "max_steps": args.max_steps,
+        "total_steps": total_steps,
+        "seed": args.seed,
+        "train_tweets": len(train_rows),
+    }
+
+    resume_dir = latest_checkpoint(output_dir) if args.resume else None
+    if resume_dir is not None:
+        check_resume_settings(resume_dir, settings)
+        print(f"Resuming from {resume_dir}")
+        model = AutoModelForSequenceClassification.from_pretrained(resume_dir)
+    else:
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(args.tokenizer, use_fast=True)
+        model = build_model(args.init, args.small, len(tokenizer), cache.tokens_meta["pad_token_id"])
+    model.train()
+
+    optimizer = torch.optim.AdamW(model.parameters(), lr=args.learning_rate, weight_decay=args.weight_decay)
+    scheduler = torch.optim.lr_scheduler.LambdaLR(
+        optimizer, linear_schedule(total_steps, max(1, int(total_steps * args.warmup_ratio)))
+    )
+    state = {
+        "step": 0, "epoch": 0, "batch": 0, "best_f1": -1.0, "history": [], "seconds": 0.0, "settings": settings,
+    }
+    if resume_dir is not None:
+        state = load_checkpoint(resume_dir, optimizer, scheduler)
+    print(
+        f"Training on {len(train_rows)} tweets: {total_steps} steps of {args.batch_size} x {args.grad_accum} "
+        f"tweets, {sum(param.numel() for param in model.parameters()) / 1e6:.1f}M parameters"
+    )
+
+    losses: List[float] = []
+
+    def recent_loss() -> Optional[float]:
+        return float(np.mean(losses[-args.log_every:])) if losses else None
+
+    def checkpoint() -> None:
+        metrics = evaluate_split(model, cache, val_rows)
+        state["history"].append({"step": state["step"], "loss": recent_loss(), **metrics})
+        print(f"  step {state['step']}: val accuracy {metrics['accuracy']:.4f}, macro-F1 {metrics['f1_macro']:.4f}")
+        if metrics["f1_macro"] > state["best_f1"]:
+            state["best_f1"] = metrics["f1_macro"]
+            export_model(output_dir, model, args.tokenizer, {
+                **settings, "step": state["step"], "val": metrics,
+                "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            })
+            print(f"  new best; exported to {output_dir}")
+        save_checkpoint(output_dir / STATE_DIR_NAME / f"step-{state['step']:06d}", model, optimizer, scheduler, state)
+        prune_checkpoints(output_dir, args.keep_checkpoints)
+
+    real_tokens = padded_tokens = 0
+    started = time.perf_counter() - state["seconds"]
+    tick, tick_tokens = time.perf_counter(), 0
+    while state["step"] < total_steps and state["epoch"] < args.epochs:
+        batches = length_grouped_batches(lengths, args.batch_size, args.seed, state["epoch"])
+        while state["batch"] < len(batches) and state["step"] < total_steps:
+            group = batches[state["batch"]:state["batch"] + args.grad_accum]
+            tweets = sum(len(batch) for batch in group)
+            optimizer.zero_grad(set_to_none=True)
+            step_loss = 0.0
+            for batch in group:
+                arrays = cache.pad(train_rows[batch])
+                real_tokens += int(lengths[batch].sum())
+                padded_tokens += arrays["input_ids"].size
+                logits = model(**_tensors(arrays)).logits
+                # Summed and divided by the step's tweets: the mean over the whole accumulated step
+                loss = torch.nn.functional.cross_entropy(logits, targets[batch], reduction="sum") / tweets
+                loss.backward()
+                step_loss += loss.item()
+            torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+            optimizer.step()
+            scheduler.step()
+            losses.append(step_loss)
+            state["step"] += 1
+            state["batch"] += len(group)
+            tick_tokens += tweets
+            if state["step"] % args.log_every == 0:
+                elapsed = time.perf_counter() - tick
+                print(
+                    f"  step {state['step']}/{total_steps} (epoch {state['epoch'] + 1}): loss {recent_loss():.4f}, "
+                    f"lr {scheduler.get_last_lr()[0]:.2e}, {tick_tokens / elapsed:.1f} tweets/s, "
+                    f"{real_tokens / padded_tokens:.1%} real tokens"
+                )
+                tick, tick_tokens = time.perf_counter(), 0
+            if state["step"] % args.save_every == 0 and state["step"] < total_steps:
+                state["seconds"] = time.perf_counter() - started
+                checkpoint()
+        if state["batch"] >= len(batches):
+            state["epoch"], state["batch"] = state["epoch"] + 1, 0
+
+    state["seconds"] = time.perf_counter() - started
+    if not state["history"] or state["history"][-1]["step"] != state["step"]:
+        checkpoint()
+    print(f"Done in {state['seconds']:.0f}s; best val macro-F1 {state['best_f1']:.4f}, model in {output_dir}")
+    return state
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", type=Path, required=True, help="Checkpoint directory to write")
+    parser.add_argument("--init", default="bert-base-uncased",
+                        help="Pretrained model name or directory to start from")
+    parser.add_argument("--small", action="store_true", help="Train a tiny random BERT instead (for testing)")
+    parser.add_argument("--tokenizer", type=Path, default=CHECKPOINT_DIR, help="Directory with the tokenizer files")
+    parser.add_argument("--max-length", type=int, default=TRANSFORMER_MAX_LENGTH)
+    parser.add_argument("--batch-size", type=int, default=DEFAULTS["batch_size"])
+    parser.add_argument("--grad-accum", type=int, default=1, help="Batches per optimizer step")
+    parser.add_argument("--learning-rate", type=float, default=DEFAULTS["learning_rate"])
+    parser.add_argument("--weight-decay", type=float, default=DEFAULTS["weight_decay"])
+    parser.add_argument("--warmup-ratio", type=float, default=0.1)
+    parser.add_argument("--epochs", type=int, default=DEFAULTS["epochs"])
+    parser.add_argument("--max-steps", type=int, default=None, help="Stop after this many optimizer steps")
+    parser.add_argument("--limit", type=int, default=None, help="Only train on the first N training tweets")
+    parser.add_argument("--save-every", type=int, default=200, help="Optimizer steps between checkpoints")
+    parser.add_argument("--keep-checkpoints", type=int, default=2)
+    parser.add_argument("--log-every", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--resume", action="store_true", help="Continue from the latest checkpoint in --output")
+    args = parser.parse_args(argv)
+    if args.grad_accum < 1 or args.batch_size < 1:
+        parser.error("--batch-size and --grad-accum must be positive.")
+    train(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Train, cache and incrementally update the TF-IDF baseline.
+
+The baseline is fitted on the `train_ids.csv` rows of TwitterToxicity.csv.
+Vectorization is spread over worker processes (`app.inference.parallel_tfidf`)
+and gives the same vocabulary and IDF weights as a serial fit. The default
+estimator is an
+`SGDClassifier` with logistic loss. It fits its one-vs-rest problems on
+separate cores and supports `partial_fit`, so new labelled tweets can be
+folded in without retraining from scratch.
+
+Every trained model is cached in `models/baseline_cache/<key>/`. The key is a
+hash of the training rows (or the parent model plus the update rows) and the
+training settings, so rerunning with unchanged inputs skips fitting. The
+chosen model is then installed as `models/baseline_tfidf_*.joblib` and
+compiled under `models/baseline_compiled/`.
+
+With `TWEET_BASELINE_TRAIN_ON_DEMAND=1`, `TweetAnalyzer` calls
+`train("logreg")` on startup when no baseline files exist, so a checkout
+without `models/` still serves a baseline of the shipped kind.
+
+Usage:
+    # Train (or reuse the cached model for) the current training split
+    python -m app.inference.train_baseline train --jobs 4
+
+    # Fold newly labelled tweets (CSV/JSONL with a text column and `label`) into the model
+    python -m app.inference.train_baseline update new_labels.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.metrics import f1_score
+
+from app.inference import parallel_tfidf
+from app.inference.compiled_baseline import installed_sklearn_version, load_or_compile
+from app.inference.data import load_split
+from app.inference.predictor import (
+    BASELINE_MODEL_PATH,
+    BASELINE_VECTORIZER_PATH,
+    COMPILED_BASELINE_DIR,
+    MODELS_DIR,
+)
+
+CACHE_DIR = MODELS_DIR / "baseline_cache"
+MANIFEST_PATH = MODELS_DIR / "baseline_manifest.json"
+LABELS = (-1, 0, 1)
+
+# Settings of the baseline in the project notebook
+VECTORIZER_PARAMS = {
+    "max_features": 100000,
+    "ngram_range": (1, 3),
+    "lowercase": True,
+    "min_df": 2,
+    "max_df": 0.95,
+    "sublinear_tf": True,
+}
+# The notebook's liblinear model cannot be refitted on three classes by current
+# scikit-learn; "logreg" is the closest multinomial equivalent.
+ESTIMATORS = {
+    "sgd": {"loss": "log_loss", "alpha": 3e-5, "max_iter": 50, "tol": 1e-4, "random_state": 42},
+    "logreg": {"C": 8.0, "max_iter": 2000, "random_state": 42},
+}
+DEFAULT_ESTIMATOR = "sgd"
+
+
+def data_hash(texts: Sequence[str], labels: Sequence[int], settings: Dict) -> str:
+    """SHA-256 of the labelled rows and the training settings."""
+    digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode())
+    for text, label in zip(texts, labels):
+        digest.update(f"{int(label)}\t{text}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def make_estimator(name: str, n_jobs: Optional[int] = None):
+    if name not in ESTIMATORS:
+        raise ValueError(f"Unknown estimator {name!r}; expected one of {tuple(ESTIMATORS)}.")
+    if name == "sgd":
+        # One-vs-rest problems are fitted on separate cores
+        return SGDClassifier(n_jobs=n_jobs or os.cpu_count(), **ESTIMATORS[name])
+    return LogisticRegression(**ESTIMATORS[name])
+
+
+def _validation_f1(vectorizer, model) -> Optional[float]:
+    try:
+        texts, labels = load_split("val")
+    except FileNotFoundError:
+        return None
+    predictions = model.predict(vectorizer.transform(texts))
+    return float(f1_score(labels, predictions, labels=list(LABELS), average="macro", zero_division=0))
+
+
+def _save_entry(key: str, vectorizer, model, info: Dict) -> Path:
+    entry = CACHE_DIR / key[:16]
+    temporary = entry.with_name(entry.name + ".tmp")
+    shutil.rmtree(temporary, ignore_errors=True)
+    temporary.mkdir(parents=True)
+    joblib.dump(vectorizer, temporary / BASELINE_VECTORIZER_PATH.name)
+    joblib.dump(model, temporary / BASELINE_MODEL_PATH.name)
+    with open(temporary / "info.json", "w", encoding="utf-8") as handle:
+        json.dump({"key": key, **info}, handle, indent=2)
+    shutil.rmtree(entry, ignore_errors=True)
+    os.replace(temporary, entry)
+    return entry
+
+
+def _cached_entry(key: str) -> Optional[Path]:
+    entry = CACHE_DIR / key[:16]
+    info_path = entry / "info.json"
+    if not info_path.exists():
+        return None
+    with open(info_path, encoding="utf-8") as handle:
+        return entry if json.load(handle).get("key") == key else None
+
+
+def installed_manifest() -> Optional[Dict]:
+    if not MANIFEST_PATH.exists():
+        return None
+    with open(MANIFEST_PATH, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def install(entry: Path) -> Dict:
+    """Copy a cached model over the served joblib files and recompile it."""
+    with open(entry / "info.json", encoding="utf-8") as handle:
+        info = json.load(handle)
+    manifest = installed_manifest()
+    installed = all(path.exists() for path in (BASELINE_MODEL_PATH, BASELINE_VECTORIZER_PATH))
+    if manifest is not None and manifest.get("key") == info["key"] and installed:
+        return info
+
+    MODELS_DIR.mkdir(parents=True, exist_ok=True)
+    for target in (BASELINE_VECTORIZER_PATH, BASELINE_MODEL_PATH):
+        temporary = target.with_name(target.name + ".tmp")
+        shutil.copyfile(entry / target.name, temporary)
+        os.replace(temporary, target)
+    load_or_compile(COMPILED_BASELINE_DIR, BASELINE_MODEL_PATH, BASELINE_VECTORIZER_PATH)
+    with open(MANIFEST_PATH, "w", encoding="utf-8") as handle:
+        json.dump({**info, "installed_at": datetime.now(timezone.utc).isoformat(timespec="seconds")}, handle, indent=2)
+    return info
+
+
+def _settings(estimator: str, **extra) -> Dict:
+    return {
+        "vectorizer": {**VECTORIZER_PARAMS, "ngram_range": list(VECTORIZER_PARAMS["ngram_range"])},
+        "estimator": estimator,
+        "estimator_params": ESTIMATORS[estimator],
+        "sklearn": installed_sklearn_version(),
+        **extra,
+    }
+
+
+def train(estimator: str = DEFAULT_ESTIMATOR, n_jobs: Optional[int] = None, force: bool = False) -> Dict:
+    """Fit the baseline on the training split, or reuse the cached fit, and install it."""
+    texts, labels = load_split("train")
+    key = data_hash(texts, labels, _settings(estimator))
+    entry = None if force else _cached_entry(key)
+    if entry is not None:
+        print(f"Training data unchanged; reusing cached baseline {entry.name}")
+        return {**install(entry), "cached": True}
+
+    print(f"Training {estimator} baseline on {len(texts)} tweets...")
+    started = time.perf_counter()
+    vectorizer = TfidfVectorizer(**VECTORIZER_PARAMS)
+    features = parallel_tfidf.fit_transform(vectorizer, texts, n_jobs)
+    vectorize_seconds = time.perf_counter() - started
+    model = make_estimator(estimator, n_jobs).fit(features, labels)
+    info = {
+        "estimator": estimator,
+        "parent": None,
+        "rows": len(texts),
+        "vocabulary": len(vectorizer.vocabulary_),
+        "vectorize_seconds": vectorize_seconds,
+        "fit_seconds": time.perf_counter() - started - vectorize_seconds,
+        "val_f1_macro": _validation_f1(vectorizer, model),
+        "trained_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    return {**install(_save_entry(key, vectorizer, model, info)), "cached": False}
+
+
+def load_labelled(path: Path, text_column: Optional[str] = None) -> Tuple[List[str], np.ndarray]:
+    """Texts and -1/0/1 labels from a CSV or JSONL file with a `label` column."""
+    from app.inference.bulk_score import file_format, resolve_text_column
+
+    df = pd.read_json(path, lines=True) if file_format(path) == "jsonl" else pd.read_csv(path)
+    if "label" not in df.columns:
+        raise ValueError(f"{path} has no `label` column.")
+    column = resolve_text_column(list(df.columns), text_column)
+    df = df.dropna(subset=[column, "label"])
+    df = df[df[column].astype(str).str.strip().str.len() > 0]
+    labels = df["label"].astype(int).to_numpy()
+    unknown = sorted(set(labels) - set(LABELS))
+    if unknown:
+        raise ValueError(f"Labels must be one of {LABELS}; found {unknown}.")
+    return df[column].astype(str).tolist(), labels
+
+
+def update(path: Path, text_column: Optional[str] = None, n_jobs: Optional[int] = None) -> Dict:
+    """Fold the labelled tweets in ``path`` into the installed model with ``partial_fit``.
+
+    The vocabulary and IDF weights stay fixed, so n-grams first seen in the
+    update are ignored until the next full `train`. A file whose rows were
+    already folded into the installed model is skipped.
+    """
+    manifest = installed_manifest()
+    if manifest is None or not BASELINE_MODEL_PATH.exists():
+        raise ValueError("No trained baseline is installed; run the train command first.")
+    model = joblib.load(BASELINE_MODEL_PATH)
+    if not hasattr(model, "partial_fit"):
+        raise ValueError(f"{type(model).__name__} cannot be updated incrementally; retrain with --estimator sgd.")
+
+    texts, labels = load_labelled(path, text_column)
+    rows_hash = data_hash(texts, labels, {})
+    if rows_hash in manifest.get("updates", []):
+        print(f"{path} is already part of the installed baseline; nothing to do.")
+        return {**manifest, "cached": True}
+    key = data_hash(texts, labels, _settings(manifest["estimator"], parent=manifest["key"]))
+    entry = _cached_entry(key)
+    if entry is not None:
+        print(f"Update already applied; reusing cached baseline {entry.name}")
+        return {**install(entry), "cached": True}
+
+    vectorizer = joblib.load(BASELINE_VECTORIZER_PATH)
+    started = time.perf_counter()
+    model.partial_fit(parallel_tfidf.transform(vectorizer, texts, n_jobs), labels, classes=np.array(LABELS))
+    info = {
+        **{name: manifest.get(name) for name in ("estimator", "vocabulary")},
+        "parent": manifest["key"],
+        "rows": manifest.get("rows", 0) + len(texts),
+        "update_rows": len(texts),
+        "updates": manifest.get("updates", []) + [rows_hash],
+        "update_seconds": time.perf_counter() - started,
+        "val_f1_macro": _validation_f1(vectorizer, model),
+        "trained_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    return {**install(_save_entry(key, vectorizer, model, info)), "cached": False}
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    train_parser = subparsers.add_parser("train", help="Fit on the training split (cached by data hash)")
+    train_parser.add_argument("--estimator", choices=list(ESTIMATORS), default=DEFAULT_ESTIMATOR)
+    train_parser.add_argument("--force", action="store_true", help="Refit even when a cached model exists")
+    update_parser = subparsers.add_parser("update", help="partial_fit the installed model on new labelled tweets")
+    update_parser.add_argument("input", type=Path, help="CSV or JSONL file with a text column and `label`")
+    update_parser.add_argument("--text-column", default=None)
+    for subparser in (train_parser, update_parser):
+        subparser.add_argument("--jobs", type=int, default=None, help="Worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "train":
+            info = train(args.estimator, args.jobs, args.force)
+        else:
+            info = update(args.input, args.text_column, args.jobs)
+    except (FileNotFoundError, ValueError) as exc:
+        raise SystemExit(str(exc))
+    f1 = info.get("val_f1_macro")
+    print(
+        f"Installed {info['estimator']} baseline {info['key'][:16]} ({info['rows']} training tweets, "
+        f"{info['vocabulary']} terms); validation macro-F1 {'n/a' if f1 is None else f'{f1:.4f}'}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Replay post-processing configurations over stored BERT logits.
+
+The rules that turn BERT logits into labels (temperature, sarcasm lexicon,
+neutral-bias thresholds, close-call decision) are the fields of
+`postprocess.PostProcess`. This tool loads a logit store written by
+`python -m app.inference.logit_store compute` and applies a candidate
+configuration to the val and test splits (`val_ids.csv`, `test_ids.csv`) and
+to the ground-truth test set. Each replay is a few vectorized NumPy passes,
+so it takes milliseconds instead of another BERT run. The keyword scan is
+done once per lexicon.
+
+`fit-temperature` fits the softmax temperature by minimizing the negative
+log-likelihood of the val labels, which is standard temperature scaling. It
+reports the labelling metrics with the fitted value as well, since the
+downstream thresholds were tuned for the shipped 0.7. A configuration saved
+with `--save` is served with `TWEET_POSTPROCESS_CONFIG=<path>`.
+
+Replays use the NumPy softmax. The API uses torch's whenever BERT is loaded,
+so a score can differ in the last float32 bit, which decides a label only at
+an exact tie.
+
+Usage:
+    python -m app.inference.tuning evaluate
+    python -m app.inference.tuning evaluate --set temperature=0.9 --set close_call_margin=0.1
+    python -m app.inference.tuning sweep close_call_margin 0 0.05 0.1 0.15 0.2
+    python -m app.inference.tuning fit-temperature --save models/postprocess.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.inference import logit_store, postprocess
+from app.inference.data import SPLIT_PATHS
+from app.inference.evaluate import label_metrics
+from app.inference.postprocess import PostProcess
+from app.inference.predictor import POSTPROCESS_CONFIG, _PROJECT_ROOT
+
+REPORT_DIR = _PROJECT_ROOT / "exports"
+# Splits of the dataset store, plus the separately stored ground-truth set
+EVAL_SPLITS = ("val", "test")
+
+
+class ReplaySet:
+    """Logits, texts and -1/0/1 labels of one evaluation set, with keyword hits per lexicon."""
+
+    def __init__(self, name: str, logits: np.ndarray, texts: Sequence[str], labels: np.ndarray) -> None:
+        self.name = name
+        self.logits = np.ascontiguousarray(logits, dtype=np.float32)
+        self.texts = list(texts)
+        self.labels = labels
+        self._hits: Dict[Tuple, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def hits(self, config: PostProcess) -> np.ndarray:
+        lexicons = (config.score_sarcasm_lexicon, config.decision_sarcasm_lexicon)
+        if lexicons not in self._hits:
+            self._hits[lexicons] = postprocess.keyword_hits(self.texts, config)
+        return self._hits[lexicons]
+
+    def predict(self, config: PostProcess) -> np.ndarray:
+        """Labels (-1/0/1) the analyzer would return under ``config``."""
+        hits = self.hits(config)
+        scores = postprocess.transformer_scores(self.logits, hits, config)
+        # Decision indices 0/1/2 correspond to dataset labels -1/0/1
+        return postprocess.decide(scores, hits, config)[0] - 1
+
+
+class ReplayEngine:
+    """Evaluate post-processing configurations against one logit store."""
+
+    def __init__(self, key: str, store_dir: Path = logit_store.STORE_DIR) -> None:
+        self.key = key
+        self.sets: Dict[str, ReplaySet] = {}
+        dataset_logits = logit_store.load(key, "dataset", store_dir)
+        dataset = pd.read_csv(logit_store.source_path("dataset"))
+        for split in EVAL_SPLITS:
+            ids = pd.read_csv(SPLIT_PATHS[split])["id"].to_numpy()
+            self.sets[split] = self._replay_set(split, dataset_logits[ids], dataset.iloc[ids])
+        try:
+            ground_truth_logits = logit_store.load(key, "ground_truth", store_dir)
+        except FileNotFoundError:
+            print("No ground-truth logits in this store; evaluating val and test only.")
+        else:
+            ground_truth = pd.read_csv(logit_store.source_path("ground_truth"))
+            self.sets["ground_truth"] = self._replay_set("ground_truth", ground_truth_logits, ground_truth)
+
+    @staticmethod
+    def _replay_set(name: str, logits: np.ndarray, rows: pd.DataFrame) -> ReplaySet:
+        # The same rows the analyzer can score and the evaluations count
+        keep = (
+            rows["review"].apply(lambda text: isinstance(text, str) and bool(text.strip())).to_numpy()
+            & rows["label"].notna().to_numpy()
+            & ~np.isnan(logits).any(axis=1)
+        )
+        return ReplaySet(
+            name,
+            np.asarray(logits)[keep],
+            rows["review"][keep].tolist(),
+            rows["label"][keep].astype(int).to_numpy(),
+        )
+
+    def evaluate(self, config: PostProcess) -> Dict[str, Dict[str, float]]:
+        """Accuracy, macro-F1 and replay time of ``config`` on every set."""
+        report = {}
+        for name, replay_set in self.sets.items():
+            started = time.perf_counter()
+            predictions = replay_set.predict(config)
+            report[name] = {
+                **label_metrics(replay_set.labels, predictions),
+                "rows": len(replay_set),
+                "replay_ms": (time.perf_counter() - started) * 1000,
+            }
+        return report
+
+    def fit_temperature(self, split: str = "val", low: float = 0.05, high: float = 20.0) -> Dict[str, float]:
+        """Temperature minimizing the NLL of the raw softmax on ``split`` (golden-section search)."""
+        logits = self.sets[split].logits.astype(np.float64)
+        targets = self.sets[split].labels + 1
+
+        def nll(log_temperature: float) -> float:
+            scaled = logits / math.exp(log_temperature)
+            scaled -= scaled.max(axis=1, keepdims=True)
+            log_probs = scaled - np.log(np.exp(scaled).sum(axis=1, keepdims=True))
+            return float(-log_probs[np.arange(len(targets)), targets].mean())
+
+        # The NLL is convex in 1/T, hence unimodal in log T
+        ratio = (math.sqrt(5) - 1) / 2
+        a, b = math.log(low), math.log(high)
+        c, d = b - ratio * (b - a), a + ratio * (b - a)
+        while b - a > 1e-5:
+            if nll(c) < nll(d):
+                b, d = d, c
+                c = b - ratio * (b - a)
+            else:
+                a, c = c, d
+                d = a + ratio * (b - a)
+        fitted = math.exp((a + b) / 2)
+        return {
+            "temperature": fitted,
+            "nll": nll(math.log(fitted)),
+            "nll_at_1": nll(0.0),
+            "nll_at_default": nll(math.log(PostProcess().temperature)),
+        }
+
+
+def _print_report(report: Dict[str, Dict[str, float]]) -> None:
+    for name, row in report.items():
+        print(
+            f"  {name:<13} accuracy {row['accuracy']:.4f}  macro-F1 {row['f1_macro']:.4f}  "
+            f"({row['rows']} rows, {row['replay_ms']:.1f} ms)"
+        )
+
+
+def _parse_overrides(pairs: Sequence[str]) -> Dict[str, str]:
+    overrides = {}
+    for pair in pairs:
+        name, separator, value = pair.partition("=")
+        if not separator:
+            raise SystemExit(f"--set expects NAME=VALUE, got {pair!r}")
+        overrides[name.strip()] = value.strip()
+    return overrides
+
+
+def _default_store() -> str:
+    stores = [
+        meta for meta in logit_store.list_stores()
+        if meta["sources"].get("dataset", {}).get("complete")
+    ]
+    if not stores:
+        raise SystemExit("No logit store yet; run `python -m app.inference.logit_store compute` first.")
+    latest = max(stores, key=lambda meta: meta["sources"]["dataset"]["computed"])
+    if len(stores) > 1:
+        print(f"Using the most recent store {latest['key']} ({latest['checkpoint']}); choose one with --store.")
+    return latest["key"]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--store", default=None, help="Logit store key (see `logit_store list`)")
+    common.add_argument("--config", type=Path, default=Path(POSTPROCESS_CONFIG) if POSTPROCESS_CONFIG else None,
+                        help="Starting configuration (default: TWEET_POSTPROCESS_CONFIG or the shipped rules)")
+    common.add_argument("--set", dest="overrides", action="append", default=[], metavar="NAME=VALUE",
+                        help="Override one setting of the starting configuration")
+    common.add_argument("--save", type=Path, default=None, help="Write the resulting configuration as JSON")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("evaluate", parents=[common], help="Score one configuration against the shipped rules")
+    sweep_parser = subparsers.add_parser("sweep", parents=[common], help="Score a range of values of one setting")
+    sweep_parser.add_argument("name")
+    sweep_parser.add_argument("values", type=float, nargs="+")
+    fit_parser = subparsers.add_parser("fit-temperature", parents=[common], help="Fit the temperature on val logits")
+    fit_parser.add_argument("--split", choices=EVAL_SPLITS, default="val")
+    args = parser.parse_args(argv)
+
+    base = PostProcess.load(args.config) if args.config is not None else PostProcess()
+    try:
+        config = base.replace(**_parse_overrides(args.overrides))
+    except ValueError as exc:
+        raise SystemExit(str(exc))
+    engine = ReplayEngine(args.store or _default_store())
+
+    if args.command == "evaluate":
+        print("Shipped rules:")
+        _print_report(engine.evaluate(PostProcess()))
+        if config != PostProcess():
+            shipped = PostProcess().to_dict()
+            changed = {name: value for name, value in config.to_dict().items() if value != shipped[name]}
+            print(f"Candidate {changed}:")
+            _print_report(engine.evaluate(config))
+    elif args.command == "sweep":
+        rows: List[Dict] = []
+        for value in args.values:
+            try:
+                candidate = config.replace(**{args.name: value})
+            except ValueError as exc:
+                raise SystemExit(str(exc))
+            for name, row in engine.evaluate(candidate).items():
+                rows.append({args.name: value, "set": name, **row})
+        report = pd.DataFrame(rows)
+        REPORT_DIR.mkdir(parents=True, exist_ok=True)
+        output_path = REPORT_DIR / f"tuning_sweep_{args.name}.csv"
+        report.to_csv(output_path, index=False)
+        table = report.pivot(index=args.name, columns="set", values="f1_macro")
+        print(f"Macro-F1 by {args.name}:")
+        print(table.to_string(float_format=lambda value: f"{value:.4f}"))
+        print(f"\nSaved to {output_path}")
+    else:
+        fit = engine.fit_temperature(args.split)
+        print(
+            f"Fitted temperature {fit['temperature']:.4f} on {args.split}: NLL {fit['nll']:.4f} "
+            f"(T=1: {fit['nll_at_1']:.4f}, T={PostProcess().temperature:g}: {fit['nll_at_default']:.4f})"
+        )
+        config = config.replace(temperature=round(fit["temperature"], 4))
+        print("With the fitted temperature:")
+        _print_report(engine.evaluate(config))
+        print("Shipped rules:")
+        _print_report(engine.evaluate(PostProcess()))
+
+    if args.save is not None:
+        config.save(args.save)
+        print(f"Saved configuration to {args.save}; serve it with TWEET_POSTPROCESS_CONFIG={args.save}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""
+Smaller BERT variants derived from the fine-tuned checkpoint.
+
+Tweets are short, so most of BERT's CPU time goes into the 12 encoder layers.
+A variant keeps only the bottom `--layers` encoder layers. It can also prune
+the `--prune-heads` least important attention heads of every kept layer, by
+physically removing their query/key/value rows and output-projection
+columns. A head's importance is the norm of its value and output projections,
+a data-free proxy for how much it adds to the residual stream.
+Truncated models lose accuracy; `--finetune-steps` trains the variant briefly
+on the `train_ids.csv` split to recover some of it.
+
+Each variant is a regular checkpoint directory in
+`checkpoints/bert-base/variants/<name>/`, with safetensors weights, the
+tokenizer files and a `variant.json` describing how it was made. Serve one
+with `TWEET_MODEL_VARIANT=<name>` (or `TweetAnalyzer(variant=<name>)`).
+
+`report` scores the full model and every variant on the test split. Per model
+it reports macro-F1, tweets/sec and single-tweet latency, and it suggests the
+fastest variant within `--max-f1-drop` of the full model.
+
+Usage:
+    python -m app.inference.variants create --layers 6
+    python -m app.inference.variants create --layers 6 --prune-heads 4 --finetune-steps 600
+    python -m app.inference.variants list
+    python -m app.inference.variants report --max-f1-drop 0.01
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence
+
+import numpy as np
+import torch
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+from app.inference.predictor import TOKENIZER_FILES
+from app.inference.pruning import configured_pruned_heads, encoder_layers, prune_heads
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+_PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+REPORT_DIR = _PROJECT_ROOT / "exports"
+VARIANT_INFO_NAME = "variant.json"
+
+
+def head_importance(model: torch.nn.Module) -> List[np.ndarray]:
+    """Per layer, the product of each head's value-projection and output-projection norms."""
+    scores = []
+    with torch.no_grad():
+        for layer in encoder_layers(model):
+            self_attention = layer.attention.self
+            size = self_attention.attention_head_size
+            value = self_attention.value.weight.reshape(-1, size, self_attention.value.weight.shape[1])
+            output = layer.attention.output.dense.weight.reshape(-1, self_attention.num_attention_heads, size)
+            value_norms = value.flatten(1).norm(dim=1)
+            output_norms = output.transpose(0, 1).flatten(1).norm(dim=1)
+            scores.append((value_norms * output_norms).numpy())
+    return scores
+
+
+def truncate_layers(model: torch.nn.Module, layers: int) -> None:
+    """Keep only the bottom ``layers`` encoder layers."""
+    total = len(encoder_layers(model))
+    if not 1 <= layers <= total:
+        raise ValueError(f"--layers must be between 1 and {total}.")
+    model.base_model.encoder.layer = encoder_layers(model)[:layers]
+    model.config.num_hidden_layers = layers
+
+
+def default_name(layers: int, prune_per_layer: int, finetune_steps: int) -> str:
+    """E.g. ``L6``, ``L6-P4`` (4 heads pruned per layer) or ``L6-P4-ft``."""
+    name = f"L{layers}"
+    if prune_per_layer:
+        name += f"-P{prune_per_layer}"
+    return name + ("-ft" if finetune_steps else "")
+
+
+def finetune(
+    model: torch.nn.Module,
+    tokenizer,
+    texts: Sequence[str],
+    labels: np.ndarray,
+    steps: int,
+    batch_size: int = 16,
+    learning_rate: float = 3e-5,
+    max_length: int = 128,
+    seed: int = 42,
+) -> Dict:
+    """Train ``model`` for ``steps`` mini-batches with linear warmup and decay."""
+    torch.manual_seed(seed)
+    rng = np.random.default_rng(seed)
+    # BERT outputs are ordered (negative, neutral, positive) = labels (-1, 0, 1)
+    targets = torch.as_tensor(np.asarray(labels) + 1, dtype=torch.long)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=learning_rate, weight_decay=0.01)
+    warmup = max(1, steps // 10)
+    schedule = torch.optim.lr_scheduler.LambdaLR(
+        optimizer, lambda step: min((step + 1) / warmup, max(0.0, (steps - step) / max(1, steps - warmup)))
+    )
+    order = rng.permutation(len(texts))
+    position = 0
+    losses: List[float] = []
+    started = time.perf_counter()
+    model.train()
+    for step in range(steps):
+        if position + batch_size > len(order):
+            order, position = rng.permutation(len(texts)), 0
+        batch = order[position:position + batch_size]
+        position += batch_size
+        encoded = tokenizer(
+            [texts[index] for index in batch], padding=True, truncation=True, max_length=max_length,
+            return_tensors="pt",
+        )
+        loss = torch.nn.functional.cross_entropy(model(**encoded).logits, targets[batch])
+        optimizer.zero_grad()
+        loss.backward()
+        torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+        optimizer.step()
+        schedule.step()
+        losses.append(loss.item())
+        if (step + 1) % 50 == 0 or step + 1 == steps:
+            print(f"  step {step + 1}/{steps}: loss {np.mean(losses[-50:]):.4f}")
+    model.eval()
+    return {
+        "steps": steps,
+        "batch_size": batch_size,
+        "learning_rate": learning_rate,
+        "final_loss": float(np.mean(losses[-50:])),
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def create_variant(
+    checkpoint_dir: Path,
+    output_dir: Path,
+    layers: int,
+    prune_per_layer: int = 0,
+    finetune_steps: int = 0,
+    finetune_options: Optional[Dict] = None,
+) -> Dict:
+    """Derive a variant of ``checkpoint_dir`` and save it to ``output_dir``."""
+    model = AutoModelForSequenceClassification.from_pretrained(checkpoint_dir)
+    model.eval()
+    if configured_pruned_heads(model.config):
+        raise ValueError(f"{checkpoint_dir} is already head-pruned; derive variants from the full checkpoint.")
+    source_layers = model.config.num_hidden_layers
+    truncate_layers(model, layers)
+
+    pruned: Dict[int, List[int]] = {}
+    if prune_per_layer:
+        heads = model.config.num_attention_heads
+        if not 0 < prune_per_layer < heads:
+            raise ValueError(f"--prune-heads must be between 1 and {heads - 1}.")
+        for layer_index, scores in enumerate(head_importance(model)):
+            pruned[layer_index] = sorted(int(head) for head in np.argsort(scores, kind="stable")[:prune_per_layer])
+        prune_heads(model, pruned)
+        model.config.pruned_heads = {str(layer): heads for layer, heads in pruned.items()}
+
+    training = None
+    if finetune_steps:
+        from app.inference.data import load_split
+        from app.inference.predictor import TRANSFORMER_MAX_LENGTH
+
+        texts, labels = load_split("train")
+        tokenizer = AutoTokenizer.from_pretrained(checkpoint_dir, use_fast=True)
+        print(f"Fine-tuning for {finetune_steps} steps on {len(texts)} training tweets...")
+        training = finetune(
+            model, tokenizer, texts, labels, finetune_steps, max_length=TRANSFORMER_MAX_LENGTH,
+            **(finetune_options or {}),
+        )
+
+    info = {
+        "name": output_dir.name,
+        "source": str(checkpoint_dir),
+        "source_layers": source_layers,
+        "layers": layers,
+        "heads_per_layer": model.config.num_attention_heads - prune_per_layer,
+        "pruned_heads": {str(layer): heads for layer, heads in pruned.items()},
+        "parameters": sum(param.numel() for param in model.parameters()),
+        "finetune": training,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    # Written beside the final directory and renamed, so a crash leaves no half variant
+    tmp_dir = output_dir.with_name(f".{output_dir.name}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    model.save_pretrained(tmp_dir, safe_serialization=True)
+    for name in TOKENIZER_FILES:
+        if (checkpoint_dir / name).exists():
+            shutil.copy2(checkpoint_dir / name, tmp_dir / name)
+    (tmp_dir / VARIANT_INFO_NAME).write_text(json.dumps(info, indent=2))
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.replace(tmp_dir, output_dir)
+    return info
+
+
+def list_variants(variants_dir: Path) -> List[Dict]:
+    if not variants_dir.exists():
+        return []
+    return [
+        json.loads((path / VARIANT_INFO_NAME).read_text())
+        for path in sorted(variants_dir.iterdir())
+        if (path / VARIANT_INFO_NAME).exists()
+    ]
+
+
+def evaluate_variant(
+    variant: str,
+    texts: Sequence[str],
+    labels: np.ndarray,
+    latency_samples: int = 200,
+    batch_size: int = 32,
+) -> Dict:
+    """Load ``variant`` ("" for the full model) through `TweetAnalyzer` and score ``texts``."""
+    from sklearn.metrics import f1_score
+
+    from app.inference.predictor import LABEL_MAP, TweetAnalyzer
+
+    analyzer = TweetAnalyzer(
+        variant=variant, model="auto", backend="torch", quantization="none",
+        cache_max_entries=0, near_dup_max_entries=0,
+    )
+    if analyzer.transformer_model is None:
+        raise RuntimeError(f"BERT variant {variant or 'full'!r} could not be loaded.")
+    config = analyzer.transformer_model.config
+
+    # Warm up kernels before timing
+    analyzer.analyze_batch(list(texts[:batch_size]), batch_size=batch_size)
+    single_latencies: List[float] = []
+    for text in texts[:latency_samples]:
+        tick = time.perf_counter()
+        analyzer.analyze(text)
+        single_latencies.append((time.perf_counter() - tick) * 1000)
+
+    tick = time.perf_counter()
+    results = analyzer.analyze_batch(list(texts), batch_size=batch_size)
+    batch_seconds = time.perf_counter() - tick
+
+    label_ids = {name: label for label, name in LABEL_MAP.items()}
+    predictions = np.array([label_ids[result.sentiment_label] for result in results])
+    return {
+        "variant": variant or "full",
+        "layers": config.num_hidden_layers,
+        "pruned_heads": sum(len(heads) for heads in configured_pruned_heads(config).values()),
+        "parameters_m": sum(param.numel() for param in analyzer.transformer_model.parameters()) / 1e6,
+        "single_p50_ms": float(np.percentile(single_latencies, 50)),
+        "single_p95_ms": float(np.percentile(single_latencies, 95)),
+        "batch_tweets_per_sec": len(texts) / batch_seconds,
+        "accuracy": float(np.mean(predictions == labels)),
+        "f1_macro": float(f1_score(labels, predictions, labels=[-1, 0, 1], average="macro", zero_division=0)),
+    }
+
+
+def build_report(
+    variants: Sequence[str],
+    split: str = "test",
+    limit: Optional[int] = None,
+    latency_samples: int = 200,
+    batch_size: int = 32,
+) -> pd.DataFrame:
+    """One row per model, the full checkpoint first, with deltas against it."""
+    import pandas as pd
+
+    from app.inference.data import load_split
+
+    texts, labels = load_split(split)
+    if limit is not None:
+        texts, labels = texts[:limit], labels[:limit]
+    rows = []
+    for variant in ["", *variants]:
+        print(f"Evaluating {variant or 'full model'}...")
+        rows.append(evaluate_variant(variant, texts, labels, latency_samples, batch_size))
+    report = pd.DataFrame(rows)
+    report["speedup_vs_full"] = report["batch_tweets_per_sec"] / report.loc[0, "batch_tweets_per_sec"]
+    report["f1_delta_vs_full"] = report["f1_macro"] - report.loc[0, "f1_macro"]
+    return report
+
+
+def recommend(report: pd.DataFrame, max_f1_drop: float) -> pd.Series:
+    """Fastest model whose macro-F1 is within ``max_f1_drop`` of the full model."""
+    eligible = report[report["f1_delta_vs_full"] >= -max_f1_drop]
+    return eligible.loc[eligible["batch_tweets_per_sec"].idxmax()]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    from app.inference.predictor import CHECKPOINT_DIR, VARIANTS_DIR
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    create_parser = subparsers.add_parser("create", help="Derive a truncated and/or head-pruned variant")
+    create_parser.add_argument("--layers", type=int, required=True, help="Bottom encoder layers to keep")
+    create_parser.add_argument("--prune-heads", type=int, default=0,
+                               help="Least important attention heads to remove from every kept layer")
+    create_parser.add_argument("--finetune-steps", type=int, default=0,
+                               help="Mini-batches of fine-tuning on the train split (0 skips it)")
+    create_parser.add_argument("--finetune-batch-size", type=int, default=16)
+    create_parser.add_argument("--learning-rate", type=float, default=3e-5)
+    create_parser.add_argument("--name", default=None, help="Variant name (default: derived from the settings)")
+    create_parser.add_argument("--checkpoint", type=Path, default=CHECKPOINT_DIR)
+
+    subparsers.add_parser("list", help="Show the saved variants")
+
+    report_parser = subparsers.add_parser("report", help="Latency vs macro-F1 of the full model and variants")
+    report_parser.add_argument("--variants", default=None,
+                               help="Comma-separated variant names (default: all saved variants)")
+    report_parser.add_argument("--split", default="test", choices=("train", "val", "test"))
+    report_parser.add_argument("--limit", type=int, default=None, help="Only use the first N tweets")
+    report_parser.add_argument("--latency-samples", type=int, default=200)
+    report_parser.add_argument("--batch-size", type=int, default=32)
+    report_parser.add_argument("--max-f1-drop", type=float, default=0.01)
+
+    args = parser.parse_args(argv)
+    if args.command == "create":
+        name = args.name or default_name(args.layers, args.prune_heads, args.finetune_steps)
+        try:
+            info = create_variant(
+                args.checkpoint, VARIANTS_DIR / name, args.layers, args.prune_heads, args.finetune_steps,
+                {"batch_size": args.finetune_batch_size, "learning_rate": args.learning_rate},
+            )
+        except ValueError as exc:
+            raise SystemExit(str(exc))
+        print(
+            f"Saved variant {name} to {VARIANTS_DIR / name}: {info['layers']} layers, "
+            f"{info['heads_per_layer']} heads per layer, {info['parameters'] / 1e6:.1f}M parameters"
+        )
+        print(f"Serve it with TWEET_MODEL_VARIANT={name}")
+        return
+
+    if args.command == "list":
+        variants = list_variants(VARIANTS_DIR)
+        if not variants:
+            print(f"No variants in {VARIANTS_DIR}")
+        for info in variants:
+            tuned = f", fine-tuned {info['finetune']['steps']} steps" if info.get("finetune") else ""
+            print(
+                f"{info['name']}: {info['layers']}/{info['source_layers']} layers, "
+                f"{info['heads_per_layer']} heads per layer, {info['parameters'] / 1e6:.1f}M parameters{tuned}"
+            )
+        return
+
+    names = [name.strip() for name in args.variants.split(",") if name.strip()] if args.variants else [
+        info["name"] for info in list_variants(VARIANTS_DIR)
+    ]
+    report = build_report(names, args.split, args.limit, args.latency_samples, args.batch_size)
+    REPORT_DIR.mkdir(parents=True, exist_ok=True)
+    csv_path = REPORT_DIR / f"variants_report_{args.split}.csv"
+    report.to_csv(csv_path, index=False)
+    print(report.to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+    choice = recommend(report, args.max_f1_drop)
+    print(
+        f"\nFastest within {args.max_f1_drop:.3f} macro-F1 of the full model: {choice['variant']} "
+        f"({choice['speedup_vs_full']:.2f}x, macro-F1 {choice['f1_macro']:.4f})"
+    )
+    print(f"Saved {csv_path}")
+
+
+if __name__ == "__main__":
+    main()
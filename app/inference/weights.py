@@ -0,0 +1,256 @@
+"""
+Safetensors conversion and zero-copy, memory-mapped weight loading.
+
+`pytorch_model.bin` is a pickle: loading it parses the pickle stream and reads
+every tensor into freshly allocated memory. A safetensors file is a small JSON
+header followed by raw tensor bytes, so the weights can be mapped straight from
+the file. Here the model skeleton is built on the meta device, and each
+parameter then points at its slice of the mapping. Pages are read lazily
+from the page cache and processes loading the same file share the same
+physical memory.
+
+Usage:
+    # Write checkpoints/bert-base/best/model.safetensors from pytorch_model.bin
+    python -m app.inference.weights convert
+
+    # Cold-start time, peak RSS and private memory of both formats, each in a
+    # fresh process
+    python -m app.inference.weights report
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import struct
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+import torch
+from transformers import AutoConfig, AutoModelForSequenceClassification
+
+from app.inference.pruning import configured_pruned_heads, prune_to_config
+
+_PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+REPORT_DIR = _PROJECT_ROOT / "exports"
+SAFETENSORS_NAME = "model.safetensors"
+PICKLE_WEIGHTS_NAME = "pytorch_model.bin"
+
+_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+
+def convert_to_safetensors(checkpoint_dir: Path, output_path: Optional[Path] = None) -> Path:
+    """Write the float weights of ``checkpoint_dir`` as a safetensors file.
+
+    The converted file is loaded back through `load_mmap_model` and compared
+    tensor by tensor with the pickled checkpoint before returning.
+    """
+    from safetensors.torch import save_model
+
+    output_path = output_path or checkpoint_dir / SAFETENSORS_NAME
+    model = load_pretrained_model(checkpoint_dir, use_safetensors=False)
+    # save_model de-duplicates tied tensors, which save_file would reject
+    save_model(model, str(output_path), metadata={"format": "pt"})
+
+    reloaded = load_mmap_model(checkpoint_dir, output_path).state_dict()
+    for name, tensor in model.state_dict().items():
+        if not torch.equal(tensor, reloaded[name]):
+            raise ValueError(f"Converted tensor {name!r} does not match the original checkpoint.")
+    return output_path
+
+
+def mmap_state_dict(path: Path) -> Dict[str, torch.Tensor]:
+    """Map a safetensors file and return tensors that view the mapping.
+
+    The mapping is private (copy-on-write), so nothing written to a tensor
+    reaches the file, and unmodified pages stay shared with the page cache.
+    """
+    path = Path(path)
+    with open(path, "rb") as handle:
+        (header_size,) = struct.unpack("<Q", handle.read(8))
+        header = json.loads(handle.read(header_size))
+    header.pop("__metadata__", None)
+    data_start = 8 + header_size
+
+    storage = torch.UntypedStorage.from_file(str(path), shared=False, nbytes=path.stat().st_size)
+    file_bytes = torch.empty(0, dtype=torch.uint8).set_(storage)
+    tensors: Dict[str, torch.Tensor] = {}
+    for name, entry in header.items():
+        dtype = _DTYPES[entry["dtype"]]
+        begin, end = (data_start + offset for offset in entry["data_offsets"])
+        chunk = file_bytes[begin:end]
+        if begin % dtype.itemsize:
+            # Misaligned data cannot be viewed in place; copy this one tensor
+            chunk = chunk.clone()
+        tensors[name] = chunk.view(dtype).reshape(entry["shape"])
+    return tensors
+
+
+def _empty_model(config) -> torch.nn.Module:
+    """Build the classifier from ``config`` with every tensor on the meta device.
+
+    The skeleton costs no memory and no initialisation time. ``torch.device``
+    only changes the default device of the calling thread, so a model built
+    concurrently elsewhere (e.g. during a hot-swap) is unaffected.
+    """
+    with torch.device("meta"):
+        return AutoModelForSequenceClassification.from_config(config)
+
+
+def _materialize_buffers(model: torch.nn.Module) -> None:
+    """Rebuild buffers no weight file stores (e.g. BERT's `position_ids`) on the CPU.
+
+    They are allocated empty and filled by the model's own `_init_weights`, as
+    `from_pretrained` does, leaving the already loaded parameters untouched.
+    """
+    for module in model.modules():
+        names = [name for name, buffer in module.named_buffers(recurse=False) if buffer.is_meta]
+        if not names:
+            continue
+        for name in names:
+            setattr(module, name, torch.empty_like(getattr(module, name), device="cpu"))
+        model._init_weights(module)
+
+
+def _load_into_skeleton(config, state: Dict[str, torch.Tensor], source: str) -> torch.nn.Module:
+    """Assign ``state`` into a meta skeleton built (and head-pruned) from ``config``."""
+    model = _empty_model(config)
+    # Head-pruned variants store smaller attention matrices than the config implies
+    prune_to_config(model)
+    # assign=True keeps the given tensors instead of copying into the skeleton
+    incompatible = model.load_state_dict(state, strict=False, assign=True)
+    if incompatible.unexpected_keys:
+        raise ValueError(f"Unexpected tensors in {source}: {incompatible.unexpected_keys}")
+    # Keys dropped as duplicates on save are restored by re-tying them
+    model.tie_weights()
+    _materialize_buffers(model)
+    missing = [name for name, param in model.named_parameters() if param.is_meta]
+    if missing:
+        raise ValueError(f"Tensors missing from {source}: {missing}")
+    model.eval()
+    return model
+
+
+def load_mmap_model(checkpoint_dir: Path, weights_path: Optional[Path] = None) -> torch.nn.Module:
+    """Build the classifier from ``config.json`` with weights mapped from safetensors."""
+    weights_path = weights_path or checkpoint_dir / SAFETENSORS_NAME
+    config = AutoConfig.from_pretrained(checkpoint_dir)
+    return _load_into_skeleton(config, mmap_state_dict(weights_path), weights_path.name)
+
+
+def load_pretrained_model(checkpoint_dir: Path, use_safetensors: Optional[bool] = None) -> torch.nn.Module:
+    """`from_pretrained` in eval mode that also loads head-pruned variants.
+
+    transformers 5 builds full-size attention matrices whatever
+    ``config.pruned_heads`` says, so a pruned variant's weights do not fit
+    `from_pretrained`; those are assigned into a pruned skeleton instead.
+    ``use_safetensors`` picks the weight file as in `from_pretrained`.
+    """
+    config = AutoConfig.from_pretrained(checkpoint_dir)
+    if not configured_pruned_heads(config):
+        return AutoModelForSequenceClassification.from_pretrained(
+            checkpoint_dir, use_safetensors=use_safetensors
+        ).eval()
+    safetensors_path = checkpoint_dir / SAFETENSORS_NAME
+    if use_safetensors is not False and safetensors_path.exists():
+        from safetensors.torch import load_file
+
+        return _load_into_skeleton(config, load_file(str(safetensors_path)), SAFETENSORS_NAME)
+    if use_safetensors:
+        raise FileNotFoundError(f"No {SAFETENSORS_NAME} in {checkpoint_dir}.")
+    state = torch.load(checkpoint_dir / PICKLE_WEIGHTS_NAME, map_location="cpu", weights_only=True)
+    return _load_into_skeleton(config, state, PICKLE_WEIGHTS_NAME)
+
+
+_COLD_START_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+from pathlib import Path
+import torch
+from app.inference.memory import peak_rss_mb, process_memory_mb
+from app.inference.weights import load_mmap_model, load_pretrained_model
+imported = time.perf_counter()
+anonymous_before = process_memory_mb().get("anonymous_mb", 0.0)
+checkpoint = Path({checkpoint!r})
+if {fmt!r} == "safetensors":
+    model = load_mmap_model(checkpoint)
+else:
+    model = load_pretrained_model(checkpoint, use_safetensors=False)
+loaded = time.perf_counter()
+with torch.no_grad():
+    model(input_ids=torch.ones(1, 16, dtype=torch.long))
+finished = time.perf_counter()
+print(json.dumps({{
+    "format": {fmt!r},
+    "load_seconds": loaded - imported,
+    "first_forward_ms": (finished - loaded) * 1000,
+    "cold_start_seconds": finished - started,
+    "peak_rss_mb": peak_rss_mb(),
+    # Private (non file-backed) memory added by loading and running the model
+    "weights_anonymous_mb": process_memory_mb().get("anonymous_mb", 0.0) - anonymous_before,
+}}))
+"""
+
+
+def measure_cold_start(checkpoint_dir: Path, fmt: str) -> Dict:
+    """Load ``fmt`` ("bin" or "safetensors") in a fresh interpreter and time it."""
+    script = _COLD_START_SCRIPT.format(root=str(_PROJECT_ROOT), checkpoint=str(checkpoint_dir), fmt=fmt)
+    output = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    from app.inference.predictor import CHECKPOINT_DIR
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    convert_parser = subparsers.add_parser("convert", help="Write model.safetensors")
+    convert_parser.add_argument("--checkpoint", type=Path, default=CHECKPOINT_DIR)
+    convert_parser.add_argument("--output", type=Path, default=None)
+    report_parser = subparsers.add_parser("report", help="Compare cold start of both formats")
+    report_parser.add_argument("--checkpoint", type=Path, default=CHECKPOINT_DIR)
+    report_parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.command == "convert":
+        path = convert_to_safetensors(args.checkpoint, args.output)
+        print(f"Wrote {path} ({path.stat().st_size / (1024 * 1024):.2f} MB); round trip verified")
+        return
+
+    import pandas as pd
+
+    rows = []
+    for fmt, filename in (("bin", PICKLE_WEIGHTS_NAME), ("safetensors", SAFETENSORS_NAME)):
+        if not (args.checkpoint / filename).exists():
+            print(f"Skipping {fmt}: {filename} not found in {args.checkpoint}")
+            continue
+        # The first run warms the page cache; the median of the rest is reported
+        runs = [measure_cold_start(args.checkpoint, fmt) for _ in range(args.repeats + 1)][1:]
+        rows.append(pd.DataFrame(runs).median(numeric_only=True).to_dict() | {"format": fmt})
+
+    report = pd.DataFrame(rows)[["format", "load_seconds", "first_forward_ms", "cold_start_seconds", "peak_rss_mb", "weights_anonymous_mb"]]
+    REPORT_DIR.mkdir(parents=True, exist_ok=True)
+    report.to_csv(REPORT_DIR / "weights_format_report.csv", index=False)
+    print(report.to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+    print(f"\nSaved to {REPORT_DIR / 'weights_format_report.csv'}")
+
+
+if __name__ == "__main__":
+    main()
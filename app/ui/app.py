@@ -6,7 +6,11 @@ Lightweight prototype interface that automatically flags potentially harmful twe
 
 from __future__ import annotations
 
+import hashlib
+import io
 import sys
+import time
+from collections import OrderedDict
 from pathlib import Path
 from typing import Dict, List, Tuple
 
@@ -31,39 +35,63 @@ app_dir = PROJECT_ROOT / "app"
 if str(app_dir) not in sys.path:
     sys.path.insert(0, str(app_dir.parent))  # Add parent of app (PROJECT_ROOT)
 
-# Now try the import
-try:
-    from app.inference.predictor import TweetAnalyzer
-except ImportError as e:
-    # Fallback: direct import
-    import importlib.util
-    predictor_path = PROJECT_ROOT / "app" / "inference" / "predictor.py"
-    spec = importlib.util.spec_from_file_location("predictor", predictor_path)
-    predictor_module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(predictor_module)
-    TweetAnalyzer = predictor_module.TweetAnalyzer
-
-# Initialize analyzer with cache clearing option
+# The project root is on sys.path, so the app package always imports; bulk_score
+# needs the package itself, so loading predictor.py by file path is no fallback
+from app.inference.predictor import TweetAnalyzer
+from app.inference.bulk_score import score_frame
+from app.inference import registry
+from app.backend.startup import ModelLoader
+
+
+def _version_factory(version):
+    """Build the analyzer for a registry version (the default checkpoints when None)."""
+    def load() -> TweetAnalyzer:
+        if version is None:
+            return TweetAnalyzer()
+        registry.verify(version)
+        return TweetAnalyzer(**registry.analyzer_kwargs(version))
+    return load
+
+
+# One slot shared by every session: the served analyzer, its registry version
+# and the background load that will replace it
 @st.cache_resource
-def load_analyzer():
-    analyzer = TweetAnalyzer()
-    return analyzer
+def model_slot() -> Dict:
+    version = registry.active_version()
+    return {"analyzer": _version_factory(version)(), "version": version, "reload": None, "reload_version": None}
+
+
+slot = model_slot()
+reload_loader = slot["reload"]
+reloading = reload_loader is not None and reload_loader.phase not in ("ready", "failed")
+
+# Reload the registry's active version in the background; the current model
+# keeps answering until the new one is loaded and warmed up
+if st.sidebar.button("🔄 Reload Model", disabled=reloading):
+    version = registry.active_version()
+
+    def _swap(loaded, version=version) -> None:
+        slot["analyzer"], slot["version"] = loaded, version
 
-# Add a button to clear cache and reload model
-if st.sidebar.button("🔄 Reload Model"):
-    load_analyzer.clear()
+    slot["reload"] = ModelLoader(_version_factory(version), on_ready=_swap)
+    slot["reload_version"] = version
+    slot["reload"].start()
     st.rerun()
 
-analyzer = load_analyzer()
+if reloading:
+    st.sidebar.info(f"Loading model version {slot['reload_version'] or 'default'} in the background…")
+elif reload_loader is not None and reload_loader.phase == "failed":
+    st.sidebar.error(f"Reload failed, still serving the previous model: {reload_loader.error}")
+
+analyzer = slot["analyzer"]
 
 # Show model status
-model_type = "BERT" if analyzer.transformer_model is not None else "Baseline TF-IDF"
-st.sidebar.info(f"**Model:** {model_type}")
+model_type = "BERT" if analyzer.transformer_backend is not None else "Baseline TF-IDF"
+st.sidebar.info(f"**Model:** {model_type} (version {slot['version'] or 'default'})")
 
 # Check if pytorch_model.bin exists
-import os
-pytorch_model_path = PROJECT_ROOT / "checkpoints" / "bert-base" / "best" / "pytorch_model.bin"
-if analyzer.transformer_model is None:
+pytorch_model_path = analyzer.checkpoint_dir / "pytorch_model.bin"
+if analyzer.transformer_backend is None:
     st.sidebar.warning("⚠️ Using baseline model. For better accuracy, re-export the full BERT model (pytorch_model.bin) from Colab.")
 elif pytorch_model_path.exists():
     file_size_mb = pytorch_model_path.stat().st_size / (1024 * 1024)
@@ -136,6 +164,52 @@ CUSTOM_CSS = """
 """
 
 
+# Batch analysis: rows scored per analyze_batch call, rows kept from one upload,
+# and how many uploaded files keep their results cached
+BATCH_CHUNK_ROWS = 256
+MAX_BATCH_ROWS = int(os.environ.get("TWEET_UI_MAX_ROWS", "50000"))
+BATCH_CACHE_FILES = 8
+
+
+@st.cache_resource
+def batch_result_store() -> "OrderedDict":
+    """Scored uploads keyed by (file hash, model fingerprint), oldest first."""
+    return OrderedDict()
+
+
+def read_upload(file_bytes: bytes) -> pd.DataFrame:
+    """Parse an uploaded CSV, reading at most one row past the batch cap."""
+    # Read CSV with proper handling of quoted fields and commas
+    # Use engine='python' for better compatibility with quoted fields containing commas
+    options = dict(quotechar='"', skipinitialspace=True, engine='python', nrows=MAX_BATCH_ROWS + 1)
+    try:
+        # on_bad_lines needs newer pandas
+        return pd.read_csv(io.BytesIO(file_bytes), on_bad_lines='skip', **options)
+    except TypeError:
+        # Fallback for older pandas versions
+        return pd.read_csv(io.BytesIO(file_bytes), **options)
+
+
+def score_upload(df: pd.DataFrame, table) -> pd.DataFrame:
+    """Score ``df`` in chunks, updating a progress bar and ``table`` as they finish."""
+    progress = st.progress(0.0, text="Scoring tweets...")
+    parts: List[pd.DataFrame] = []
+    last_render = 0.0
+    for start in range(0, len(df), BATCH_CHUNK_ROWS):
+        chunk = df.iloc[start:start + BATCH_CHUNK_ROWS]
+        parts.append(score_frame(analyzer, chunk[["tweet"]], "tweet")[["tweet", "sentiment", "confidence"]])
+        done = start + len(chunk)
+        progress.progress(done / len(df), text=f"Scored {done:,} of {len(df):,} tweets")
+        # Re-rendering a large table on every chunk would slow the page down
+        if time.perf_counter() - last_render > 0.5:
+            table.dataframe(pd.concat(parts, ignore_index=True), use_container_width=True)
+            last_render = time.perf_counter()
+    progress.empty()
+    if not parts:
+        return pd.DataFrame(columns=["tweet", "sentiment", "confidence"])
+    return pd.concat(parts, ignore_index=True)
+
+
 def render_confidence_bar(score: float, color: str) -> None:
     """Render a confidence bar"""
     st.markdown(
@@ -172,42 +246,49 @@ def main() -> None:
     
     # Main interface
     if uploaded is not None:
-        try:
-            # Read CSV with proper handling of quoted fields and commas
-            # Use engine='python' for better compatibility with quoted fields containing commas
-            import io
-            # Reset file pointer to beginning
-            uploaded.seek(0)
-            # Try with on_bad_lines for newer pandas
-            try:
-                df = pd.read_csv(uploaded, quotechar='"', skipinitialspace=True, engine='python', on_bad_lines='skip')
-            except TypeError:
-                # Fallback for older pandas versions
-                df = pd.read_csv(uploaded, quotechar='"', skipinitialspace=True, engine='python')
-        except Exception as e:
-            st.error(f"Error reading CSV file: {str(e)}. Please ensure the CSV is properly formatted with a 'tweet' column.")
-            return
-        
-        if "tweet" not in df.columns:
-            st.error("CSV must have a 'tweet' column")
-            return
-        
+        file_bytes = uploaded.getvalue()
+        # Reruns (any widget interaction) reuse the results for the same file and model
+        cache_key = (hashlib.sha256(file_bytes).hexdigest(), analyzer.model_fingerprint)
+        store = batch_result_store()
+        cached = store.get(cache_key)
+
         st.subheader("Batch Analysis Results")
-        results = []
-        for idx, row in df.iterrows():
+        table = st.empty()
+        if cached is None:
             try:
-                result = analyzer.analyze(row["tweet"])
-                results.append({
-                    "tweet": row["tweet"],
-                    "sentiment": result.sentiment_label,
-                    "confidence": result.confidence,
-                })
+                df = read_upload(file_bytes)
             except Exception as e:
-                st.warning(f"Error processing row {idx}: {e}")
-        
-        results_df = pd.DataFrame(results)
-        st.dataframe(results_df, use_container_width=True)
-        
+                st.error(f"Error reading CSV file: {str(e)}. Please ensure the CSV is properly formatted with a 'tweet' column.")
+                return
+
+            if "tweet" not in df.columns:
+                st.error("CSV must have a 'tweet' column")
+                return
+
+            truncated = len(df) > MAX_BATCH_ROWS
+            df = df.iloc[:MAX_BATCH_ROWS]
+            scored = score_upload(df, table)
+            cached = {
+                "results": scored.dropna(subset=["sentiment"]).reset_index(drop=True),
+                "skipped": int(scored["sentiment"].isna().sum()),
+                "truncated": truncated,
+            }
+            store[cache_key] = cached
+            while len(store) > BATCH_CACHE_FILES:
+                store.popitem(last=False)
+        else:
+            store.move_to_end(cache_key)
+            st.caption("Showing cached results for this file.")
+
+        if cached["truncated"]:
+            st.warning(f"Only the first {MAX_BATCH_ROWS:,} rows were analyzed. Use `python -m app.inference.bulk_score` for larger files.")
+        if cached["skipped"]:
+            st.warning(f"Skipped {cached['skipped']} rows with an empty tweet.")
+        results_df = cached["results"]
+        table.dataframe(results_df, use_container_width=True)
+        if results_df.empty:
+            return
+
         # Summary
         st.subheader("Summary")
         col1, col2, col3 = st.columns(3)
@@ -236,7 +317,7 @@ def main() -> None:
                     
                     # Debug info (can be removed later)
                     with st.expander("🔍 Debug Info", expanded=False):
-                        st.write(f"Model: {'BERT' if analyzer.transformer_model else 'Baseline'}")
+                        st.write(f"Model: {'BERT' if analyzer.transformer_backend else 'Baseline'}")
                         st.write(f"Raw scores: {result.sentiment_scores}")
                         st.write(f"Predicted label: {result.sentiment_label}")
                     
@@ -0,0 +1,102 @@
+"""
+Shared fixtures: a tiny random BERT checkpoint and analyzers built on it.
+
+The checkpoint reuses the real tokenizer files from `checkpoints/bert-base/best/`
+with a randomly initialised 2-layer, 32-wide model, so the tests exercise the
+whole transformer path in seconds without the trained weights. Caches the
+code under test writes (dataset cache, compiled baseline, model registry) go
+to a temporary directory instead of `models/`.
+
+Usage:
+    python -m pytest -q
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+_PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(_PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(_PROJECT_ROOT))
+
+TOKENIZER_SOURCE = _PROJECT_ROOT / "checkpoints" / "bert-base" / "best"
+TINY_CONFIG = {"hidden_size": 32, "num_hidden_layers": 2, "num_attention_heads": 2, "intermediate_size": 64}
+
+_SCRATCH_DIR = Path(tempfile.mkdtemp(prefix="tweet-tests-"))
+
+
+def pytest_configure(config) -> None:
+    # Read when app.inference.dataset_cache is imported, so it is set before any test module loads
+    os.environ.setdefault("TWEET_DATASET_CACHE", str(_SCRATCH_DIR / "dataset_cache"))
+    os.environ.setdefault("TWEET_MODEL_REGISTRY", str(_SCRATCH_DIR / "registry"))
+
+
+def pytest_unconfigure(config) -> None:
+    shutil.rmtree(_SCRATCH_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def tiny_checkpoint(tmp_path_factory) -> Path:
+    """Directory with a random tiny BERT classifier (safetensors) and the real tokenizer."""
+    import torch
+    from transformers import BertConfig, BertForSequenceClassification
+
+    from app.inference.predictor import SENTIMENT_LABELS, TOKENIZER_FILES
+
+    if not (TOKENIZER_SOURCE / "vocab.txt").exists():
+        pytest.skip(f"tokenizer files missing from {TOKENIZER_SOURCE}")
+    checkpoint_dir = tmp_path_factory.mktemp("tiny-bert")
+    for name in TOKENIZER_FILES:
+        if (TOKENIZER_SOURCE / name).exists():
+            shutil.copy2(TOKENIZER_SOURCE / name, checkpoint_dir / name)
+    vocab_size = sum(1 for _ in open(checkpoint_dir / "vocab.txt", encoding="utf-8"))
+    torch.manual_seed(0)
+    config = BertConfig(vocab_size=vocab_size, num_labels=len(SENTIMENT_LABELS), **TINY_CONFIG)
+    BertForSequenceClassification(config).save_pretrained(checkpoint_dir, safe_serialization=True)
+    return checkpoint_dir
+
+
+@pytest.fixture(scope="session")
+def compiled_baseline_dir(tmp_path_factory) -> Path:
+    """Stands in for `models/baseline_compiled/` while the tests run."""
+    from app.inference import predictor
+
+    directory = tmp_path_factory.mktemp("baseline_compiled")
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(predictor, "COMPILED_BASELINE_DIR", directory)
+        yield directory
+
+
+@pytest.fixture(scope="session")
+def analyzer(tiny_checkpoint, compiled_baseline_dir):
+    """`TweetAnalyzer` serving the tiny BERT, with both result caches off."""
+    from app.inference.predictor import TweetAnalyzer
+
+    return TweetAnalyzer(
+        checkpoint_dir=tiny_checkpoint, model="auto", backend="torch", quantization="none",
+        cache_max_entries=0, near_dup_max_entries=0,
+    )
+
+
+@pytest.fixture(scope="session")
+def baseline_analyzer(compiled_baseline_dir):
+    """`TweetAnalyzer` serving the shipped TF-IDF baseline, with both result caches off."""
+    from app.inference.predictor import TweetAnalyzer
+
+    return TweetAnalyzer(model="baseline", cache_max_entries=0, near_dup_max_entries=0)
+
+
+@pytest.fixture(scope="session")
+def tiny_version(tiny_checkpoint, compiled_baseline_dir) -> str:
+    """Registry version holding the tiny BERT and the shipped baseline, made active."""
+    from app.inference import registry
+
+    entry = registry.register(tiny_checkpoint, name="tiny", note="test fixture")
+    registry.set_active(entry["version"])
+    return entry["version"]
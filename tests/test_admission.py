@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.backend.admission import AdmissionController, AdmissionRejected
+
+
+def test_admits_up_to_capacity_then_queues_then_rejects():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_waiting=1)
+        await controller.acquire(timeout=1.0)
+        waiter = asyncio.create_task(controller.acquire(timeout=1.0))
+        await asyncio.sleep(0)
+        assert controller.waiting == 1
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire(timeout=1.0)
+        assert rejected.value.status_code == 429 and rejected.value.retry_after >= 1
+        # The slot passes straight to the waiter
+        controller.release(service_seconds=0.01)
+        await waiter
+        assert (controller.in_flight, controller.waiting) == (1, 0)
+        controller.release()
+        assert controller.in_flight == 0
+        return controller.stats()
+
+    stats = asyncio.run(scenario())
+    assert (stats["admitted"], stats["rejected_queue_full"], stats["rejected_deadline"]) == (2, 1, 0)
+
+
+def test_waiter_past_its_deadline_gets_503():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_waiting=4)
+        await controller.acquire(timeout=1.0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire(timeout=0.01)
+        assert rejected.value.status_code == 503
+        assert controller.waiting == 0
+        # A timed-out waiter does not take the next free slot
+        controller.release()
+        assert controller.in_flight == 0
+        await controller.acquire(timeout=1.0)
+        return controller
+
+    controller = asyncio.run(scenario())
+    assert (controller.admitted, controller.rejected_deadline) == (2, 1)
+
+
+def test_rejects_bad_limits():
+    with pytest.raises(ValueError):
+        AdmissionController(max_in_flight=0, max_waiting=1)
+    with pytest.raises(ValueError):
+        AdmissionController(max_in_flight=1, max_waiting=-1)
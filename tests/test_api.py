@@ -0,0 +1,119 @@
+"""FastAPI endpoints, served from the tiny checkpoint through the model registry."""
+
+from __future__ import annotations
+
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="module")
+def api(tiny_version):
+    # Reads the registry's active version when imported
+    from app.backend import main
+
+    with TestClient(main.app) as client:
+        assert main.loader.wait(120), main.loader.status()
+        yield client, main
+
+
+def test_ready_and_health(api):
+    client, main = api
+    ready = client.get("/ready")
+    assert ready.status_code == 200
+    assert ready.json()["phase"] == "ready"
+    assert ready.json()["timings"]["load_seconds"] is not None
+    health = client.get("/health").json()
+    assert health["model_loaded"] is True and health["model_version"] == "tiny"
+
+
+def test_analyze(api):
+    client, main = api
+    response = client.post("/analyze", json={"tweet": "What a lovely day"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["sentiment"] in ("negative", "neutral", "positive")
+    assert sum(body["scores"].values()) == pytest.approx(1.0)
+    assert main.loader.status()["timings"]["first_inference_ms"] is not None
+
+
+def test_metrics(api):
+    client, main = api
+    from app.inference import metrics
+
+    scored = metrics.PREDICTIONS.value(model="transformer")
+    assert client.post("/analyze", json={"tweet": "metrics should count this one"}).status_code == 200
+    assert metrics.PREDICTIONS.value(model="transformer") == scored + 1
+    response = client.get("/metrics")
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/plain")
+    lines = response.text.splitlines()
+    assert "tweet_model_ready 1.0" in lines and "tweet_model_transformer_loaded 1.0" in lines
+    for stage in ("keyword_scan", "tokenize", "forward", "postprocess", "serialize"):
+        assert any(line.startswith(f'tweet_inference_stage_seconds_count{{stage="{stage}"}}') for line in lines)
+    assert any(
+        line.startswith('tweet_http_request_seconds_count{method="POST",path="/analyze",status="200"}')
+        for line in lines
+    )
+    assert any(line.startswith('tweet_requests_rejected_total{reason="queue_full"}') for line in lines)
+
+
+@pytest.mark.parametrize("max_waiting, status, reason", [(0, 429, "queue_full"), (4, 503, "deadline_waiting")])
+def test_analyze_rejects_when_saturated(api, monkeypatch, max_waiting, status, reason):
+    client, main = api
+    from app.backend.admission import AdmissionController
+
+    saturated = AdmissionController(1, max_waiting)
+    saturated.in_flight = 1
+    monkeypatch.setattr(main, "admission", saturated)
+    rejected = main.REJECTED.value(reason=reason)
+    response = client.post("/analyze", json={"tweet": "no room"}, headers={"X-Request-Timeout-Ms": "50"})
+    assert response.status_code == status and int(response.headers["Retry-After"]) >= 1
+    assert main.REJECTED.value(reason=reason) == rejected + 1
+    assert saturated.in_flight == 1 and saturated.waiting == 0
+
+
+def test_analyze_rejects_a_bad_timeout_header(api):
+    client, _ = api
+    response = client.post("/analyze", json={"tweet": "hi"}, headers={"X-Request-Timeout-Ms": "soon"})
+    assert response.status_code == 400
+
+
+def test_expired_deadline_is_not_scored(api):
+    client, main = api
+    expired = main.REJECTED.value(reason="deadline_queued")
+    response = client.post("/analyze", json={"tweet": "too late"}, headers={"X-Request-Timeout-Ms": "0"})
+    assert response.status_code == 503
+    assert main.REJECTED.value(reason="deadline_queued") == expired + 1
+    assert main.admission.in_flight == 0
+
+
+def test_admin_endpoints_need_the_token(api, monkeypatch):
+    client, main = api
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "")
+    assert client.get("/admin/models").status_code == 403
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+    assert client.get("/admin/models", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.post("/admin/models/activate", json={"version": "nope"}, headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 404
+
+
+def test_activate_swaps_the_served_version(api, monkeypatch):
+    client, main = api
+    from app.inference import registry
+    from app.inference.predictor import MODELS_DIR
+
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+    headers = {"Authorization": "Bearer secret"}
+    baseline_only = registry.register(None, baseline_dir=MODELS_DIR, name="baseline-only")["version"]
+    for version, transformer_loaded in ((baseline_only, False), ("tiny", True)):
+        response = client.post("/admin/models/activate", json={"version": version}, headers=headers)
+        assert response.status_code == 202 and response.json()["status"] == "loading"
+        deadline = time.monotonic() + 120
+        while client.get("/admin/models", headers=headers).json()["serving"] != version:
+            assert time.monotonic() < deadline and main.swap_loader.phase != "failed"
+            time.sleep(0.1)
+        assert registry.active_version() == version
+        assert client.get("/health").json()["model_version"] == version
+        assert (main.analyzer.transformer_backend is not None) == transformer_loaded
+        assert client.post("/analyze", json={"tweet": "still serving"}).status_code == 200
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.backend.batching import BatcherClosed, MicroBatcher
+
+
+class RecordingAnalyzer:
+    """Returns each text upper-cased and records the batches it was given."""
+
+    def __init__(self, delay: float = 0.0) -> None:
+        self.batches = []
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def analyze_batch(self, texts):
+        time.sleep(self.delay)
+        with self.lock:
+            self.batches.append(list(texts))
+        return [text.upper() for text in texts]
+
+
+def test_concurrent_requests_share_batches():
+    analyzer = RecordingAnalyzer()
+    batcher = MicroBatcher(analyzer, max_batch_size=4, max_wait_ms=50)
+    batcher.start()
+    try:
+        texts = [f"tweet {index}" for index in range(12)]
+        with ThreadPoolExecutor(max_workers=12) as pool:
+            results = list(pool.map(lambda text: batcher.analyze(text, timeout=5), texts))
+    finally:
+        batcher.stop()
+    assert results == [text.upper() for text in texts]
+    assert sorted(text for batch in analyzer.batches for text in batch) == sorted(texts)
+    assert max(len(batch) for batch in analyzer.batches) <= 4
+    assert len(analyzer.batches) < len(texts)
+    assert batcher.stats()["items"] == len(texts)
+
+
+def test_expired_items_are_not_scored():
+    analyzer = RecordingAnalyzer(delay=0.1)
+    batcher = MicroBatcher(analyzer, max_batch_size=1, max_wait_ms=0)
+    batcher.start()
+    try:
+        busy = batcher.submit("first")
+        late = batcher.submit("late", deadline=time.perf_counter() + 0.01)
+        assert busy.result(timeout=5) == "FIRST"
+        with pytest.raises(TimeoutError):
+            late.result(timeout=5)
+    finally:
+        batcher.stop()
+    assert analyzer.batches == [["first"]]
+    assert batcher.stats()["expired"] == 1
+
+
+def test_analyzer_errors_reach_every_caller():
+    class FailingAnalyzer:
+        def analyze_batch(self, texts):
+            raise RuntimeError("model failed")
+
+    batcher = MicroBatcher(FailingAnalyzer(), max_batch_size=8, max_wait_ms=20)
+    batcher.start()
+    try:
+        futures = [batcher.submit(f"tweet {index}") for index in range(3)]
+        for future in futures:
+            with pytest.raises(RuntimeError, match="model failed"):
+                future.result(timeout=5)
+    finally:
+        batcher.stop()
+
+
+def test_submit_validation_and_shutdown():
+    batcher = MicroBatcher(RecordingAnalyzer(), max_batch_size=2, max_wait_ms=1)
+    with pytest.raises(RuntimeError):
+        batcher.submit("not started")
+    batcher.start()
+    with pytest.raises(ValueError):
+        batcher.submit("   ")
+    pending = batcher.submit("queued before stop")
+    batcher.stop()
+    assert pending.result(timeout=5) == "QUEUED BEFORE STOP"
+    # BatcherClosed while stopping, "not started" once stopped; both are RuntimeErrors
+    with pytest.raises(RuntimeError):
+        batcher.submit("after stop")
+    assert issubclass(BatcherClosed, RuntimeError)
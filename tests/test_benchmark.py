@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import pandas as pd
+
+from app.inference.benchmark import KEY_COLUMNS, METRICS, find_regressions, run_backend
+
+
+def _row(backend: str, batch_size: int, **overrides) -> dict:
+    row = {"backend": backend, "dataset": "test_tweets", "batch_size": batch_size}
+    row.update({metric: 100.0 for metric in METRICS})
+    row.update(overrides)
+    return row
+
+
+def test_find_regressions_flags_slower_and_missing_rows():
+    reference = pd.DataFrame([_row("bert-torch", 1), _row("bert-torch", 8), _row("bert-onnx", 1)])
+    current = pd.DataFrame([
+        _row("bert-torch", 1, p95_ms=109.0, tweets_per_sec=95.0),
+        _row("bert-torch", 8, p99_ms=125.0, tweets_per_sec=80.0, peak_rss_mb=50.0),
+        # An extra configuration is not a regression
+        _row("baseline", 1),
+    ])
+    regressions = find_regressions(current, reference, max_regression=0.1)
+    flagged = {(row.backend, row.batch_size, row.metric) for row in regressions.itertuples()}
+    assert flagged == {
+        ("bert-torch", 8, "p99_ms"),
+        ("bert-torch", 8, "tweets_per_sec"),
+        ("bert-onnx", 1, "missing"),
+    }
+    p99 = regressions[regressions["metric"] == "p99_ms"].iloc[0]
+    assert (p99["reference"], p99["current"], p99["change"]) == (100.0, 125.0, 0.25)
+
+
+def test_identical_runs_have_no_regressions():
+    reference = pd.DataFrame([_row("baseline", 1), _row("baseline", 8)])
+    assert find_regressions(reference.copy(), reference, max_regression=0.0).empty
+
+
+def test_run_backend_reports_every_configuration(compiled_baseline_dir):
+    rows = run_backend("baseline", ["test_tweets"], [1, 4], passes=1, limit=8)
+    assert [(row["backend"], row["dataset"], row["batch_size"]) for row in rows] == [
+        ("baseline", "test_tweets", 1), ("baseline", "test_tweets", 4),
+    ]
+    assert all(row["tweets"] == 8 and row["tweets_per_sec"] > 0 for row in rows)
+    assert set(KEY_COLUMNS) | set(METRICS) <= set(rows[0])
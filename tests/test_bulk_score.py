@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import json
+
+import pandas as pd
+import pytest
+
+from app.inference.bulk_score import ProgressFile, bulk_score
+
+TWEETS = ["You are awful", "What a lovely day", "", "meh", "Just perfect.", "   ", "ok then", "fine", "see you"]
+
+
+class _Interrupted(Exception):
+    pass
+
+
+class _FailingAnalyzer:
+    """Scores ``chunks`` chunks with ``analyzer``, then fails like a killed run."""
+
+    def __init__(self, analyzer, chunks: int) -> None:
+        self.analyzer, self.chunks = analyzer, chunks
+
+    def analyze_batch(self, texts, batch_size=None):
+        if self.chunks == 0:
+            raise _Interrupted
+        self.chunks -= 1
+        return self.analyzer.analyze_batch(texts, batch_size=batch_size)
+
+
+@pytest.fixture
+def tweets_csv(tmp_path):
+    path = tmp_path / "tweets.csv"
+    pd.DataFrame({"id": range(len(TWEETS)), "tweet": TWEETS}).to_csv(path, index=False)
+    return path
+
+
+def test_interrupted_run_resumes_to_the_same_output(analyzer, tweets_csv, tmp_path):
+    expected = tmp_path / "expected.csv"
+    bulk_score(analyzer, tweets_csv, expected, chunk_size=3, batch_size=1)
+    output = tmp_path / "scored.csv"
+    with pytest.raises(_Interrupted):
+        bulk_score(_FailingAnalyzer(analyzer, chunks=2), tweets_csv, output, chunk_size=3, batch_size=1)
+    assert ProgressFile(output).load()["rows_done"] == 6
+    # Half a chunk written after the last checkpoint
+    with open(output, "a", encoding="utf-8") as handle:
+        handle.write("6,ok then,neg")
+    summary = bulk_score(analyzer, tweets_csv, output, chunk_size=3, batch_size=1)
+    assert (summary["rows_scored"], summary["rows_total"]) == (3, len(TWEETS))
+    assert output.read_bytes() == expected.read_bytes()
+    assert bulk_score(analyzer, tweets_csv, output, chunk_size=3)["rows_scored"] == 0
+
+
+def test_blank_rows_are_kept_unscored(analyzer, tweets_csv, tmp_path):
+    output = tmp_path / "scored.jsonl"
+    bulk_score(analyzer, tweets_csv, output, chunk_size=4)
+    records = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert [record["id"] for record in records] == list(range(len(TWEETS)))
+    blank = [record["sentiment"] is None for record in records]
+    assert blank == [not tweet.strip() for tweet in TWEETS]
+    assert all(record["score_negative"] is None for record, empty in zip(records, blank) if empty)
+
+
+def test_progress_of_another_input_is_refused(analyzer, tweets_csv, tmp_path):
+    output = tmp_path / "scored.csv"
+    bulk_score(analyzer, tweets_csv, output, chunk_size=4)
+    tweets_csv.write_text("tweet\nsomething else\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="different input"):
+        bulk_score(analyzer, tweets_csv, output)
+    assert bulk_score(analyzer, tweets_csv, output, restart=True)["rows_total"] == 1
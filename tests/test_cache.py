@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import pytest
+
+from app.inference import cache
+from app.inference.cache import NearDuplicateIndex, ResultCache, normalize_text
+
+
+def test_result_cache_evicts_least_recently_used():
+    results = ResultCache(max_entries=2)
+    results.put("a", 1)
+    results.put("b", 2)
+    assert results.get("a") == 1
+    results.put("c", 3)
+    assert results.get("b") is None
+    assert results.get("a") == 1 and results.get("c") == 3
+    stats = results.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"], stats["evictions"]) == (2, 3, 1, 1)
+
+
+def test_result_cache_memory_budget():
+    results = ResultCache(max_entries=100, max_bytes=2000)
+    for index in range(50):
+        results.put(index, "x" * 100)
+    assert 0 < len(results) < 50
+    assert results.stats()["bytes"] <= 2000
+    # An entry larger than the whole budget is not stored
+    results.put("huge", "x" * 5000)
+    assert results.get("huge") is None
+
+
+def test_result_cache_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    results = ResultCache(max_entries=10, ttl_seconds=5)
+    results.put("a", 1)
+    now[0] += 4
+    assert results.get("a") == 1
+    now[0] += 2
+    assert results.get("a") is None
+    assert results.stats()["expirations"] == 1 and len(results) == 0
+
+
+def test_result_cache_rejects_bad_bounds():
+    with pytest.raises(ValueError):
+        ResultCache(max_entries=0)
+    with pytest.raises(ValueError):
+        ResultCache(max_bytes=0)
+
+
+def test_normalize_text():
+    assert normalize_text("  Hello\n\tWORLD  ") == "hello world"
+
+
+def test_near_duplicates_ignore_mentions_urls_and_hashtags():
+    index = NearDuplicateIndex(max_entries=10)
+    tweet = "the service at this place was slow and the food was cold again"
+    index.put(index.probe(f"@alice {tweet} https://t.co/abc #fail"), "stored")
+    assert index.get(index.probe(f"@bob {tweet} http://bit.ly/xyz #nope")) == "stored"
+    assert index.get(index.probe("completely different words about a sunny beach holiday trip")) is None
+    assert (index.hits, index.misses) == (1, 1)
+
+
+def test_near_duplicates_keyed_on_keyword_hits():
+    index = NearDuplicateIndex(max_entries=10)
+    tweet = "what a day this has been for all of us here"
+    index.put(index.probe(tweet, b"\x00"), "stored")
+    assert index.get(index.probe(tweet, b"\x01")) is None
+    assert index.get(index.probe(tweet, b"\x00")) == "stored"
+
+
+def test_near_duplicates_skip_short_tweets_and_evict():
+    index = NearDuplicateIndex(max_entries=2)
+    assert index.probe("ok") is None
+    texts = [f"tweet number {word} about something else entirely" for word in ("one", "two", "three")]
+    for text in texts:
+        index.put(index.probe(text), text)
+    assert len(index) == 2 and index.evictions == 1
+    assert index.get(index.probe(texts[2])) == texts[2]
+    with pytest.raises(ValueError):
+        NearDuplicateIndex(threshold=0)
+
+
+def test_analyzer_reuses_results_for_near_copies(tiny_checkpoint, compiled_baseline_dir):
+    from app.inference.predictor import TweetAnalyzer
+
+    analyzer = TweetAnalyzer(checkpoint_dir=tiny_checkpoint, cache_max_entries=0, near_dup_max_entries=16)
+    tweet = "the service at this place was slow and the food was cold again"
+    other = "completely different words about a sunny beach holiday trip"
+    # The second copy in the batch follows the first instead of being scored
+    first, follower, fresh = analyzer.analyze_batch([f"@alice {tweet} #fail", f"{tweet} https://t.co/abc", other])
+    assert follower == first and fresh != first
+    assert analyzer.analyze_batch([f"@bob {tweet} http://bit.ly/xyz"]) == [first]
+    stats = analyzer.near_duplicate_stats()
+    assert (stats["entries"], stats["hits"]) == (2, 1)
+    assert analyzer.cache_stats() is None
+
+
+def test_analyzer_serves_repeats_from_the_result_cache(tiny_checkpoint, compiled_baseline_dir):
+    from app.inference.predictor import TweetAnalyzer
+
+    analyzer = TweetAnalyzer(checkpoint_dir=tiny_checkpoint, cache_max_entries=16, near_dup_max_entries=0)
+    first = analyzer.analyze_batch(["You are awful", "What a lovely day"])
+    # Case and whitespace variants share the entry
+    assert analyzer.analyze_batch(["  you ARE awful ", "What a lovely day", "meh"])[:2] == first
+    assert analyzer.analyze("What a lovely day") == first[1]
+    stats = analyzer.cache_stats()
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (3, 3, 3)
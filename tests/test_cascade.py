@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from app.inference import metrics, postprocess
+from app.inference.cascade import recommend, score_both, sweep
+from app.inference.predictor import TweetAnalyzer
+
+TEXTS = [
+    "You are awful", "What a lovely day", "meh", "Just perfect.", "I hate this so much",
+    "Oh wonderful, another day of dealing with this nonsense.", "thanks, see you tomorrow", "ok",
+]
+
+
+def _cascade(tiny_checkpoint, threshold: float) -> TweetAnalyzer:
+    return TweetAnalyzer(
+        checkpoint_dir=tiny_checkpoint, model="cascade", cascade_gate="confidence", cascade_threshold=threshold,
+        cache_max_entries=0, near_dup_max_entries=0,
+    )
+
+
+def test_zero_threshold_serves_everything_from_the_baseline(tiny_checkpoint, baseline_analyzer):
+    cascade = _cascade(tiny_checkpoint, 0.0)
+    assert cascade.primary_model == "cascade"
+    transformer = metrics.PREDICTIONS.value(model="transformer")
+    assert cascade.analyze_batch(TEXTS) == baseline_analyzer.analyze_batch(TEXTS)
+    assert metrics.PREDICTIONS.value(model="transformer") == transformer
+
+
+def test_uncertain_tweets_are_escalated_to_bert(tiny_checkpoint, analyzer, baseline_analyzer):
+    hits = postprocess.keyword_hits(TEXTS)
+    certainty = postprocess.gate_values(baseline_analyzer._predict_baseline_batch(TEXTS, hits), "confidence")
+    threshold = float(np.median(certainty))
+    escalate = certainty < threshold
+    assert 0 < escalate.sum() < len(TEXTS)
+
+    transformer = metrics.PREDICTIONS.value(model="transformer")
+    results = _cascade(tiny_checkpoint, threshold).analyze_batch(TEXTS, batch_size=1)
+    assert metrics.PREDICTIONS.value(model="transformer") == transformer + escalate.sum()
+    bert = analyzer.analyze_batch(TEXTS, batch_size=1)
+    baseline = baseline_analyzer.analyze_batch(TEXTS)
+    assert results == [bert[i] if escalate[i] else baseline[i] for i in range(len(TEXTS))]
+
+
+def test_sweep_brackets_baseline_and_bert(analyzer):
+    scored = score_both(analyzer, TEXTS, batch_size=4)
+    labels = np.array([-1, 1, 0, -1, -1, -1, 1, 0])
+    report = sweep(scored, labels, thresholds=[0.0, 0.5])
+    assert report["escalation_rate"].tolist()[0] == 0.0 and report["escalation_rate"].tolist()[-1] == 1.0
+    assert report["f1_delta_vs_bert"].iloc[-1] == 0.0
+    assert recommend(report, max_f1_drop=1.0)["threshold"] == 0.0
+    with pytest.raises(ValueError, match="gate"):
+        sweep(scored, labels, gate="entropy")
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import json
+import shutil
+
+import joblib
+import numpy as np
+import pytest
+
+from app.inference.compiled_baseline import compiled_dir, load_or_compile, max_difference
+from app.inference.data import load_dataset
+from app.inference.predictor import BASELINE_MODEL_PATH, BASELINE_VECTORIZER_PATH
+
+SOURCES = (BASELINE_MODEL_PATH, BASELINE_VECTORIZER_PATH)
+
+
+@pytest.fixture(scope="module")
+def pipeline():
+    if not all(path.exists() for path in SOURCES):
+        pytest.skip("baseline joblib files missing from models/")
+    return joblib.load(BASELINE_VECTORIZER_PATH), joblib.load(BASELINE_MODEL_PATH)
+
+
+@pytest.fixture(scope="module")
+def tweets():
+    return load_dataset()["review"].fillna("").astype(str).tolist()[:3000]
+
+
+def test_compiled_scores_match_sklearn(tmp_path, pipeline, tweets):
+    vectorizer, model = pipeline
+    compiled = load_or_compile(tmp_path, *SOURCES)
+    assert compiled is not None
+    assert compiled.directory == compiled_dir(tmp_path, SOURCES)
+    assert list(compiled.classes_) == list(model.classes_)
+    assert max_difference(compiled, vectorizer, model, tweets + ["", "!!!", "ok"]) == 0.0
+
+
+def test_compiled_baseline_is_reused(tmp_path, pipeline, capsys):
+    load_or_compile(tmp_path, *SOURCES)
+    assert "Compiled the baseline" in capsys.readouterr().out
+    again = load_or_compile(tmp_path, *SOURCES)
+    assert again is not None and "Compiled the baseline" not in capsys.readouterr().out
+    assert [path.name for path in tmp_path.iterdir()] == [again.directory.name]
+
+
+@pytest.mark.parametrize("damage", ["missing_array", "old_format"])
+def test_broken_compiled_directory_is_replaced(tmp_path, pipeline, capsys, damage):
+    directory = load_or_compile(tmp_path, *SOURCES).directory
+    if damage == "missing_array":
+        (directory / "terms.npy").unlink()
+    else:
+        meta = json.loads((directory / "meta.json").read_text())
+        (directory / "meta.json").write_text(json.dumps({**meta, "format_version": 0}))
+    capsys.readouterr()
+    repaired = load_or_compile(tmp_path, *SOURCES)
+    assert repaired is not None and repaired.directory == directory
+    assert "Compiled the baseline" in capsys.readouterr().out
+    assert load_or_compile(tmp_path, *SOURCES) is not None
+    assert "Compiled the baseline" not in capsys.readouterr().out
+    assert [path.name for path in tmp_path.iterdir()] == [directory.name]
+
+
+def test_compiled_baseline_is_keyed_on_joblib_contents(tmp_path, pipeline):
+    vectorizer, model = pipeline
+    copies = tmp_path / "copies"
+    copies.mkdir()
+    shutil.copy2(BASELINE_VECTORIZER_PATH, copies / BASELINE_VECTORIZER_PATH.name)
+    # Same model, different bytes on disk
+    joblib.dump(model, copies / BASELINE_MODEL_PATH.name, compress=3)
+    copied_sources = (copies / BASELINE_MODEL_PATH.name, copies / BASELINE_VECTORIZER_PATH.name)
+    assert compiled_dir(tmp_path, copied_sources) != compiled_dir(tmp_path, SOURCES)
+    assert load_or_compile(tmp_path / "cache", *copied_sources) is not None
+
+
+def test_missing_joblib_files_fall_back(tmp_path):
+    assert load_or_compile(tmp_path, tmp_path / "missing.joblib", BASELINE_VECTORIZER_PATH) is None
+    assert not any(tmp_path.iterdir())
+
+
+def test_analyzer_serves_compiled_baseline(baseline_analyzer, compiled_baseline_dir, pipeline):
+    vectorizer, model = pipeline
+    assert type(baseline_analyzer.baseline_pipeline[0]).__name__ == "CompiledBaseline"
+    assert any(compiled_baseline_dir.iterdir())
+    texts = ["You are awful", "What a lovely day", "meh"]
+    expected = model.predict_proba(vectorizer.transform(texts))
+    compiled = baseline_analyzer.baseline_pipeline[0]
+    assert np.array_equal(compiled.predict_proba(compiled.transform(texts)), expected)
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from app.inference import dataset_cache, postprocess
+from app.inference.backends import iter_length_buckets
+from app.inference.data import load_split
+from app.inference.predictor import SENTIMENT_LABELS, TRANSFORMER_MAX_LENGTH
+
+
+@pytest.fixture(scope="module")
+def cache(tiny_checkpoint, tmp_path_factory):
+    data_dir = dataset_cache.build_data(cache_dir=tmp_path_factory.mktemp("dataset_cache"))
+    dataset_cache.build_tokens(data_dir, tiny_checkpoint)
+    return dataset_cache.DatasetCache(data_dir, tiny_checkpoint)
+
+
+def test_splits_match_the_csv_path(cache):
+    for name in ("train", "val", "test"):
+        texts, labels = cache.split(name)
+        expected_texts, expected_labels = load_split(name)
+        assert texts == expected_texts
+        assert np.array_equal(labels, expected_labels)
+
+
+def test_rebuilding_is_a_no_op(cache, tiny_checkpoint):
+    created = cache.meta["created"]
+    assert dataset_cache.build_data(cache_dir=cache.directory.parent) == cache.directory
+    assert dataset_cache.DatasetCache(cache.directory, tiny_checkpoint).meta["created"] == created
+
+
+def test_buckets_match_the_tokenizer_path(cache, analyzer):
+    rows = cache.split_rows("val")[:300]
+    expected = list(iter_length_buckets(analyzer.transformer_tokenizer, cache.texts(rows), 16, TRANSFORMER_MAX_LENGTH))
+    actual = list(cache.iter_length_buckets(rows, 16))
+    assert len(actual) == len(expected)
+    for (positions, arrays), (expected_positions, expected_arrays) in zip(actual, expected):
+        assert np.array_equal(positions, expected_positions)
+        assert arrays.keys() == expected_arrays.keys()
+        for name, values in arrays.items():
+            assert np.array_equal(values, expected_arrays[name]), name
+
+
+def test_cached_logits_equal_analyze_batch(cache, analyzer):
+    rows = cache.split_rows("test")[:300]
+    texts = cache.texts(rows)
+    logits = dataset_cache.transformer_logits(analyzer, cache, rows, 16)
+    assert np.array_equal(logits, analyzer._transformer_logits(texts, 16))
+    # The analyzer's labels are the post-processed logits
+    hits = postprocess.keyword_hits(texts, analyzer.postprocess)
+    scores = postprocess.transformer_scores(logits, hits, analyzer.postprocess)
+    labels, _ = postprocess.decide(scores, hits, analyzer.postprocess)
+    results = analyzer.analyze_batch(texts, batch_size=16)
+    assert [SENTIMENT_LABELS[label] for label in labels] == [result.sentiment_label for result in results]
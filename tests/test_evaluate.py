@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+from sklearn.metrics import accuracy_score, confusion_matrix as sk_confusion_matrix
+from sklearn.metrics import precision_recall_fscore_support
+
+from app.inference.evaluate import confusion_matrix, label_metrics
+
+LABELS = [-1, 0, 1]
+
+
+def _sklearn_metrics(labels, predictions):
+    precision, recall, f1, _ = precision_recall_fscore_support(
+        labels, predictions, labels=LABELS, average="macro", zero_division=0
+    )
+    return {
+        "accuracy": accuracy_score(labels, predictions),
+        "precision_macro": precision,
+        "recall_macro": recall,
+        "f1_macro": f1,
+    }
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_label_metrics_match_sklearn(seed):
+    rng = np.random.default_rng(seed)
+    labels = rng.choice(LABELS, size=500)
+    # Mostly right, so the scores are not all near chance
+    predictions = np.where(rng.random(500) < 0.6, labels, rng.choice(LABELS, size=500))
+    assert label_metrics(labels, predictions) == pytest.approx(_sklearn_metrics(labels, predictions), abs=1e-12)
+    assert np.array_equal(confusion_matrix(labels, predictions), sk_confusion_matrix(labels, predictions, labels=LABELS))
+
+
+def test_label_metrics_with_missing_classes():
+    labels = np.array([-1, -1, 0, 0, 0])
+    predictions = np.array([-1, 0, 0, 0, -1])
+    # Class 1 is neither present nor predicted; it scores 0 like sklearn's zero_division=0
+    assert label_metrics(labels, predictions) == pytest.approx(_sklearn_metrics(labels, predictions), abs=1e-12)
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import json
+import shutil
+
+import numpy as np
+import pytest
+
+from app.inference import logit_store
+from app.inference.predictor import SENTIMENT_LABELS
+from app.inference.tuning import ReplayEngine
+
+
+@pytest.fixture(scope="module")
+def store(analyzer, tmp_path_factory):
+    store_dir = tmp_path_factory.mktemp("logit_store")
+    directory = logit_store.compute(analyzer, store_dir=store_dir)
+    return directory.name, store_dir
+
+
+def test_store_holds_the_analyzers_logits(analyzer, store):
+    key, store_dir = store
+    assert key == logit_store.store_key(analyzer) and key.endswith("-bert-torch")
+    assert [meta["key"] for meta in logit_store.list_stores(store_dir)] == [key]
+    texts = logit_store.source_texts("ground_truth")
+    logits = logit_store.load(key, "ground_truth", store_dir)
+    assert logits.shape == (len(texts), len(SENTIMENT_LABELS))
+    blank = np.array([text is None for text in texts])
+    assert np.isnan(logits[blank]).all() and not np.isnan(logits[~blank]).any()
+    rows = np.flatnonzero(~blank)[:64]
+    expected = analyzer._transformer_logits([texts[row] for row in rows], analyzer.batch_size)
+    np.testing.assert_allclose(logits[rows], expected, rtol=0, atol=1e-5)
+
+
+def test_interrupted_store_resumes_at_the_missing_rows(analyzer, store, tmp_path, capsys):
+    key, store_dir = store
+    shutil.copytree(store_dir / key, tmp_path / key)
+    logits = np.load(tmp_path / key / "ground_truth.npy", mmap_mode="r+")
+    expected = np.array(logits)
+    logits[100:110] = np.nan
+    logits.flush()
+    del logits
+    meta = json.loads((tmp_path / key / "meta.json").read_text())
+    meta["sources"]["ground_truth"]["complete"] = False
+    (tmp_path / key / "meta.json").write_text(json.dumps(meta))
+    with pytest.raises(FileNotFoundError):
+        logit_store.load(key, "ground_truth", tmp_path)
+
+    capsys.readouterr()
+    logit_store.compute(analyzer, sources=["ground_truth"], store_dir=tmp_path)
+    assert "10 to score" in capsys.readouterr().out
+    np.testing.assert_allclose(logit_store.load(key, "ground_truth", tmp_path), expected, rtol=0, atol=1e-5)
+
+
+def test_replay_matches_the_analyzers_labels(analyzer, store):
+    key, store_dir = store
+    engine = ReplayEngine(key, store_dir)
+    assert set(engine.sets) == {"val", "test", "ground_truth"}
+    replay_set = engine.sets["ground_truth"]
+    predictions = replay_set.predict(analyzer.postprocess)
+    labels = [SENTIMENT_LABELS.index(result.sentiment_label) - 1 for result in analyzer.analyze_batch(replay_set.texts)]
+    assert predictions.tolist() == labels
+    report = engine.evaluate(analyzer.postprocess)
+    assert all(row["rows"] == len(engine.sets[name]) for name, row in report.items())
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import shutil
+
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+
+from app.inference.autotune import engine_name
+from app.inference.backends import ONNX_MODEL_NAME
+from app.inference.export_onnx import export_onnx, parity_check
+from app.inference.predictor import TweetAnalyzer
+
+TEXTS = ["You are awful", "What a lovely day", "meh", " ".join(["a much longer tweet"] * 30)]
+
+
+@pytest.fixture(scope="module")
+def onnx_checkpoint(tiny_checkpoint, tmp_path_factory):
+    checkpoint_dir = tmp_path_factory.mktemp("tiny-onnx") / "checkpoint"
+    shutil.copytree(tiny_checkpoint, checkpoint_dir)
+    export_onnx(checkpoint_dir, checkpoint_dir / ONNX_MODEL_NAME)
+    return checkpoint_dir
+
+
+def test_exported_graph_matches_torch(onnx_checkpoint):
+    assert parity_check(onnx_checkpoint, onnx_checkpoint / ONNX_MODEL_NAME, TEXTS, batch_size=2) <= 1e-4
+
+
+def test_onnx_backend_serves_the_analyzer(onnx_checkpoint, compiled_baseline_dir, analyzer):
+    onnx = TweetAnalyzer(checkpoint_dir=onnx_checkpoint, backend="onnx", cache_max_entries=0, near_dup_max_entries=0)
+    assert engine_name(onnx) == "bert-onnx" and onnx.transformer_model is None
+    expected, actual = analyzer.analyze_batch(TEXTS), onnx.analyze_batch(TEXTS)
+    assert [result.sentiment_label for result in actual] == [result.sentiment_label for result in expected]
+    np.testing.assert_allclose(
+        [list(result.sentiment_scores.values()) for result in actual],
+        [list(result.sentiment_scores.values()) for result in expected],
+        rtol=0, atol=1e-5,
+    )
+
+
+def test_missing_onnx_graph_falls_back_to_torch(tiny_checkpoint, compiled_baseline_dir):
+    fallback = TweetAnalyzer(checkpoint_dir=tiny_checkpoint, backend="onnx", cache_max_entries=0, near_dup_max_entries=0)
+    assert engine_name(fallback) == "bert-torch"
@@ -0,0 +1,161 @@
+"""The vectorized rules against the per-tweet rules they replaced, bit for bit."""
+
+from __future__ import annotations
+
+import numpy as np
+import pytest
+import torch
+
+from app.inference import postprocess
+from app.inference.postprocess import KeywordMatcher
+
+SARCASM = [
+    ("wonderful", ["nonsense", "dealing", "another day"]),
+    ("perfect", ["nonsense", "dealing", "another day", "just"]),
+    ("great", ["nonsense", "dealing", "another day"]),
+    ("amazing", ["nonsense", "dealing", "another day"]),
+]
+DECISION_SARCASM = [("wonderful", ["nonsense", "dealing", "another day", "perfect"])] + SARCASM[1:]
+TEXTS = [
+    "Oh wonderful, another day of dealing with this nonsense.",
+    "Just perfect.",
+    "wonderful and perfect",
+    "Great news, amazing people",
+    "GREAT. Dealing with it.",
+    "nothing to see here",
+    "amazinganother day",
+]
+
+
+def _sarcastic(text: str, lexicon) -> bool:
+    text_lower = text.lower()
+    return any(word in text_lower and any(ctx in text_lower for ctx in contexts) for word, contexts in lexicon)
+
+
+def reference_transformer(logits: np.ndarray, text: str) -> np.ndarray:
+    """The original `_predict_transformer` rules for one tweet."""
+    probs = torch.softmax(torch.tensor(logits / 0.7), dim=-1).numpy()
+    neutral_prob, negative_prob, positive_prob = probs[1], probs[0], probs[2]
+    max_non_neutral = max(negative_prob, positive_prob)
+    if _sarcastic(text, SARCASM) and positive_prob > 0.5:
+        reduction = min(0.15, positive_prob - 0.3)
+        positive_prob = max(0.0, positive_prob - reduction)
+        negative_prob += reduction * 0.8
+        neutral_prob += reduction * 0.2
+        probs = np.array([negative_prob, neutral_prob, positive_prob])
+        total = sum(probs)
+        if total > 0:
+            probs = probs / total
+    elif neutral_prob > 0.35 and neutral_prob < 0.6 and max_non_neutral > 0.25:
+        reduction = 0.08 if neutral_prob > 0.5 else 0.12
+        probs[1] = max(0.0, neutral_prob - reduction)
+        if negative_prob > positive_prob:
+            probs[0] += reduction * 0.7
+            probs[2] += reduction * 0.3
+        else:
+            probs[2] += reduction * 0.7
+            probs[0] += reduction * 0.3
+        total = sum(probs)
+        if total > 0:
+            probs = probs / total
+    return np.array([float(value) for value in probs])
+
+
+def reference_baseline(probs: np.ndarray, text: str) -> np.ndarray:
+    """The original `_predict_baseline` rules for one tweet (classes -1, 0, 1 in order)."""
+    neg_prob, neutral_prob, pos_prob = (float(value) for value in probs)
+    max_non_neutral = max(neg_prob, pos_prob)
+    if _sarcastic(text, SARCASM) and pos_prob > 0.4:
+        reduction = min(0.15, pos_prob - 0.25)
+        pos_prob = max(0.0, pos_prob - reduction)
+        neg_prob += reduction * 0.8
+        neutral_prob += reduction * 0.2
+    elif neutral_prob > 0.35 and neutral_prob < 0.6 and max_non_neutral > 0.25:
+        reduction = 0.08 if neutral_prob > 0.5 else 0.12
+        neutral_prob = max(0.0, neutral_prob - reduction)
+        if neg_prob > pos_prob:
+            neg_prob += reduction * 0.7
+            pos_prob += reduction * 0.3
+        else:
+            pos_prob += reduction * 0.7
+            neg_prob += reduction * 0.3
+    total = neg_prob + neutral_prob + pos_prob
+    if total > 0:
+        neg_prob, neutral_prob, pos_prob = neg_prob / total, neutral_prob / total, pos_prob / total
+    return np.array([neg_prob, neutral_prob, pos_prob])
+
+
+def reference_decide(scores: np.ndarray, text: str):
+    """The original label decision of `analyze` for one tweet."""
+    raw = dict(zip(("negative", "neutral", "positive"), (float(value) for value in scores)))
+    negative_score, neutral_score, positive_score = raw["negative"], raw["neutral"], raw["positive"]
+    max_non_neutral = max(negative_score, positive_score)
+    if _sarcastic(text, DECISION_SARCASM) and positive_score > 0.4:
+        return "negative", negative_score if negative_score > 0.3 else max(negative_score, 0.4)
+    if (neutral_score == max(raw.values()) and neutral_score < 0.6 and max_non_neutral > 0.3
+            and abs(neutral_score - max_non_neutral) < 0.15):
+        if negative_score > positive_score or (negative_score > 0.25 and positive_score < 0.4):
+            return "negative", negative_score
+        return "positive", positive_score
+    label = max(raw, key=raw.get)
+    return label, raw[label]
+
+
+@pytest.fixture(scope="module")
+def batch():
+    rng = np.random.default_rng(0)
+    texts = [TEXTS[index] for index in rng.integers(0, len(TEXTS), size=3000)]
+    # Small logits keep many rows in the neutral-bias band; large ones exercise the sarcasm rule
+    logits = (rng.normal(size=(len(texts), 3)) * rng.choice([0.3, 1.0, 4.0], size=(len(texts), 1)))
+    probs = rng.dirichlet([1.0, 1.0, 1.0], size=len(texts))
+    return texts, logits.astype(np.float32), probs
+
+
+def test_transformer_scores_match_scalar_rules(batch):
+    texts, logits, _ = batch
+    scores = postprocess.transformer_scores(logits, postprocess.keyword_hits(texts))
+    expected = np.stack([reference_transformer(row, text) for row, text in zip(logits, texts)])
+    assert np.array_equal(scores.astype(np.float64), expected)
+
+
+def test_baseline_scores_match_scalar_rules(batch):
+    texts, _, probs = batch
+    scores = postprocess.baseline_scores(probs, [-1, 0, 1], postprocess.keyword_hits(texts))
+    expected = np.stack([reference_baseline(row, text) for row, text in zip(probs, texts)])
+    assert np.array_equal(scores, expected)
+
+
+def test_baseline_scores_reorder_classes(batch):
+    texts, _, probs = batch
+    hits = postprocess.keyword_hits(texts)
+    shuffled = postprocess.baseline_scores(probs[:, [2, 0, 1]], [1, -1, 0], hits)
+    assert np.array_equal(shuffled, postprocess.baseline_scores(probs, [-1, 0, 1], hits))
+
+
+def test_decide_matches_scalar_rules(batch):
+    texts, logits, probs = batch
+    hits = postprocess.keyword_hits(texts)
+    for scores in (postprocess.transformer_scores(logits, hits), postprocess.baseline_scores(probs, [-1, 0, 1], hits)):
+        labels, confidence = postprocess.decide(scores, hits)
+        expected = [reference_decide(row, text) for row, text in zip(scores, texts)]
+        assert [("negative", "neutral", "positive")[label] for label in labels] == [label for label, _ in expected]
+        assert confidence.tolist() == [value for _, value in expected]
+
+
+def test_keyword_matcher_matches_substring_checks():
+    keywords = ["he", "hell", "hello", "lo", "another day", "o"]
+    texts = ["HELLO world", "shell", "", "another  day", "Another day!", "lo and behold", "xyz"]
+    matcher = KeywordMatcher(keywords)
+    hits = matcher.hits(texts)
+    expected = np.array([[word in text.lower() for word in matcher.keywords] for text in texts])
+    assert np.array_equal(hits, expected)
+
+
+def test_postprocess_config_round_trip(tmp_path):
+    config = postprocess.DEFAULT_POSTPROCESS.replace(temperature=0.9)
+    config.save(tmp_path / "postprocess.json")
+    loaded = postprocess.PostProcess.load(tmp_path / "postprocess.json")
+    assert loaded == config
+    assert loaded.fingerprint() != postprocess.DEFAULT_POSTPROCESS.fingerprint()
+    with pytest.raises(ValueError, match="Unknown"):
+        postprocess.PostProcess.from_dict({"temprature": 1.0})
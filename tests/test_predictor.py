@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+TEXTS = pd.read_csv(Path(__file__).resolve().parents[1] / "test_tweets.csv")["tweet"].tolist() + [
+    "ok",
+    "Oh wonderful, another day of dealing with this nonsense. Just perfect...",
+    "   padded   with   spaces   ",
+    " ".join(["very long tweet"] * 60),
+]
+
+
+def _scores(results) -> np.ndarray:
+    return np.array([list(result.sentiment_scores.values()) for result in results])
+
+
+def test_analyze_batch_matches_analyze(analyzer):
+    assert analyzer.primary_model == "transformer"
+    single = [analyzer.analyze(text) for text in TEXTS]
+    batched = analyzer.analyze_batch(TEXTS, batch_size=4)
+    # Padding inside a bucket may change the last float32 bit of a logit
+    np.testing.assert_allclose(_scores(batched), _scores(single), rtol=0, atol=1e-6)
+    assert [result.sentiment_label for result in batched] == [result.sentiment_label for result in single]
+
+
+def test_analyze_batch_of_one_is_exact(analyzer):
+    single = [analyzer.analyze(text) for text in TEXTS]
+    assert analyzer.analyze_batch(TEXTS, batch_size=1) == single
+
+
+def test_analyze_batch_keeps_input_order(analyzer):
+    forward = analyzer.analyze_batch(TEXTS, batch_size=8)
+    backward = analyzer.analyze_batch(TEXTS[::-1], batch_size=8)
+    np.testing.assert_allclose(_scores(backward[::-1]), _scores(forward), rtol=0, atol=1e-6)
+
+
+def test_baseline_batch_matches_analyze(baseline_analyzer):
+    assert baseline_analyzer.primary_model == "baseline"
+    single = [baseline_analyzer.analyze(text) for text in TEXTS]
+    assert baseline_analyzer.analyze_batch(TEXTS) == single
+
+
+def test_analyze_batch_rejects_empty_text(analyzer):
+    assert analyzer.analyze_batch([]) == []
+    with pytest.raises(ValueError, match="position 1"):
+        analyzer.analyze_batch(["fine", "   "])
+    with pytest.raises(ValueError):
+        analyzer.analyze_batch(["fine"], batch_size=0)
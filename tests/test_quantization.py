@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import shutil
+
+import numpy as np
+import pytest
+import torch
+
+from app.inference import logit_store, quantization
+from app.inference.autotune import engine_name
+from app.inference.predictor import TweetAnalyzer
+
+TEXTS = ["You are awful", "What a lovely day", "meh, nothing special today", "I love this so much"]
+
+
+@pytest.fixture(scope="module")
+def quantized_only(tiny_checkpoint, tmp_path_factory):
+    """Copy of the tiny checkpoint holding only INT8 weights."""
+    directory = tmp_path_factory.mktemp("tiny-int8")
+    for path in tiny_checkpoint.iterdir():
+        if path.name != "model.safetensors":
+            shutil.copy2(path, directory / path.name)
+    quantization.export_quantized(tiny_checkpoint, directory / "pytorch_model_quantized.bin")
+    return directory
+
+
+def _int8_layers(model) -> int:
+    return sum(isinstance(module, torch.ao.nn.quantized.dynamic.Linear) for module in model.modules())
+
+
+def test_dynamic_mode_quantizes_float_checkpoint(tiny_checkpoint, compiled_baseline_dir, analyzer):
+    int8 = TweetAnalyzer(checkpoint_dir=tiny_checkpoint, quantization="dynamic",
+                         cache_max_entries=0, near_dup_max_entries=0)
+    assert int8.quantization == "dynamic" and int8.device.type == "cpu"
+    assert _int8_layers(int8.transformer_model) > 0
+    assert int8.analyze_batch(TEXTS)
+    assert logit_store.store_key(int8) != logit_store.store_key(analyzer)
+    assert engine_name(int8) == engine_name(int8, loaded=False) == "bert-torch-int8"
+
+
+def test_quantized_only_checkpoint_is_served_as_int8(quantized_only, compiled_baseline_dir):
+    int8 = TweetAnalyzer(checkpoint_dir=quantized_only, quantization="none",
+                         cache_max_entries=0, near_dup_max_entries=0)
+    assert int8.quantization == "dynamic" and int8.device.type == "cpu"
+    assert int8.primary_model == "transformer" and _int8_layers(int8.transformer_model) > 0
+    assert logit_store.store_key(int8).endswith("-int8")
+    scores = np.array([list(result.sentiment_scores.values()) for result in int8.analyze_batch(TEXTS)])
+    np.testing.assert_allclose(scores.sum(axis=1), 1.0, rtol=1e-6)
+
+
+def test_store_key_covers_the_quantized_weights(quantized_only, compiled_baseline_dir, tmp_path):
+    other = tmp_path / "other"
+    shutil.copytree(quantized_only, other)
+    torch.manual_seed(1)
+    from transformers import AutoConfig, AutoModelForSequenceClassification
+
+    model = AutoModelForSequenceClassification.from_config(AutoConfig.from_pretrained(quantized_only))
+    torch.save(quantization.quantize_model(model).state_dict(), other / "pytorch_model_quantized.bin")
+    first = TweetAnalyzer(checkpoint_dir=quantized_only, cache_max_entries=0, near_dup_max_entries=0)
+    second = TweetAnalyzer(checkpoint_dir=other, cache_max_entries=0, near_dup_max_entries=0)
+    assert logit_store.store_key(first) != logit_store.store_key(second)
+
+
+def test_engine_name_follows_the_loaded_model(analyzer, baseline_analyzer):
+    assert engine_name(analyzer) == engine_name(analyzer, loaded=False) == "bert-torch"
+    assert logit_store.store_key(analyzer).endswith("-bert-torch")
+    assert engine_name(baseline_analyzer) == "baseline"
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from app.inference import registry
+from app.inference.predictor import MODELS_DIR, TweetAnalyzer
+
+
+def test_register_copies_and_deduplicates(tiny_checkpoint, tmp_path):
+    entry = registry.register(tiny_checkpoint, baseline_dir=None, name="first", registry_dir=tmp_path)
+    assert entry["has_transformer"] and not entry["has_baseline"]
+    assert set(entry["files"]) == {f"transformer/{path.name}" for path in tiny_checkpoint.iterdir()}
+    again = registry.register(tiny_checkpoint, baseline_dir=None, name="second", registry_dir=tmp_path)
+    assert again["version"] == "first"
+    assert [version["version"] for version in registry.list_versions(tmp_path)] == ["first"]
+    assert registry.active_version(tmp_path) is None
+    with pytest.raises(registry.RegistryError, match="not a plain name"):
+        registry.register(None, baseline_dir=MODELS_DIR, name="../escape", registry_dir=tmp_path)
+
+
+def test_verify_detects_modified_files(tiny_checkpoint, tmp_path):
+    registry.register(tiny_checkpoint, baseline_dir=None, name="tiny", registry_dir=tmp_path)
+    registry.verify("tiny", tmp_path)
+    config = tmp_path / "versions" / "tiny" / "transformer" / "config.json"
+    config.write_text(json.dumps({**json.loads(config.read_text()), "num_hidden_layers": 1}))
+    with pytest.raises(registry.RegistryError, match="config.json"):
+        registry.verify("tiny", tmp_path)
+    with pytest.raises(registry.RegistryError, match="Unknown"):
+        registry.set_active("missing", tmp_path)
+
+
+def test_baseline_only_version_serves_the_baseline(tmp_path, compiled_baseline_dir):
+    entry = registry.register(None, baseline_dir=MODELS_DIR, registry_dir=tmp_path)
+    assert entry["version"].startswith("v1-") and not entry["has_transformer"]
+    registry.set_active(entry["version"], tmp_path)
+    assert registry.active_version(tmp_path) == entry["version"]
+    served = TweetAnalyzer(**registry.analyzer_kwargs(entry["version"], tmp_path), cache_max_entries=0)
+    assert served.primary_model == "baseline"
+    assert served.baseline_dir == tmp_path / "versions" / entry["version"] / registry.BASELINE_DIRNAME
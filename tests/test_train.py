@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import json
+import shutil
+
+import numpy as np
+import pytest
+from safetensors.torch import load_file
+
+from app.inference import train
+
+RUN_ARGS = [
+    "--small", "--limit", "64", "--batch-size", "8", "--max-steps", "4",
+    "--save-every", "2", "--keep-checkpoints", "3", "--log-every", "2", "--seed", "7",
+]
+
+
+def _train(tiny_checkpoint, output, *extra):
+    return train.main([*RUN_ARGS, "--tokenizer", str(tiny_checkpoint), "--output", str(output), *extra])
+
+
+@pytest.fixture(scope="module")
+def full_run(tiny_checkpoint, tmp_path_factory):
+    output = tmp_path_factory.mktemp("full-run")
+    _train(tiny_checkpoint, output)
+    return output
+
+
+def _step_dir(output, step):
+    return output / train.STATE_DIR_NAME / f"step-{step:06d}"
+
+
+def test_resume_is_bit_identical(tiny_checkpoint, full_run, tmp_path):
+    # A run interrupted after step 2 is the full run's step-2 checkpoint on its own
+    shutil.copytree(_step_dir(full_run, 2), _step_dir(tmp_path, 2))
+    _train(tiny_checkpoint, tmp_path, "--resume")
+    for name in ("model.safetensors", train.TRAINING_STATE_NAME):
+        expected = load_file(_step_dir(full_run, 4) / name)
+        resumed = load_file(_step_dir(tmp_path, 4) / name)
+        assert expected.keys() == resumed.keys()
+        for key, tensor in expected.items():
+            assert resumed[key].equal(tensor), f"{name}:{key}"
+    expected_state = json.loads((_step_dir(full_run, 4) / train.TRAINER_STATE_NAME).read_text())
+    resumed_state = json.loads((_step_dir(tmp_path, 4) / train.TRAINER_STATE_NAME).read_text())
+    for key in ("step", "epoch", "batch", "settings", "scheduler"):
+        assert resumed_state[key] == expected_state[key]
+
+
+def test_checkpoint_records_settings(full_run):
+    settings = json.loads((_step_dir(full_run, 4) / train.TRAINER_STATE_NAME).read_text())["settings"]
+    assert (settings["batch_size"], settings["grad_accum"], settings["max_steps"], settings["seed"]) == (8, 1, 4, 7)
+    assert (full_run / "config.json").exists() and (full_run / "vocab.txt").exists()
+
+
+@pytest.mark.parametrize("changed", [["--batch-size", "4"], ["--grad-accum", "2"], ["--seed", "8"], ["--epochs", "3"]])
+def test_resume_refuses_changed_settings(tiny_checkpoint, full_run, tmp_path, changed):
+    shutil.copytree(_step_dir(full_run, 2), _step_dir(tmp_path, 2))
+    with pytest.raises(ValueError, match=changed[0][2:].replace("-", "_")):
+        _train(tiny_checkpoint, tmp_path, "--resume", *changed)
+
+
+def test_length_grouped_batches_cover_every_row_once():
+    lengths = np.random.default_rng(0).integers(1, 60, size=1000)
+    batches = train.length_grouped_batches(lengths, batch_size=16, seed=3, epoch=1)
+    assert sorted(np.concatenate(batches).tolist()) == list(range(1000))
+    again = train.length_grouped_batches(lengths, batch_size=16, seed=3, epoch=1)
+    assert all(np.array_equal(first, second) for first, second in zip(batches, again))
+    other_epoch = train.length_grouped_batches(lengths, batch_size=16, seed=3, epoch=2)
+    assert not all(np.array_equal(first, second) for first, second in zip(batches, other_epoch))
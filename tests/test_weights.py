@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import shutil
+
+import torch
+
+from app.inference.weights import (
+    PICKLE_WEIGHTS_NAME,
+    SAFETENSORS_NAME,
+    convert_to_safetensors,
+    load_mmap_model,
+    load_pretrained_model,
+)
+
+INPUT_IDS = torch.tensor([[101, 2023, 2003, 1037, 7279, 102], [101, 7592, 102, 0, 0, 0]])
+
+
+def _assert_same_model(actual: torch.nn.Module, expected: torch.nn.Module) -> None:
+    expected_state = expected.state_dict()
+    assert actual.state_dict().keys() == expected_state.keys()
+    for name, tensor in actual.state_dict().items():
+        assert torch.equal(tensor, expected_state[name]), name
+    mask = (INPUT_IDS != 0).long()
+    with torch.no_grad():
+        assert torch.equal(
+            actual(input_ids=INPUT_IDS, attention_mask=mask).logits,
+            expected(input_ids=INPUT_IDS, attention_mask=mask).logits,
+        )
+
+
+def test_mmap_model_matches_from_pretrained(tiny_checkpoint):
+    model = load_mmap_model(tiny_checkpoint)
+    assert not model.training
+    _assert_same_model(model, load_pretrained_model(tiny_checkpoint))
+
+
+def test_mmap_weights_are_copy_on_write(tiny_checkpoint):
+    before = (tiny_checkpoint / SAFETENSORS_NAME).read_bytes()
+    model = load_mmap_model(tiny_checkpoint)
+    with torch.no_grad():
+        for param in model.parameters():
+            param.zero_()
+    assert (tiny_checkpoint / SAFETENSORS_NAME).read_bytes() == before
+    _assert_same_model(load_mmap_model(tiny_checkpoint), load_pretrained_model(tiny_checkpoint))
+
+
+def test_convert_pickled_checkpoint(tiny_checkpoint, tmp_path):
+    checkpoint_dir = tmp_path / "pickled"
+    shutil.copytree(tiny_checkpoint, checkpoint_dir)
+    (checkpoint_dir / SAFETENSORS_NAME).unlink()
+    original = load_pretrained_model(tiny_checkpoint)
+    torch.save(original.state_dict(), checkpoint_dir / PICKLE_WEIGHTS_NAME)
+    assert convert_to_safetensors(checkpoint_dir) == checkpoint_dir / SAFETENSORS_NAME
+    _assert_same_model(load_mmap_model(checkpoint_dir), original)
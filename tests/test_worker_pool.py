@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import time
+
+import numpy as np
+import pytest
+
+from app.backend.worker_pool import SharedModelPool
+
+TEXTS = ["You are awful", "What a lovely day", "meh", "Oh wonderful, another day of dealing with this nonsense."]
+
+
+def _scores(results) -> np.ndarray:
+    return np.array([list(result.sentiment_scores.values()) for result in results])
+
+
+@pytest.fixture(scope="module")
+def pool(tiny_checkpoint, tmp_path_factory):
+    # An empty baseline directory keeps the workers from compiling into models/
+    analyzer_kwargs = {
+        "checkpoint_dir": str(tiny_checkpoint), "baseline_dir": str(tmp_path_factory.mktemp("no-baseline")),
+        "model": "auto", "backend": "torch", "quantization": "none",
+        "cache_max_entries": 16, "near_dup_max_entries": 0,
+    }
+    pool = SharedModelPool(analyzer_kwargs, num_workers=2, ready_timeout=300)
+    pool.start()
+    yield pool
+    pool.stop()
+
+
+def test_pool_matches_in_process_analyzer(pool, analyzer):
+    results = pool.analyze_batch(TEXTS, batch_size=2)
+    expected = analyzer.analyze_batch(TEXTS, batch_size=2)
+    assert [result.sentiment_label for result in results] == [result.sentiment_label for result in expected]
+    np.testing.assert_allclose(_scores(results), _scores(expected), rtol=0, atol=1e-6)
+    assert pool.stats()["ready_workers"] == 2
+    assert pool.near_duplicate_stats() is None
+
+
+def test_pool_sums_worker_cache_counters(pool):
+    before = pool.cache_stats()
+    pool.analyze_batch(TEXTS)
+    pool.analyze_batch(TEXTS)
+    after = pool.cache_stats()
+    assert after["workers"] == 2
+    assert after["hits"] + after["misses"] - before["hits"] - before["misses"] == 2 * len(TEXTS)
+
+
+def test_dead_worker_is_replaced(pool):
+    pool._processes[0].kill()
+    deadline = time.monotonic() + 300
+    while pool.stats()["worker_restarts"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert pool.stats()["worker_restarts"] == 1
+    # Batches keep being served while the replacement loads
+    assert len(pool.analyze_batch(TEXTS)) == len(TEXTS)
+
+
+def test_unstarted_pool_rejects_batches():
+    with pytest.raises(RuntimeError, match="not been started"):
+        SharedModelPool({}, num_workers=1).submit(["hello"])